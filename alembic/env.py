@@ -33,6 +33,7 @@ if config.config_file_name is not None:
 # add your model's MetaData object here
 # for 'autogenerate' support
 from app.models.analytics import Base
+import app.models.cache  # noqa: F401  (registra response_cache en Base.metadata)
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
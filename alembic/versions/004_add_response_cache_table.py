@@ -0,0 +1,50 @@
+"""Add response_cache table shared across instances
+
+Revision ID: 004_add_response_cache
+Revises: 9627c905e179
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "004_add_response_cache"
+down_revision = "9627c905e179"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "response_cache",
+        sa.Column("cache_key", sa.String(length=512), nullable=False),
+        sa.Column(
+            "response", postgresql.JSONB(astext_type=sa.Text()), nullable=False
+        ),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("NOW()"), nullable=False
+        ),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("cache_key"),
+    )
+    op.create_index(
+        "idx_response_cache_expires_at",
+        "response_cache",
+        ["expires_at"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_response_cache_created_at",
+        "response_cache",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_response_cache_created_at", table_name="response_cache")
+    op.drop_index("idx_response_cache_expires_at", table_name="response_cache")
+    op.drop_table("response_cache")
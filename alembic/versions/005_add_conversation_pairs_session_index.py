@@ -0,0 +1,40 @@
+"""Add composite (session_id, created_at, id) index to conversation_pairs
+
+Revision ID: 005_cp_session_created_idx
+Revises: 004_add_response_cache
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "005_cp_session_created_idx"
+down_revision = "004_add_response_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Los últimos N turnos de una sesión se leen con un index scan hacia atrás;
+    # el índice compuesto cubre también las búsquedas solo por session_id
+    op.create_index(
+        "idx_conversation_pairs_session_created",
+        "conversation_pairs",
+        ["session_id", "created_at", "id"],
+        unique=False,
+    )
+    op.drop_index(
+        "idx_conversation_pairs_session_id", table_name="conversation_pairs"
+    )
+
+
+def downgrade() -> None:
+    op.create_index(
+        "idx_conversation_pairs_session_id",
+        "conversation_pairs",
+        ["session_id"],
+        unique=False,
+    )
+    op.drop_index(
+        "idx_conversation_pairs_session_created", table_name="conversation_pairs"
+    )
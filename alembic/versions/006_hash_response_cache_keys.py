@@ -0,0 +1,40 @@
+"""Store response_cache keys as SHA-256 digests
+
+Revision ID: 006_hash_response_cache_keys
+Revises: 005_cp_session_created_idx
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "006_hash_response_cache_keys"
+down_revision = "005_cp_session_created_idx"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Las claves existentes están en claro y no se pueden reutilizar: es una
+    # cache, se vacía y se vuelve a llenar con las claves hasheadas
+    op.execute("DELETE FROM response_cache")
+    op.alter_column(
+        "response_cache",
+        "cache_key",
+        existing_type=sa.String(length=512),
+        type_=sa.String(length=64),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM response_cache")
+    op.alter_column(
+        "response_cache",
+        "cache_key",
+        existing_type=sa.String(length=64),
+        type_=sa.String(length=512),
+        existing_nullable=False,
+    )
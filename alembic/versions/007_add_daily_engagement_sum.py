@@ -0,0 +1,35 @@
+"""Add engagement_sum to daily_analytics
+
+Revision ID: 007_daily_engagement_sum
+Revises: 006_hash_response_cache_keys
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "007_daily_engagement_sum"
+down_revision = "006_hash_response_cache_keys"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Suma de los engagement_score de las sesiones del día; el promedio se
+    # deriva de ella y de total_sessions al aplicar los deltas de los rollups
+    op.add_column(
+        "daily_analytics",
+        sa.Column(
+            "engagement_sum", sa.Float(), server_default="0.0", nullable=False
+        ),
+    )
+    op.execute(
+        "UPDATE daily_analytics "
+        "SET engagement_sum = avg_engagement_score * total_sessions"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("daily_analytics", "engagement_sum")
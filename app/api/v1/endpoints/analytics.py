@@ -4,6 +4,7 @@ Maneja la captura de leads, consentimientos GDPR y métricas.
 """
 
 import logging
+from datetime import date
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
@@ -12,6 +13,7 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from app.core.config import settings
+from app.core.security import require_admin_key
 from app.schemas.analytics import (
     AnalyticsConfigResponse,
     AnalyticsMetrics,
@@ -310,6 +312,59 @@ async def export_user_data(
         )
 
 
+@router.post(
+    "/gdpr/retention",
+    response_model=SuccessResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(require_admin_key)],
+)
+@limiter.limit("2/minute")  # Límite estricto para la limpieza de retención
+async def run_data_retention(
+    request: Request, max_batches: Optional[int] = None
+) -> SuccessResponse:
+    """
+    Aplicar las políticas de retención GDPR por lotes (endpoint admin).
+    Requiere la cabecera X-Admin-Key (ADMIN_API_KEY).
+
+    Si se limita con max_batches y no termina, basta con volver a llamarlo
+    para continuar donde se quedó.
+
+    Args:
+        request: Starlette Request (para rate limiting)
+        max_batches: Máximo de lotes a procesar en esta llamada (opcional)
+
+    Returns:
+        SuccessResponse con las filas afectadas por tabla
+    """
+    try:
+        logger.info("Solicitud de limpieza de retención GDPR")
+        report = await gdpr_service.cleanup_expired_data(max_batches=max_batches)
+
+        if "error" in report:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error aplicando políticas de retención",
+            )
+
+        return SuccessResponse(
+            message=(
+                "Políticas de retención aplicadas"
+                if report["completed"]
+                else "Retención aplicada parcialmente, quedan lotes pendientes"
+            ),
+            data=report,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error aplicando retención GDPR: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno aplicando políticas de retención",
+        )
+
+
 # ============================================================================
 # ENDPOINTS DE FLUJO
 # ============================================================================
@@ -520,12 +575,18 @@ async def get_daily_metrics(
     "/metrics/aggregate", response_model=SuccessResponse, status_code=status.HTTP_200_OK
 )
 @limiter.limit("5/minute")  # Límite estricto para agregación
-async def aggregate_daily_metrics(request: Request) -> SuccessResponse:
+async def aggregate_daily_metrics(
+    request: Request, target_date: Optional[date] = None
+) -> SuccessResponse:
     """
-    Agregar métricas diarias para el día actual (endpoint admin).
+    Agregar métricas diarias para un día (endpoint admin).
+
+    Es idempotente: sin rollups incrementales re-ejecutarlo recalcula el día;
+    con ENABLE_DAILY_ROLLUPS solo crea la fila de un día que no la tenga.
 
     Args:
         request: Starlette Request (para rate limiting)
+        target_date: Día a agregar (por defecto: hoy)
 
     Returns:
         SuccessResponse con el resultado de la agregación
@@ -534,7 +595,7 @@ async def aggregate_daily_metrics(request: Request) -> SuccessResponse:
         logger.info("Solicitud de agregación de métricas diarias")
 
         # Agregar métricas diarias
-        success = await analytics_service.aggregate_daily_metrics()
+        success = await analytics_service.aggregate_daily_metrics(target_date)
 
         if success:
             return SuccessResponse(message="Métricas diarias agregadas exitosamente")
@@ -571,7 +632,8 @@ async def analytics_health_check() -> SuccessResponse:
         # Verificar que los servicios están inicializados
         if analytics_service and gdpr_service and flow_controller:
             return SuccessResponse(
-                message="Módulo de analytics funcionando correctamente"
+                message="Módulo de analytics funcionando correctamente",
+                data={"writer": analytics_service.get_writer_stats()},
             )
         else:
             raise HTTPException(
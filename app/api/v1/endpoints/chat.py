@@ -3,16 +3,21 @@ Endpoints de chat para el chatbot RAG.
 Maneja las peticiones de chat y respuestas del usuario con analytics integrados.
 """
 
+import json
 import logging
 import time
 from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from app.core.config import settings
+from app.core.security import require_admin_key
 from app.schemas.chat import ChatRequest, ChatResponse, HealthResponse
 from app.services.analytics_service import analytics_service
 from app.services.flow_controller import ActionType, FlowState, flow_controller
@@ -34,6 +39,111 @@ except Exception as e:
     rag_service = None
 
 
+def _normalize_sources(raw_sources: List[Any]) -> List[str]:
+    """
+    Normaliza las fuentes de una respuesta RAG a TEXT[] (strings) antes de guardar.
+
+    Args:
+        raw_sources: Fuentes tal como las devuelve el servicio RAG
+
+    Returns:
+        Lista de strings con el tipo/origen de cada fuente
+    """
+    normalized_sources = []
+    for s in raw_sources:
+        if isinstance(s, str):
+            normalized_sources.append(s)
+        elif isinstance(s, dict):
+            meta = s.get("metadata") or {}
+            t = s.get("type") or meta.get("type")
+            src = meta.get("source")
+            preview = s.get("content_preview")
+            parts = [p for p in [t, src] if p]
+            normalized_sources.append(
+                " | ".join(parts) if parts else (preview or "unknown")
+            )
+        else:
+            normalized_sources.append(str(s))
+    return normalized_sources
+
+
+async def _record_conversation_turn(
+    session_id: str, message: str, result: Dict[str, Any], response_time_ms: int
+) -> None:
+    """
+    Encola las métricas del mensaje y el par de conversación para el writer
+    de analytics (solo si analytics está habilitado).
+
+    Args:
+        session_id: ID de la sesión
+        message: Pregunta del usuario
+        result: Resultado devuelto por el servicio RAG
+        response_time_ms: Tiempo de respuesta en milisegundos
+    """
+    if not settings.ENABLE_ANALYTICS or settings.TESTING:
+        return
+
+    await analytics_service.enqueue_message_metrics(
+        session_id=session_id,
+        message=message,
+        response_time_ms=response_time_ms,
+    )
+
+    # Encolar par de conversación (pregunta-respuesta asociadas)
+    save_result = await analytics_service.enqueue_conversation_pair(
+        session_id=session_id,
+        user_question=message,
+        bot_response=result["response"],
+        response_time_ms=response_time_ms,
+        sources_used=_normalize_sources(result.get("sources", [])),
+        user_language="auto",  # Se puede mejorar con detección real
+        bot_language="auto",  # Se puede mejorar con detección real
+        intent_category="general",  # Se puede mejorar con análisis real
+        engagement_score=0.5,  # Score por defecto, se puede calcular
+    )
+    logger.debug(f"🔍 Par de conversación encolado: {save_result}")
+
+
+async def _resolve_flow_action(
+    session_id: str, message: str, chat_request: ChatRequest
+) -> Tuple[ActionType, FlowState, Dict[str, Any]]:
+    """
+    Crea o actualiza la sesión de analytics y determina la siguiente acción del flujo.
+
+    Args:
+        session_id: ID de la sesión
+        message: Mensaje del usuario ya validado
+        chat_request: ChatRequest original (email, user_type)
+
+    Returns:
+        Tuple[ActionType, FlowState, Dict]: Acción, estado siguiente y datos adicionales
+    """
+    # 1. Crear o actualizar sesión de analytics (solo si analytics está habilitado)
+    if settings.ENABLE_ANALYTICS and not settings.TESTING:
+        # Crear la sesión o incrementar su contador en una sola operación atómica
+        session = await analytics_service.upsert_session_and_increment(
+            session_id=session_id,
+            email=chat_request.email,
+            user_type=chat_request.user_type,
+        )
+
+        # 2. Determinar siguiente acción según el estado del flujo (después de incrementar)
+        (
+            action_type,
+            next_flow_state,
+            flow_data,
+        ) = await flow_controller.determine_next_action(
+            session=session, message=message
+        )
+    else:
+        # Modo testing o analytics deshabilitado - respuesta normal
+        action_type = ActionType.NORMAL_RESPONSE
+        next_flow_state = FlowState.CONVERSATION_ACTIVE
+        flow_data = {"testing_mode": True}
+
+    return action_type, next_flow_state, flow_data
+
+
 @router.post("/chat", response_model=ChatResponse, status_code=status.HTTP_200_OK)
 @limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
 async def chat(
@@ -78,33 +188,10 @@ async def chat(
     try:
         logger.debug(f"Petición de chat recibida. Sesión: {session_id}")
 
-        # 1. Crear o actualizar sesión de analytics (solo si analytics está habilitado)
-        if settings.ENABLE_ANALYTICS and not settings.TESTING:
-            session = await analytics_service.get_or_create_session(
-                session_id=session_id,
-                email=chat_request.email,
-                user_type=chat_request.user_type,
-            )
-
-            # Incrementar contador de mensajes
-            await analytics_service.increment_message_count(session_id)
-
-            # Obtener sesión actualizada después del incremento
-            session = await analytics_service.get_or_create_session(session_id)
-
-            # 2. Determinar siguiente acción según el estado del flujo (después de incrementar)
-            (
-                action_type,
-                next_flow_state,
-                flow_data,
-            ) = await flow_controller.determine_next_action(
-                session=session, message=message
-            )
-        else:
-            # Modo testing o analytics deshabilitado - respuesta normal
-            action_type = ActionType.NORMAL_RESPONSE
-            next_flow_state = FlowState.CONVERSATION_ACTIVE
-            flow_data = {"testing_mode": True}
+        # 1-2. Actualizar sesión de analytics y determinar la siguiente acción del flujo
+        action_type, next_flow_state, flow_data = await _resolve_flow_action(
+            session_id=session_id, message=message, chat_request=chat_request
+        )
 
         logger.debug(
             f"🔍 Flow controller devolvió: action_type={action_type.value}, next_state={next_flow_state.value}"
@@ -117,48 +204,13 @@ async def chat(
                 question=message, session_id=session_id, user_type=chat_request.user_type
             )
 
-            # Trackear métricas del mensaje (solo si analytics está habilitado)
-            if settings.ENABLE_ANALYTICS and not settings.TESTING:
-                response_time_ms = int((time.time() - start_time) * 1000)
-                await analytics_service.track_message_metrics(
-                    session_id=session_id,
-                    message=message,
-                    response_time_ms=response_time_ms,
-                )
-
-                # Guardar par de conversación (pregunta-respuesta asociadas)
-                logger.debug(
-                    f"🔍 Intentando guardar par de conversación para sesión {session_id}"
-                )
-                # Normalizar fuentes a TEXT[] (strings) antes de guardar
-                raw_sources = result.get("sources", [])
-                normalized_sources = []
-                for s in raw_sources:
-                    if isinstance(s, str):
-                        normalized_sources.append(s)
-                    elif isinstance(s, dict):
-                        meta = s.get("metadata") or {}
-                        t = s.get("type") or meta.get("type")
-                        src = meta.get("source")
-                        preview = s.get("content_preview")
-                        parts = [p for p in [t, src] if p]
-                        normalized_sources.append(
-                            " | ".join(parts) if parts else (preview or "unknown")
-                        )
-                    else:
-                        normalized_sources.append(str(s))
-                save_result = await analytics_service.save_conversation_pair(
-                    session_id=session_id,
-                    user_question=message,
-                    bot_response=result["response"],
-                    response_time_ms=response_time_ms,
-                    sources_used=normalized_sources,
-                    user_language="auto",  # Se puede mejorar con detección real
-                    bot_language="auto",  # Se puede mejorar con detección real
-                    intent_category="general",  # Se puede mejorar con análisis real
-                    engagement_score=0.5,  # Score por defecto, se puede calcular
-                )
-                logger.debug(f"🔍 Resultado del guardado: {save_result}")
+            # Trackear métricas y guardar el par de conversación
+            await _record_conversation_turn(
+                session_id=session_id,
+                message=message,
+                result=result,
+                response_time_ms=int((time.time() - start_time) * 1000),
+            )
 
             # Construir respuesta con RAG (sin mensaje de bienvenida redundante)
             response = ChatResponse(
@@ -178,48 +230,13 @@ async def chat(
                 question=message, session_id=session_id, user_type=chat_request.user_type
             )
 
-            # 5. Trackear métricas del mensaje (solo si analytics está habilitado)
-            if settings.ENABLE_ANALYTICS and not settings.TESTING:
-                response_time_ms = int((time.time() - start_time) * 1000)
-                await analytics_service.track_message_metrics(
-                    session_id=session_id,
-                    message=message,
-                    response_time_ms=response_time_ms,
-                )
-
-                # Guardar par de conversación (pregunta-respuesta asociadas)
-                logger.debug(
-                    f"🔍 Intentando guardar par de conversación para sesión {session_id}"
-                )
-                # Normalizar fuentes a TEXT[] (strings) antes de guardar
-                raw_sources = result.get("sources", [])
-                normalized_sources = []
-                for s in raw_sources:
-                    if isinstance(s, str):
-                        normalized_sources.append(s)
-                    elif isinstance(s, dict):
-                        meta = s.get("metadata") or {}
-                        t = s.get("type") or meta.get("type")
-                        src = meta.get("source")
-                        preview = s.get("content_preview")
-                        parts = [p for p in [t, src] if p]
-                        normalized_sources.append(
-                            " | ".join(parts) if parts else (preview or "unknown")
-                        )
-                    else:
-                        normalized_sources.append(str(s))
-                save_result = await analytics_service.save_conversation_pair(
-                    session_id=session_id,
-                    user_question=message,
-                    bot_response=result["response"],
-                    response_time_ms=response_time_ms,
-                    sources_used=normalized_sources,
-                    user_language="auto",
-                    bot_language="auto",
-                    intent_category="general",
-                    engagement_score=0.5,
-                )
-                logger.debug(f"🔍 Resultado del guardado: {save_result}")
+            # Trackear métricas y guardar el par de conversación
+            await _record_conversation_turn(
+                session_id=session_id,
+                message=message,
+                result=result,
+                response_time_ms=int((time.time() - start_time) * 1000),
+            )
 
             # 6. Construir respuesta con RAG + solicitud de captura
             response = ChatResponse(
@@ -239,48 +256,13 @@ async def chat(
                 question=message, session_id=session_id, user_type=chat_request.user_type
             )
 
-            # 5. Trackear métricas del mensaje (solo si analytics está habilitado)
-            if settings.ENABLE_ANALYTICS and not settings.TESTING:
-                response_time_ms = int((time.time() - start_time) * 1000)
-                await analytics_service.track_message_metrics(
-                    session_id=session_id,
-                    message=message,
-                    response_time_ms=response_time_ms,
-                )
-
-                # Guardar par de conversación (pregunta-respuesta asociadas)
-                logger.debug(
-                    f"🔍 Intentando guardar par de conversación para sesión {session_id}"
-                )
-                # Normalizar fuentes a TEXT[] (strings) antes de guardar
-                raw_sources = result.get("sources", [])
-                normalized_sources = []
-                for s in raw_sources:
-                    if isinstance(s, str):
-                        normalized_sources.append(s)
-                    elif isinstance(s, dict):
-                        meta = s.get("metadata") or {}
-                        t = s.get("type") or meta.get("type")
-                        src = meta.get("source")
-                        preview = s.get("content_preview")
-                        parts = [p for p in [t, src] if p]
-                        normalized_sources.append(
-                            " | ".join(parts) if parts else (preview or "unknown")
-                        )
-                    else:
-                        normalized_sources.append(str(s))
-                save_result = await analytics_service.save_conversation_pair(
-                    session_id=session_id,
-                    user_question=message,
-                    bot_response=result["response"],
-                    response_time_ms=response_time_ms,
-                    sources_used=normalized_sources,
-                    user_language="auto",
-                    bot_language="auto",
-                    intent_category="general",
-                    engagement_score=0.5,
-                )
-                logger.debug(f"🔍 Resultado del guardado: {save_result}")
+            # Trackear métricas y guardar el par de conversación
+            await _record_conversation_turn(
+                session_id=session_id,
+                message=message,
+                result=result,
+                response_time_ms=int((time.time() - start_time) * 1000),
+            )
 
             # 6. Construir respuesta con RAG + solicitud de GDPR
             response = ChatResponse(
@@ -300,48 +282,13 @@ async def chat(
                 question=message, session_id=session_id, user_type=chat_request.user_type
             )
 
-            # 5. Trackear métricas del mensaje (solo si analytics está habilitado)
-            if settings.ENABLE_ANALYTICS and not settings.TESTING:
-                response_time_ms = int((time.time() - start_time) * 1000)
-                await analytics_service.track_message_metrics(
-                    session_id=session_id,
-                    message=message,
-                    response_time_ms=response_time_ms,
-                )
-
-                # Guardar par de conversación (pregunta-respuesta asociadas)
-                logger.debug(
-                    f"🔍 Intentando guardar par de conversación para sesión {session_id}"
-                )
-                # Normalizar fuentes a TEXT[] (strings) antes de guardar
-                raw_sources = result.get("sources", [])
-                normalized_sources = []
-                for s in raw_sources:
-                    if isinstance(s, str):
-                        normalized_sources.append(s)
-                    elif isinstance(s, dict):
-                        meta = s.get("metadata") or {}
-                        t = s.get("type") or meta.get("type")
-                        src = meta.get("source")
-                        preview = s.get("content_preview")
-                        parts = [p for p in [t, src] if p]
-                        normalized_sources.append(
-                            " | ".join(parts) if parts else (preview or "unknown")
-                        )
-                    else:
-                        normalized_sources.append(str(s))
-                save_result = await analytics_service.save_conversation_pair(
-                    session_id=session_id,
-                    user_question=message,
-                    bot_response=result["response"],
-                    response_time_ms=response_time_ms,
-                    sources_used=normalized_sources,
-                    user_language="auto",
-                    bot_language="auto",
-                    intent_category="general",
-                    engagement_score=0.5,
-                )
-                logger.debug(f"🔍 Resultado del guardado: {save_result}")
+            # Trackear métricas y guardar el par de conversación
+            await _record_conversation_turn(
+                session_id=session_id,
+                message=message,
+                result=result,
+                response_time_ms=int((time.time() - start_time) * 1000),
+            )
 
             # 6. Construir respuesta normal
             response = ChatResponse(
@@ -370,6 +317,147 @@ async def chat(
         )
 
 
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Formatea un evento Server-Sent Events con payload JSON."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@router.post("/chat/stream", status_code=status.HTTP_200_OK)
+@limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
+async def chat_stream(
+    request: Request,
+    chat_request: ChatRequest,
+) -> StreamingResponse:
+    """
+    Endpoint de chat en streaming (Server-Sent Events).
+    Envía la respuesta de Gemini token a token a medida que se genera.
+
+    Eventos emitidos:
+        - metadata: sesión y estado del flujo (captura de datos / GDPR)
+        - token: fragmento de texto ya sanitizado
+        - done: respuesta completa, fuentes y modelo
+        - error: error interno durante la generación
+
+    El par de conversación se guarda cuando el stream termina, fuera del
+    camino crítico de la respuesta.
+
+    Args:
+        request: Starlette Request (para rate limiting)
+        chat_request: ChatRequest con el mensaje del usuario
+
+    Returns:
+        StreamingResponse con media type text/event-stream
+
+    Raises:
+        HTTPException: Si hay un error antes de iniciar el stream
+    """
+    if rag_service is None:
+        logger.error("RAG Service no está inicializado")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servicio de chat no está disponible. Intenta más tarde.",
+        )
+
+    message = chat_request.message.strip()
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El mensaje no puede estar vacío",
+        )
+
+    start_time = time.time()
+    session_id = (
+        chat_request.session_id or f"session-{int(time.time())}-{hash(message) % 10000}"
+    )
+
+    try:
+        action_type, next_flow_state, flow_data = await _resolve_flow_action(
+            session_id=session_id, message=message, chat_request=chat_request
+        )
+    except Exception as e:
+        logger.error(f"Error en endpoint /chat/stream: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor. Por favor, intenta de nuevo más tarde.",
+        )
+
+    requires_data_capture = action_type == ActionType.REQUEST_DATA_CAPTURE
+    requires_gdpr_consent = action_type == ActionType.REQUEST_GDPR_CONSENT
+    # SHOW_WELCOME se responde como normal_response (igual que /chat)
+    response_action = (
+        action_type.value
+        if requires_data_capture or requires_gdpr_consent
+        else ActionType.NORMAL_RESPONSE.value
+    )
+
+    # Resultado final compartido con la tarea que persiste el turno
+    stream_state: Dict[str, Any] = {}
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield _format_sse(
+            "metadata",
+            {
+                "session_id": session_id,
+                "action_type": response_action,
+                "next_flow_state": next_flow_state.value,
+                "requires_data_capture": requires_data_capture,
+                "requires_gdpr_consent": requires_gdpr_consent,
+            },
+        )
+        try:
+            async for event in rag_service.stream_response(
+                question=message, session_id=session_id, user_type=chat_request.user_type
+            ):
+                if event["type"] == "token":
+                    yield _format_sse("token", {"text": event["text"]})
+                elif event["type"] == "done":
+                    stream_state["result"] = event
+                    stream_state["response_time_ms"] = int(
+                        (time.time() - start_time) * 1000
+                    )
+                    yield _format_sse(
+                        "done",
+                        {
+                            "message": event["response"],
+                            "sources": event.get("sources", []),
+                            "session_id": session_id,
+                            "model": event.get("model", settings.GEMINI_MODEL),
+                            "cached": event.get("cached", False),
+                        },
+                    )
+        except Exception as e:
+            logger.error(f"Error en stream de /chat/stream: {e}", exc_info=True)
+            yield _format_sse(
+                "error",
+                {
+                    "detail": "Error interno del servidor. Por favor, intenta de nuevo más tarde."
+                },
+            )
+
+    async def persist_turn() -> None:
+        # Se ejecuta al cerrar el stream: el guardado no retrasa la respuesta
+        result = stream_state.get("result")
+        if result is None:
+            return
+        try:
+            await _record_conversation_turn(
+                session_id=session_id,
+                message=message,
+                result=result,
+                response_time_ms=stream_state["response_time_ms"],
+            )
+        except Exception as e:
+            logger.error(f"Error guardando turno de /chat/stream: {e}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist_turn),
+    )
+
+
 @router.get("/conversations", status_code=status.HTTP_200_OK)
 async def get_conversation_pairs():
     """
@@ -440,6 +528,63 @@ async def get_top_questions(limit: int = 20):
         )
 
 
+@router.get("/runtime-stats", status_code=status.HTTP_200_OK)
+async def get_runtime_stats():
+    """
+    Obtiene métricas de runtime de la instancia (concurrencia y cola del LLM).
+
+    Returns:
+        Dict con las métricas en memoria del servicio RAG
+    """
+    if rag_service is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servicio de chat no está disponible. Intenta más tarde.",
+        )
+
+    return rag_service.get_runtime_stats()
+
+
+@router.post(
+    "/vector-index/refresh",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(require_admin_key)],
+)
+@limiter.limit("2/minute")
+async def refresh_vector_index(request: Request):
+    """
+    Recarga los índices en memoria tras actualizar la colección.
+    Requiere la cabecera X-Admin-Key (ADMIN_API_KEY).
+
+    Afecta al índice vectorial (VECTOR_BACKEND="memory"), al índice BM25
+    de la búsqueda híbrida (ENABLE_HYBRID_SEARCH) y a la tabla de routing
+    (ROUTING_TABLE_PATH), que se vuelve a leer de disco.
+
+    Returns:
+        Dict con el backend activo y el número de chunks cargados
+    """
+    if rag_service is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servicio de chat no está disponible. Intenta más tarde.",
+        )
+
+    try:
+        chunks = await run_in_threadpool(rag_service.refresh_vector_index)
+    except Exception as e:
+        logger.error(f"Error recargando índices en memoria: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No se pudieron recargar los índices en memoria",
+        )
+
+    return {
+        "backend": settings.VECTOR_BACKEND,
+        "hybrid": settings.ENABLE_HYBRID_SEARCH,
+        "chunks": chunks,
+    }
+
+
 @router.get("/health", response_model=HealthResponse, status_code=status.HTTP_200_OK)
 async def health_check() -> HealthResponse:
     """
@@ -479,6 +624,7 @@ async def root():
         "status": "running",
         "endpoints": {
             "chat": f"{settings.API_V1_STR}/chat",
+            "chat_stream": f"{settings.API_V1_STR}/chat/stream",
             "health": f"{settings.API_V1_STR}/health",
         },
     }
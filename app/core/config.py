@@ -27,6 +27,7 @@ class Settings(BaseSettings):
     GEMINI_TEMPERATURE: float = 0.3  # Conserador para mayor adherencia al contexto
     GEMINI_TOP_P: float = 0.7  # Ventana equilibrada para respuestas precisas
     GEMINI_MAX_TOKENS: int = 1024  # Más espacio para respuestas detalladas
+    GEMINI_MAX_CONCURRENCY: int = 4  # Llamadas simultáneas a Gemini por instancia
 
     # Cloud SQL (PostgreSQL + pgvector)
     CLOUD_SQL_CONNECTION_NAME: Optional[str] = None  # Para Cloud Run
@@ -36,17 +37,56 @@ class Settings(BaseSettings):
     CLOUD_SQL_USER: str = "postgres"
     CLOUD_SQL_PASSWORD: str = ""
 
+    DB_POOL_SIZE: int = 5  # Conexiones del pool asíncrono compartido
+    DB_MAX_OVERFLOW: int = 10  # Conexiones extra por encima del pool
+
     # Cloud Storage
     PORTFOLIO_BUCKET: str = "almapi-portfolio-data"
     PORTFOLIO_FILE: str = "portfolio.yaml"
 
     # Vector Store
     VECTOR_COLLECTION_NAME: str = "portfolio_knowledge"
+    VECTOR_BACKEND: str = "pgvector"  # "pgvector" o "memory" (índice NumPy en memoria)
+    EMBEDDING_ARTIFACT_PATH: Optional[str] = None  # Artefacto precalculado (.npy + chunks); sirve sin pgvector
+    ENABLE_HYBRID_SEARCH: bool = True  # Fusionar búsqueda vectorial con BM25 en memoria
+    HYBRID_CANDIDATES: int = 20  # Candidatos de cada índice antes de fusionar
+    HYBRID_RRF_K: int = 60  # Constante de Reciprocal Rank Fusion
     VECTOR_SEARCH_K: int = 5  # Top K documentos a recuperar (aumentado para incluir más contexto relevante)
 
+    # Re-ranking con cross-encoder (opcional, CPU)
+    ENABLE_RERANKER: bool = False  # Re-puntuar los candidatos con un cross-encoder local
+    RERANKER_MODEL_NAME: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # Multilingüe
+    RERANK_CANDIDATES: int = 10  # Candidatos recuperados que se re-puntúan
+    RERANK_TOP_N: int = 3  # Chunks que pasan al prompt tras el re-ranking
+    RERANK_TIMEOUT_MS: float = 150.0  # Presupuesto de latencia; si se excede, orden de recuperación
+    RERANK_CACHE_MAX_SIZE: int = 5000  # Scores (pregunta, chunk) en cache
+
+    # Tabla de routing (scripts/setup/build_routing_table.py)
+    ROUTING_TABLE_PATH: Optional[str] = None  # Fichero JSON; sin él no se usa
+    ROUTING_TABLE_TOP_N: int = 50  # Preguntas más frecuentes que se precalculan
+    ROUTING_TABLE_MIN_COUNT: int = 3  # Frecuencia mínima para entrar en la tabla
+
+    # Embeddings de consultas
+    EMBEDDING_MODEL_NAME: str = (
+        "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    )
+    EMBEDDING_CACHE_MAX_SIZE: int = 2000  # Máximo de vectores de consulta en cache
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400  # Vigencia de cada vector (24h)
+    EMBEDDING_CACHE_PATH: Optional[str] = None  # Fichero JSON para persistir entre reinicios
+
+    # System prompts (por defecto el integrado en app/services/prompt_registry.py)
+    SYSTEM_PROMPT_PATH: Optional[str] = None  # Texto plano o JSON {user_type: template}
+    SYSTEM_PROMPT_RELOAD_SECONDS: float = 5.0  # Comprobar cambios del fichero cada N segundos
+    PROMPT_MAX_TOKENS: int = 8000  # Tamaño máximo estimado del prompt completo
+    PROMPT_HISTORY_MAX_TOKENS: int = 1500  # Parte máxima del prompt para el historial
+
     # Conversational Memory
     MAX_CONVERSATION_HISTORY: int = 5  # Últimos N pares de mensajes a recordar
     SESSION_TIMEOUT_MINUTES: int = 60  # Limpiar sesiones inactivas después de 60 min
+    MAX_CONVERSATION_SESSIONS: int = 2000  # Máximo de sesiones con memoria en la instancia
+    MAX_CONVERSATION_MEMORY_BYTES: int = 32 * 1024 * 1024  # Tamaño máximo estimado (32MB)
+    SESSION_SWEEP_INTERVAL_SECONDS: int = 60  # Periodo del barrido de sesiones inactivas
+    ENABLE_MEMORY_HYDRATION: bool = True  # Recuperar el historial de conversation_pairs si no está en memoria
 
     # CORS
     CORS_ORIGINS: list = [
@@ -62,10 +102,19 @@ class Settings(BaseSettings):
     ENABLE_RESPONSE_CACHE: bool = True
     CACHE_TTL_MINUTES: int = 30  # Cache por 30 minutos
     MAX_CACHE_SIZE: int = 100  # Máximo 100 respuestas en cache
+    RESPONSE_CACHE_BACKEND: str = "memory"  # "memory" (por proceso) o "postgres" (compartido)
+    SHARED_CACHE_MAX_SIZE: int = 1000  # Máximo de respuestas en la cache compartida
+    ENABLE_SEMANTIC_CACHE: bool = True  # Reutilizar respuestas de preguntas parafraseadas
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Similitud coseno mínima para un hit
+    SEMANTIC_CACHE_NEAR_MISS_MARGIN: float = 0.05  # Margen bajo el umbral contado como near-miss
+    SEMANTIC_CACHE_MAX_SIZE: int = 500  # Máximo de entradas por tipo de usuario
 
     # Rate Limiting (optimizado para costos)
     RATE_LIMIT_PER_MINUTE: int = 5  # Reducido para minimizar costos
 
+    # Endpoints operativos (recarga de índices, retención GDPR)
+    ADMIN_API_KEY: Optional[str] = None  # Cabecera X-Admin-Key; sin valor quedan deshabilitados
+
     # Testing
     TESTING: bool = False
 
@@ -78,10 +127,20 @@ class Settings(BaseSettings):
     )
     MAX_GDPR_CONSENT_ATTEMPTS: int = 3  # Máximo número de intentos para GDPR
 
+    # Escritura diferida (write-behind) de analytics fuera del camino de la request
+    ANALYTICS_WRITE_BEHIND: bool = True
+    ANALYTICS_QUEUE_MAX_SIZE: int = 1000  # Capacidad máxima de la cola en memoria
+    ANALYTICS_BATCH_SIZE: int = 50  # Flush al alcanzar N escrituras pendientes
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 2.0  # Flush como máximo cada N segundos
+    ANALYTICS_ENQUEUE_TIMEOUT_SECONDS: float = 0.05  # Espera máxima con la cola llena
+    ANALYTICS_DRAIN_TIMEOUT_SECONDS: float = 10.0  # Tiempo máximo de drenado al cerrar
+    ENABLE_DAILY_ROLLUPS: bool = True  # Mantener daily_analytics al escribir (no solo en batch)
+
 
     # GDPR Compliance
     DATA_RETENTION_DAYS: int = 365  # Retención máxima de datos
     ANONYMIZE_AFTER_DAYS: int = 90  # Anonimizar después de N días sin actividad
+    RETENTION_BATCH_SIZE: int = 500  # Sesiones por lote en la limpieza de retención
 
     # Logging
     LOG_LEVEL: str = "INFO"
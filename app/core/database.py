@@ -0,0 +1,65 @@
+"""
+Engine asíncrono compartido de base de datos.
+Un único pool de conexiones por instancia para todos los servicios.
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Obtener el engine asíncrono compartido (se crea en el primer uso).
+
+    Returns:
+        AsyncEngine: Engine con el pool de conexiones de la instancia
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.ASYNC_DATABASE_URL,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+        )
+        logger.info(
+            f"✓ Engine asíncrono creado (pool_size={settings.DB_POOL_SIZE}, "
+            f"max_overflow={settings.DB_MAX_OVERFLOW})"
+        )
+    return _engine
+
+
+def get_session_factory() -> sessionmaker:
+    """
+    Obtener la factoría de sesiones asíncronas sobre el engine compartido.
+
+    Returns:
+        sessionmaker: Factoría de AsyncSession
+    """
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(
+            get_async_engine(), expire_on_commit=False, class_=AsyncSession
+        )
+    return _session_factory
+
+
+async def dispose_engine() -> None:
+    """Cerrar las conexiones del pool compartido (al apagar la aplicación)."""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _session_factory = None
+        logger.info("✓ Pool de conexiones cerrado")
@@ -0,0 +1,44 @@
+"""
+Protección de los endpoints operativos con una API key de administración.
+"""
+
+import logging
+import secrets
+from typing import Optional
+
+from fastapi import HTTPException, Security, status
+from fastapi.security import APIKeyHeader
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+
+async def require_admin_key(
+    api_key: Optional[str] = Security(admin_key_header),
+) -> None:
+    """
+    Dependencia que exige la cabecera X-Admin-Key con el valor de ADMIN_API_KEY.
+
+    Si ADMIN_API_KEY no está configurada los endpoints protegidos quedan
+    deshabilitados, en lugar de abiertos.
+
+    Raises:
+        HTTPException: 403 si la clave falta, no coincide o no está configurada
+    """
+    expected = settings.ADMIN_API_KEY
+    if not expected:
+        logger.warning("⚠️ Endpoint de administración sin ADMIN_API_KEY")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Endpoint de administración deshabilitado",
+        )
+    if not api_key or not secrets.compare_digest(
+        api_key.encode("utf-8"), expected.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Credenciales de administración no válidas",
+        )
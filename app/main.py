@@ -15,6 +15,8 @@ from slowapi.util import get_remote_address
 
 from app.api.v1.endpoints import analytics, chat
 from app.core.config import settings
+from app.core.database import dispose_engine
+from app.services.analytics_service import analytics_service
 from app.services.rag_service import RAGService
 
 # Configurar logging
@@ -79,12 +81,30 @@ async def startup_event():
     logger.info(f"   Embeddings: HuggingFace (local)")
     logger.info(f"   Vector Collection: {settings.VECTOR_COLLECTION_NAME}")
 
+    # Writer en background para las escrituras de analytics
+    analytics_service.start_writer()
+
+    # Barrido periódico de sesiones inactivas del servicio RAG
+    if chat.rag_service is not None:
+        chat.rag_service.start_background_tasks()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Ejecutar al cerrar la aplicación"""
     logger.info("👋 Cerrando aplicación...")
 
+    # Drenar escrituras de analytics pendientes antes de salir
+    await analytics_service.stop_writer()
+
+    # Persistir caches locales del servicio RAG (p. ej. embeddings de consultas)
+    if chat.rag_service is not None:
+        await chat.rag_service.stop_background_tasks()
+        chat.rag_service.shutdown()
+
+    # Cerrar el pool de conexiones compartido
+    await dispose_engine()
+
 
 @app.get("/", tags=["root"])
 async def root():
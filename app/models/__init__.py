@@ -1,5 +1,5 @@
 """
-Modelos de base de datos para analytics y GDPR compliance.
+Modelos de base de datos para analytics, GDPR compliance y caches compartidas.
 """
 
 from app.models.analytics import (
@@ -9,5 +9,13 @@ from app.models.analytics import (
     GDPRConsent,
     SessionAnalytics,
 )
+from app.models.cache import ResponseCacheEntry
 
-__all__ = ["Base", "ChatSession", "SessionAnalytics", "GDPRConsent", "DailyAnalytics"]
+__all__ = [
+    "Base",
+    "ChatSession",
+    "SessionAnalytics",
+    "GDPRConsent",
+    "DailyAnalytics",
+    "ResponseCacheEntry",
+]
@@ -353,7 +353,9 @@ class ConversationPair(Base):
             "engagement_score >= 0.0 AND engagement_score <= 1.0",
             name="check_engagement_score_range",
         ),
-        Index("idx_conversation_pairs_session_id", "session_id"),
+        Index(
+            "idx_conversation_pairs_session_created", "session_id", "created_at", "id"
+        ),
         Index("idx_conversation_pairs_created_at", "created_at"),
         Index("idx_conversation_pairs_intent", "intent_category"),
         Index("idx_conversation_pairs_engagement", "engagement_score"),
@@ -402,6 +404,10 @@ class DailyAnalytics(Base):
     avg_engagement_score: Mapped[float] = mapped_column(
         Float, server_default="0.0", nullable=False
     )
+    # Suma de engagement de las sesiones del día (avg = suma / total_sessions)
+    engagement_sum: Mapped[float] = mapped_column(
+        Float, server_default="0.0", nullable=False
+    )
 
     # Análisis de contenido agregado
     top_technologies: Mapped[Optional[Dict[str, Any]]] = mapped_column(
@@ -0,0 +1,46 @@
+"""
+Modelos SQLAlchemy para caches compartidas entre instancias.
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import DateTime, Index, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.analytics import Base
+
+
+class ResponseCacheEntry(Base):
+    """
+    Modelo para la cache de respuestas del RAG compartida entre instancias.
+
+    Cada fila guarda la respuesta serializada (incluidas sus fuentes) y su
+    fecha de expiración.
+    """
+
+    __tablename__ = "response_cache"
+
+    # Primary key: SHA-256 de "<user_type>:<pregunta normalizada>" (la
+    # pregunta no tiene longitud máxima)
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    # Respuesta serializada (response, sources, model, ...)
+    response: Mapped[Dict[str, Any]] = mapped_column(
+        JSONB(astext_type=Text), nullable=False
+    )
+
+    # Timestamps
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default="NOW()", nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("idx_response_cache_expires_at", "expires_at"),
+        Index("idx_response_cache_created_at", "created_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ResponseCacheEntry(cache_key={self.cache_key}, expires_at={self.expires_at})>"
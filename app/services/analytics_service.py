@@ -3,17 +3,23 @@ Servicio de Analytics para captura de leads y métricas.
 Maneja el tracking de sesiones, cálculo de engagement y análisis de contenido.
 """
 
+import asyncio
+import json
 import logging
-import re
-from datetime import date, datetime
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy import and_, delete, func, insert, or_, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.database import get_async_engine, get_session_factory
 from app.models.analytics import (
     Base,
     ChatMessage,
@@ -29,9 +35,261 @@ from app.schemas.analytics import (
     SessionCreate,
     SessionUpdate,
 )
+from app.services.text_matching import CategoryMatcher
 
 logger = logging.getLogger(__name__)
 
+# Agregación diaria desde las tablas raw con la misma definición de día que los
+# rollups incrementales: sesiones creadas en [start, end) y tecnologías/intenciones
+# de los mensajes registrados en [start, end), sin recortar a un top-N
+_AGGREGATE_DAILY_METRICS_TEMPLATE = """
+    WITH day_sessions AS (
+        SELECT total_messages, data_captured, user_type, engagement_score
+        FROM chat_sessions
+        WHERE created_at >= :start AND created_at < :end
+    ),
+    session_totals AS (
+        SELECT
+            COUNT(*) AS total_sessions,
+            COALESCE(SUM(total_messages), 0) AS total_messages,
+            COUNT(*) FILTER (WHERE data_captured) AS leads_captured,
+            COUNT(*) FILTER (WHERE user_type = 'recruiter') AS recruiter_count,
+            COUNT(*) FILTER (WHERE user_type = 'client') AS client_count,
+            COUNT(*) FILTER (WHERE user_type = 'curious') AS curious_count,
+            COALESCE(AVG(engagement_score), 0.0) AS avg_engagement_score,
+            COALESCE(SUM(engagement_score), 0.0) AS engagement_sum
+        FROM day_sessions
+    ),
+    day_analytics AS (
+        SELECT technologies_mentioned, intent_categories
+        FROM session_analytics
+        WHERE created_at >= :start AND created_at < :end
+    ),
+    tech_counts AS (
+        SELECT tech.name, COUNT(*) AS total
+        FROM day_analytics da
+        CROSS JOIN LATERAL unnest(da.technologies_mentioned) AS tech(name)
+        GROUP BY tech.name
+    ),
+    intent_counts AS (
+        SELECT intent.name, COUNT(*) AS total
+        FROM day_analytics da
+        CROSS JOIN LATERAL unnest(da.intent_categories) AS intent(name)
+        GROUP BY intent.name
+    )
+    INSERT INTO daily_analytics (
+        date, total_sessions, total_messages, leads_captured,
+        recruiter_count, client_count, curious_count, avg_engagement_score,
+        engagement_sum, top_technologies, top_intents
+    )
+    SELECT
+        :target_date,
+        st.total_sessions, st.total_messages, st.leads_captured,
+        st.recruiter_count, st.client_count, st.curious_count,
+        st.avg_engagement_score, st.engagement_sum,
+        COALESCE((SELECT jsonb_object_agg(name, total) FROM tech_counts), '{{}}'::jsonb),
+        COALESCE((SELECT jsonb_object_agg(name, total) FROM intent_counts), '{{}}'::jsonb)
+    FROM session_totals st
+    ON CONFLICT (date) {on_conflict}
+"""
+
+# Sin rollups el batch es la única fuente del día: recalcula la fila completa
+_AGGREGATE_DAILY_METRICS_SQL = text(
+    _AGGREGATE_DAILY_METRICS_TEMPLATE.format(
+        on_conflict="""DO UPDATE SET
+        total_sessions = EXCLUDED.total_sessions,
+        total_messages = EXCLUDED.total_messages,
+        leads_captured = EXCLUDED.leads_captured,
+        recruiter_count = EXCLUDED.recruiter_count,
+        client_count = EXCLUDED.client_count,
+        curious_count = EXCLUDED.curious_count,
+        avg_engagement_score = EXCLUDED.avg_engagement_score,
+        engagement_sum = EXCLUDED.engagement_sum,
+        top_technologies = EXCLUDED.top_technologies,
+        top_intents = EXCLUDED.top_intents"""
+    )
+)
+
+# Con rollups solo rellena días sin fila (p.ej. anteriores a activarlos); no pisa
+# los contadores mantenidos en escritura
+_BACKFILL_DAILY_METRICS_SQL = text(
+    _AGGREGATE_DAILY_METRICS_TEMPLATE.format(on_conflict="DO NOTHING")
+)
+
+# Días con sesiones y sin fila en daily_analytics
+_MISSING_DAILY_ROWS_SQL = text(
+    """
+    SELECT DISTINCT CAST(cs.created_at AS date) AS day
+    FROM chat_sessions cs
+    WHERE cs.created_at < :before
+      AND NOT EXISTS (
+          SELECT 1 FROM daily_analytics da
+          WHERE da.date = CAST(cs.created_at AS date)
+      )
+    ORDER BY day
+    """
+)
+
+# Métricas generales directamente sobre chat_sessions y session_analytics
+_OVERALL_METRICS_RAW_SQL = text(
+    """
+    WITH tech_counts AS (
+        SELECT tech.name, COUNT(*) AS total
+        FROM session_analytics sa
+        CROSS JOIN LATERAL unnest(sa.technologies_mentioned) AS tech(name)
+        GROUP BY tech.name
+        ORDER BY total DESC, tech.name
+        LIMIT 10
+    ),
+    intent_counts AS (
+        SELECT intent.name, COUNT(*) AS total
+        FROM session_analytics sa
+        CROSS JOIN LATERAL unnest(sa.intent_categories) AS intent(name)
+        GROUP BY intent.name
+        ORDER BY total DESC, intent.name
+        LIMIT 10
+    )
+    SELECT
+        COUNT(*) AS total_sessions,
+        COALESCE(SUM(total_messages), 0) AS total_messages,
+        COUNT(*) FILTER (WHERE data_captured) AS leads_captured,
+        COUNT(*) FILTER (WHERE user_type = 'recruiter') AS recruiter_count,
+        COUNT(*) FILTER (WHERE user_type = 'client') AS client_count,
+        COUNT(*) FILTER (WHERE user_type = 'curious') AS curious_count,
+        COALESCE(AVG(engagement_score), 0.0) AS avg_engagement_score,
+        COALESCE((SELECT jsonb_object_agg(name, total) FROM tech_counts), '{}'::jsonb)
+            AS top_technologies,
+        COALESCE((SELECT jsonb_object_agg(name, total) FROM intent_counts), '{}'::jsonb)
+            AS top_intents
+    FROM chat_sessions
+    """
+).columns(top_technologies=JSONB, top_intents=JSONB)
+
+
+# Patrones para detección de tecnologías
+TECHNOLOGY_PATTERNS = {
+    "python": [r"\bpython\b", r"\bdjango\b", r"\bflask\b", r"\bfastapi\b"],
+    "javascript": [
+        r"\bjavascript\b",
+        r"\bnode\.?js\b",
+        r"\breact\b",
+        r"\bvue\b",
+        r"\bangular\b",
+    ],
+    "java": [r"\bjava\b", r"\bspring\b", r"\bmaven\b", r"\bgradle\b"],
+    "cloud": [
+        r"\bgcp\b",
+        r"\baws\b",
+        r"\bazure\b",
+        r"\bcloud\b",
+        r"\bkubernetes\b",
+    ],
+    "ai": [
+        r"\bai\b",
+        r"\bmachine learning\b",
+        r"\bdeep learning\b",
+        r"\bllm\b",
+        r"\brag\b",
+    ],
+    "database": [r"\bpostgresql\b", r"\bmysql\b", r"\bmongodb\b", r"\bredis\b"],
+    "devops": [r"\bdocker\b", r"\bci/cd\b", r"\bjenkins\b", r"\bterraform\b"],
+}
+
+# Patrones para detección de intenciones
+INTENT_PATTERNS = {
+    "experience": [
+        r"\bexperiencia\b",
+        r"\baños\b",
+        r"\btrabajo\b",
+        r"\bempresa\b",
+        r"\bproyecto\b",
+    ],
+    "skills": [
+        r"\bhabilidades\b",
+        r"\bconocimientos\b",
+        r"\btecnologías\b",
+        r"\bprogramar\b",
+    ],
+    "education": [
+        r"\bestudios\b",
+        r"\buniversidad\b",
+        r"\bformación\b",
+        r"\bcertificación\b",
+    ],
+    "availability": [
+        r"\bdisponibilidad\b",
+        r"\bcontratar\b",
+        r"\boportunidad\b",
+        r"\btrabajo\b",
+    ],
+}
+
+
+# Contadores de daily_analytics mantenidos de forma incremental
+_ROLLUP_COUNTERS = (
+    "total_sessions",
+    "total_messages",
+    "leads_captured",
+    "recruiter_count",
+    "client_count",
+    "curious_count",
+)
+
+# Tipos de usuario con contador propio en daily_analytics
+_USER_TYPES = ("recruiter", "client", "curious")
+
+# Máximo de sesiones recién creadas recordadas para no consultar su historial
+_NEW_SESSIONS_MAX_SIZE = 10000
+
+# Suma de dos mapas JSONB {clave: conteo}
+_MERGE_JSONB_COUNTS = """
+    (SELECT COALESCE(jsonb_object_agg(key, total), '{{}}'::jsonb)
+     FROM (
+         SELECT key, SUM(value::int) AS total
+         FROM (
+             SELECT * FROM jsonb_each_text(COALESCE(daily_analytics.{column}, '{{}}'::jsonb))
+             UNION ALL
+             SELECT * FROM jsonb_each_text(EXCLUDED.{column})
+         ) merged
+         GROUP BY key
+     ) counts)
+"""
+
+# Upsert incremental de la fila del día: suma deltas (también la suma de
+# engagement) y deriva el engagement medio sin recorrer chat_sessions. La media se
+# acota al rango del check constraint por si llega un delta desfasado.
+_UPSERT_DAILY_ROLLUP_SQL = text(
+    f"""
+    INSERT INTO daily_analytics (
+        date, total_sessions, total_messages, leads_captured,
+        recruiter_count, client_count, curious_count, avg_engagement_score,
+        engagement_sum, top_technologies, top_intents
+    )
+    VALUES (
+        :day, :total_sessions, :total_messages, :leads_captured,
+        :recruiter_count, :client_count, :curious_count,
+        LEAST(GREATEST(COALESCE(
+            CAST(:engagement_sum AS double precision) / NULLIF(:total_sessions, 0),
+            0.0), 0.0), 1.0),
+        :engagement_sum, CAST(:technologies AS jsonb), CAST(:intents AS jsonb)
+    )
+    ON CONFLICT (date) DO UPDATE SET
+        total_sessions = daily_analytics.total_sessions + EXCLUDED.total_sessions,
+        total_messages = daily_analytics.total_messages + EXCLUDED.total_messages,
+        leads_captured = daily_analytics.leads_captured + EXCLUDED.leads_captured,
+        recruiter_count = daily_analytics.recruiter_count + EXCLUDED.recruiter_count,
+        client_count = daily_analytics.client_count + EXCLUDED.client_count,
+        curious_count = daily_analytics.curious_count + EXCLUDED.curious_count,
+        engagement_sum = daily_analytics.engagement_sum + EXCLUDED.engagement_sum,
+        avg_engagement_score = LEAST(GREATEST(COALESCE(
+            (daily_analytics.engagement_sum + EXCLUDED.engagement_sum)
+            / NULLIF(daily_analytics.total_sessions + EXCLUDED.total_sessions, 0),
+            0.0), 0.0), 1.0),
+        top_technologies = {_MERGE_JSONB_COUNTS.strip().format(column="top_technologies")},
+        top_intents = {_MERGE_JSONB_COUNTS.strip().format(column="top_intents")}
+    """
+)
+
 
 class AnalyticsService:
     """
@@ -47,6 +305,30 @@ class AnalyticsService:
 
     def __init__(self):
         """Inicializar el servicio de analytics."""
+        # Cola de escritura diferida (se crea al arrancar el writer)
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._writer_stopping = False
+        self.writer_stats: Dict[str, Any] = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "backpressure_waits": 0,
+            "batches": 0,
+            "row_fallbacks": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "rollups_flushed": 0,
+        }
+
+        # Deltas de daily_analytics pendientes de volcar ({fecha: contadores})
+        self._pending_rollups: Dict[date, Dict[str, Any]] = {}
+
+        # Sesiones creadas por esta instancia cuyo historial aún no se ha pedido:
+        # no tienen turnos persistidos, get_recent_turns no consulta la BD
+        self._new_sessions: "OrderedDict[str, None]" = OrderedDict()
+
         # No inicializar en modo testing
         if settings.TESTING:
             logger.info(
@@ -54,76 +336,17 @@ class AnalyticsService:
             )
             return
 
-        self.engine = create_async_engine(
-            settings.ASYNC_DATABASE_URL,
-            pool_size=5,
-            max_overflow=10,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-        )
+        # Pool de conexiones compartido con el resto de servicios
+        self.engine = get_async_engine()
+        self.AsyncSessionLocal = get_session_factory()
 
-        self.AsyncSessionLocal = sessionmaker(
-            self.engine, expire_on_commit=False, class_=AsyncSession
+        # Tablas de patrones compiladas en un único matcher de una pasada
+        self.technology_patterns = TECHNOLOGY_PATTERNS
+        self.intent_patterns = INTENT_PATTERNS
+        self._category_matcher = CategoryMatcher(
+            {"technologies": TECHNOLOGY_PATTERNS, "intents": INTENT_PATTERNS}
         )
 
-        # Patrones para detección de tecnologías
-        self.technology_patterns = {
-            "python": [r"\bpython\b", r"\bdjango\b", r"\bflask\b", r"\bfastapi\b"],
-            "javascript": [
-                r"\bjavascript\b",
-                r"\bnode\.?js\b",
-                r"\breact\b",
-                r"\bvue\b",
-                r"\bangular\b",
-            ],
-            "java": [r"\bjava\b", r"\bspring\b", r"\bmaven\b", r"\bgradle\b"],
-            "cloud": [
-                r"\bgcp\b",
-                r"\baws\b",
-                r"\bazure\b",
-                r"\bcloud\b",
-                r"\bkubernetes\b",
-            ],
-            "ai": [
-                r"\bai\b",
-                r"\bmachine learning\b",
-                r"\bdeep learning\b",
-                r"\bllm\b",
-                r"\brag\b",
-            ],
-            "database": [r"\bpostgresql\b", r"\bmysql\b", r"\bmongodb\b", r"\bredis\b"],
-            "devops": [r"\bdocker\b", r"\bci/cd\b", r"\bjenkins\b", r"\bterraform\b"],
-        }
-
-        # Patrones para detección de intenciones
-        self.intent_patterns = {
-            "experience": [
-                r"\bexperiencia\b",
-                r"\baños\b",
-                r"\btrabajo\b",
-                r"\bempresa\b",
-                r"\bproyecto\b",
-            ],
-            "skills": [
-                r"\bhabilidades\b",
-                r"\bconocimientos\b",
-                r"\btecnologías\b",
-                r"\bprogramar\b",
-            ],
-            "education": [
-                r"\bestudios\b",
-                r"\buniversidad\b",
-                r"\bformación\b",
-                r"\bcertificación\b",
-            ],
-            "availability": [
-                r"\bdisponibilidad\b",
-                r"\bcontratar\b",
-                r"\boportunidad\b",
-                r"\btrabajo\b",
-            ],
-        }
-
         logger.info("✓ AnalyticsService inicializado")
 
     async def track_session(
@@ -145,30 +368,13 @@ class AnalyticsService:
         Returns:
             ChatSession: Sesión creada o actualizada
         """
-        # Obtener o crear sesión
-        session = await self.get_or_create_session(
+        return await self.upsert_session_and_increment(
             session_id=session_id,
             email=email,
             user_type=user_type,
             linkedin=linkedin,
         )
 
-        # Incrementar contador de mensajes
-        await self.increment_message_count(session_id)
-
-        # Obtener sesión actualizada
-        async with await self.get_session() as db:
-            result = await db.execute(
-                select(ChatSession).where(ChatSession.session_id == session_id)
-            )
-            updated_session = result.scalar_one_or_none()
-
-            if updated_session:
-                await db.refresh(updated_session)
-                return updated_session
-            else:
-                return session
-
     async def get_session(self) -> AsyncSession:
         """Obtener sesión de base de datos."""
         if settings.TESTING:
@@ -256,6 +462,124 @@ class AnalyticsService:
                 db.rollback()
                 raise
 
+    async def upsert_session_and_increment(
+        self,
+        session_id: str,
+        email: Optional[str] = None,
+        user_type: Optional[str] = None,
+        linkedin: Optional[str] = None,
+    ) -> ChatSession:
+        """
+        Crear la sesión o incrementar su contador de mensajes en una sola sentencia.
+
+        Usa INSERT ... ON CONFLICT DO UPDATE ... RETURNING, de modo que el
+        incremento es atómico frente a requests concurrentes de la misma sesión
+        y el engagement se recalcula en SQL con la misma fórmula que
+        _calculate_engagement_score.
+
+        Args:
+            session_id: ID único de la sesión
+            email: Email del usuario (opcional, no pisa uno existente con None)
+            user_type: Tipo de usuario (opcional)
+            linkedin: LinkedIn del usuario (opcional)
+
+        Returns:
+            ChatSession: Estado de la sesión tras el incremento
+        """
+        if settings.TESTING:
+            return ChatSession(
+                session_id=session_id,
+                email=email,
+                user_type=user_type,
+                linkedin=linkedin,
+                total_messages=1,
+                engagement_score=0.1,
+                data_captured=False,
+                gdpr_consent_given=False,
+            )
+
+        table = ChatSession.__table__
+        insert_stmt = pg_insert(ChatSession).values(
+            session_id=session_id,
+            email=email,
+            user_type=user_type,
+            linkedin=linkedin,
+            total_messages=1,
+            engagement_score=0.1,  # Primer mensaje de una sesión recién creada
+        )
+
+        new_total = table.c.total_messages + 1
+        session_hours = (
+            func.extract("epoch", func.now() - table.c.created_at) / 3600.0
+        )
+        engagement = func.least(
+            func.least(new_total / 10.0, 0.6) + func.least(session_hours / 2.0, 0.4),
+            1.0,
+        )
+
+        stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[table.c.session_id],
+            set_={
+                "total_messages": new_total,
+                "last_activity": func.now(),
+                "engagement_score": engagement,
+                "email": func.coalesce(insert_stmt.excluded.email, table.c.email),
+                "user_type": func.coalesce(
+                    insert_stmt.excluded.user_type, table.c.user_type
+                ),
+                "linkedin": func.coalesce(
+                    insert_stmt.excluded.linkedin, table.c.linkedin
+                ),
+            },
+        ).returning(
+            ChatSession,
+            # RETURNING ve la foto previa a la sentencia: score anterior o NULL
+            # si la fila es nueva. Con dos upserts simultáneos de la misma sesión
+            # el delta de engagement es aproximado.
+            select(ChatSession.engagement_score)
+            .where(ChatSession.session_id == session_id)
+            .scalar_subquery()
+            .label("previous_engagement"),
+        )
+
+        async with await self.get_session() as db:
+            try:
+                result = await db.execute(
+                    stmt, execution_options={"populate_existing": True}
+                )
+                session, previous_engagement = result.one()
+                await db.commit()
+
+            except SQLAlchemyError as e:
+                logger.error(f"❌ Error en upsert de sesión {session_id}: {e}")
+                await db.rollback()
+                raise
+
+        counters = {"total_messages": 1}
+        if session.total_messages == 1:
+            self._mark_new_session(session_id)
+            counters["total_sessions"] = 1
+            if session.user_type in _USER_TYPES:
+                counters[f"{session.user_type}_count"] = 1
+
+        # El engagement de la sesión cuenta en el día en que se creó, igual que
+        # en aggregate_daily_metrics; solo se suma la variación del score
+        engagement_delta = session.engagement_score - (previous_engagement or 0.0)
+        session_day = session.created_at.date()
+        if session_day == date.today():
+            counters["engagement_sum"] = engagement_delta
+            await self._record_daily(counters)
+        else:
+            await self._record_daily(counters)
+            await self._record_daily(
+                {"engagement_sum": engagement_delta}, day=session_day
+            )
+
+        logger.debug(
+            f"✓ Sesión {session_id} actualizada (mensajes={session.total_messages})"
+        )
+        return session
+
     async def increment_message_count(self, session_id: str) -> bool:
         """
         Incrementar el contador de mensajes de una sesión.
@@ -338,6 +662,9 @@ class AnalyticsService:
                     )
                     return False
 
+                was_captured = session.data_captured
+                previous_type = session.user_type
+
                 # Actualizar datos
                 session.email = email
                 session.user_type = user_type
@@ -347,14 +674,26 @@ class AnalyticsService:
 
                 await db.commit()
 
-                logger.info(f"✓ Datos capturados para sesión: {session_id}")
-                return True
-
             except SQLAlchemyError as e:
                 logger.error(f"❌ Error capturando datos para {session_id}: {e}")
                 await db.rollback()
                 return False
 
+        counters = {}
+        if not was_captured:
+            counters["leads_captured"] = 1
+        if user_type != previous_type:
+            # La sesión pasa de un tipo a otro: mover su conteo
+            if user_type in _USER_TYPES:
+                counters[f"{user_type}_count"] = 1
+            if previous_type in _USER_TYPES:
+                counters[f"{previous_type}_count"] = -1
+        if counters:
+            await self._record_daily(counters)
+
+        logger.info(f"✓ Datos capturados para sesión: {session_id}")
+        return True
+
     async def track_message_metrics(
         self, session_id: str, message: str, response_time_ms: Optional[int] = None
     ) -> bool:
@@ -376,8 +715,7 @@ class AnalyticsService:
         async with await self.get_session() as db:
             try:
                 # Detectar tecnologías e intenciones
-                technologies = self._detect_technologies(message)
-                intents = self._detect_intent_categories(message)
+                technologies, intents = self._detect_categories(message)
 
                 # Crear registro de analytics
                 analytics = SessionAnalytics(
@@ -422,6 +760,19 @@ class AnalyticsService:
 
         return min(message_factor + time_factor, 1.0)
 
+    def _detect_categories(self, message: str) -> Tuple[List[str], List[str]]:
+        """
+        Detectar tecnologías e intenciones del mensaje en una sola pasada.
+
+        Args:
+            message: Contenido del mensaje
+
+        Returns:
+            Tuple[List[str], List[str]]: (tecnologías, intenciones) detectadas
+        """
+        detected = self._category_matcher.match(message)
+        return detected["technologies"], detected["intents"]
+
     def _detect_technologies(self, message: str) -> List[str]:
         """
         Detectar tecnologías mencionadas en el mensaje.
@@ -432,16 +783,7 @@ class AnalyticsService:
         Returns:
             List[str]: Lista de tecnologías detectadas
         """
-        message_lower = message.lower()
-        detected_technologies = []
-
-        for tech_category, patterns in self.technology_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, message_lower, re.IGNORECASE):
-                    detected_technologies.append(tech_category)
-                    break  # Solo agregar una vez por categoría
-
-        return detected_technologies
+        return self._detect_categories(message)[0]
 
     def _detect_intent_categories(self, message: str) -> List[str]:
         """
@@ -453,16 +795,7 @@ class AnalyticsService:
         Returns:
             List[str]: Lista de intenciones detectadas
         """
-        message_lower = message.lower()
-        detected_intents = []
-
-        for intent_category, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, message_lower, re.IGNORECASE):
-                    detected_intents.append(intent_category)
-                    break  # Solo agregar una vez por categoría
-
-        return detected_intents
+        return self._detect_categories(message)[1]
 
     async def get_session_analytics(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -534,6 +867,12 @@ class AnalyticsService:
         """
         Agregar métricas diarias para una fecha específica.
 
+        Toda la agregación (conteos por tipo de usuario, engagement medio y
+        tecnologías/intenciones) se resuelve en PostgreSQL con un único
+        INSERT ... SELECT ... ON CONFLICT. Sin rollups incrementales recalcula
+        la fila del día; con ENABLE_DAILY_ROLLUPS solo crea la fila si el día no
+        la tiene, para no pisar los contadores mantenidos en escritura.
+
         Args:
             target_date: Fecha objetivo (por defecto: hoy)
 
@@ -543,95 +882,26 @@ class AnalyticsService:
         if target_date is None:
             target_date = date.today()
 
+        start_datetime = datetime.combine(target_date, datetime.min.time())
+        end_datetime = start_datetime + timedelta(days=1)
+        statement = (
+            _BACKFILL_DAILY_METRICS_SQL
+            if settings.ENABLE_DAILY_ROLLUPS
+            else _AGGREGATE_DAILY_METRICS_SQL
+        )
+
         async with await self.get_session() as db:
             try:
-                # Verificar si ya existe agregación para esta fecha
-                existing_result = await db.execute(
-                    select(DailyAnalytics).where(DailyAnalytics.date == target_date)
-                )
-                existing = existing_result.scalar_one_or_none()
-
-                if existing:
-                    logger.info(f"✓ Métricas diarias ya existen para {target_date}")
-                    return True
-
-                # Calcular métricas del día
-                start_datetime = datetime.combine(target_date, datetime.min.time())
-                end_datetime = datetime.combine(target_date, datetime.max.time())
-
-                # Obtener sesiones del día
-                sessions_result = await db.execute(
-                    select(ChatSession).where(
-                        and_(
-                            ChatSession.created_at >= start_datetime,
-                            ChatSession.created_at <= end_datetime,
-                        )
-                    )
-                )
-                sessions = sessions_result.scalars().all()
-
-                # Calcular métricas
-                total_sessions = len(sessions)
-                total_messages = sum(s.total_messages for s in sessions)
-                leads_captured = sum(1 for s in sessions if s.data_captured)
-
-                recruiter_count = sum(1 for s in sessions if s.user_type == "recruiter")
-                client_count = sum(1 for s in sessions if s.user_type == "client")
-                curious_count = sum(1 for s in sessions if s.user_type == "curious")
-
-                avg_engagement_score = (
-                    sum(s.engagement_score for s in sessions) / total_sessions
-                    if total_sessions > 0
-                    else 0.0
-                )
-
-                # Obtener tecnologías e intenciones más frecuentes
-                technologies_count = {}
-                intents_count = {}
-
-                for session in sessions:
-                    analytics_result = await db.execute(
-                        select(SessionAnalytics).where(
-                            SessionAnalytics.session_id == session.session_id
-                        )
-                    )
-                    analytics_query = analytics_result.scalars().all()
-
-                    for analytics in analytics_query:
-                        if analytics.technologies_mentioned:
-                            for tech in analytics.technologies_mentioned:
-                                technologies_count[tech] = (
-                                    technologies_count.get(tech, 0) + 1
-                                )
-
-                        if analytics.intent_categories:
-                            for intent in analytics.intent_categories:
-                                intents_count[intent] = intents_count.get(intent, 0) + 1
-
-                # Crear registro de métricas diarias
-                daily_analytics = DailyAnalytics(
-                    date=target_date,
-                    total_sessions=total_sessions,
-                    total_messages=total_messages,
-                    leads_captured=leads_captured,
-                    recruiter_count=recruiter_count,
-                    client_count=client_count,
-                    curious_count=curious_count,
-                    avg_engagement_score=avg_engagement_score,
-                    top_technologies=dict(
-                        sorted(
-                            technologies_count.items(), key=lambda x: x[1], reverse=True
-                        )[:10]
-                    ),
-                    top_intents=dict(
-                        sorted(intents_count.items(), key=lambda x: x[1], reverse=True)[
-                            :10
-                        ]
-                    ),
+                # Una sola sentencia: agregación en SQL + upsert idempotente
+                await db.execute(
+                    statement,
+                    {
+                        "target_date": target_date,
+                        "start": start_datetime,
+                        "end": end_datetime,
+                    },
                 )
-
-                db.add(daily_analytics)
-                db.commit()
+                await db.commit()
 
                 logger.info(f"✓ Métricas diarias agregadas para {target_date}")
                 return True
@@ -640,9 +910,39 @@ class AnalyticsService:
                 logger.error(
                     f"❌ Error agregando métricas diarias para {target_date}: {e}"
                 )
-                db.rollback()
+                await db.rollback()
                 return False
 
+    async def backfill_daily_metrics(self) -> int:
+        """
+        Crear las filas de daily_analytics que faltan para días anteriores a hoy.
+
+        Pensado para ejecutarse una vez al activar ENABLE_DAILY_ROLLUPS: los
+        días con sesiones de antes de los rollups no tienen fila y
+        get_overall_metrics no los contaría. No modifica días que ya tienen fila.
+
+        Returns:
+            int: Número de días rellenados
+        """
+        async with await self.get_session() as db:
+            try:
+                result = await db.execute(
+                    _MISSING_DAILY_ROWS_SQL,
+                    {"before": datetime.combine(date.today(), datetime.min.time())},
+                )
+                missing_days = [row.day for row in result]
+            except SQLAlchemyError as e:
+                logger.error(f"❌ Error buscando días sin métricas diarias: {e}")
+                return 0
+
+        filled = 0
+        for day in missing_days:
+            if await self.aggregate_daily_metrics(day):
+                filled += 1
+
+        logger.info(f"✓ Backfill de daily_analytics: {filled} días rellenados")
+        return filled
+
     async def get_daily_metrics(self, days: int = 30) -> List[Dict[str, Any]]:
         """
         Obtener métricas diarias de los últimos N días.
@@ -696,91 +996,56 @@ class AnalyticsService:
         """
         Obtener métricas generales del sistema.
 
+        Con ENABLE_DAILY_ROLLUPS suma los rollups de daily_analytics (una fila
+        por día) en lugar de recorrer chat_sessions y session_analytics
+        completos; los días anteriores a los rollups se incorporan con
+        backfill_daily_metrics. Sin rollups se calcula sobre las tablas raw.
+
         Returns:
             AnalyticsMetrics: Métricas agregadas
         """
         async with await self.get_session() as db:
             try:
-                # Obtener métricas básicas
-                total_sessions_result = await db.execute(
-                    select(func.count(ChatSession.session_id))
-                )
-                total_sessions = total_sessions_result.scalar()
-
-                total_messages_result = await db.execute(
-                    select(func.sum(ChatSession.total_messages))
-                )
-                total_messages = total_messages_result.scalar() or 0
-
-                leads_captured_result = await db.execute(
-                    select(func.count(ChatSession.session_id)).where(
-                        ChatSession.data_captured == True
+                if not settings.ENABLE_DAILY_ROLLUPS:
+                    result = await db.execute(_OVERALL_METRICS_RAW_SQL)
+                    row = result.mappings().one()
+                    avg_engagement = float(row["avg_engagement_score"])
+                    return AnalyticsMetrics(
+                        **{counter: row[counter] for counter in _ROLLUP_COUNTERS},
+                        avg_engagement_score=round(avg_engagement, 3),
+                        top_technologies=row["top_technologies"] or {},
+                        top_intents=row["top_intents"] or {},
                     )
-                )
-                leads_captured = leads_captured_result.scalar()
 
-                # Distribución por tipo de usuario
-                recruiter_count_result = await db.execute(
-                    select(func.count(ChatSession.session_id)).where(
-                        ChatSession.user_type == "recruiter"
-                    )
-                )
-                recruiter_count = recruiter_count_result.scalar()
-                client_count_result = await db.execute(
-                    select(func.count(ChatSession.session_id)).where(
-                        ChatSession.user_type == "client"
-                    )
-                )
-                client_count = client_count_result.scalar()
+                result = await db.execute(select(DailyAnalytics))
+                rows = result.scalars().all()
 
-                curious_count_result = await db.execute(
-                    select(func.count(ChatSession.session_id)).where(
-                        ChatSession.user_type == "curious"
-                    )
-                )
-                curious_count = curious_count_result.scalar()
+                # Los cambios de tipo de usuario restan en el día del cambio
+                totals = {
+                    counter: max(sum(getattr(row, counter) or 0 for row in rows), 0)
+                    for counter in _ROLLUP_COUNTERS
+                }
 
-                # Engagement promedio
-                avg_engagement_result = await db.execute(
-                    select(func.avg(ChatSession.engagement_score))
+                # Engagement promedio: suma de engagement entre sesiones totales
+                engagement_sum = sum(row.engagement_sum or 0.0 for row in rows)
+                avg_engagement = (
+                    min(max(engagement_sum / totals["total_sessions"], 0.0), 1.0)
+                    if totals["total_sessions"]
+                    else 0.0
                 )
-                avg_engagement = avg_engagement_result.scalar() or 0.0
 
                 # Tecnologías e intenciones más frecuentes
-                technologies_count = {}
-                intents_count = {}
-
-                analytics_result = await db.execute(select(SessionAnalytics))
-                analytics_query = analytics_result.scalars().all()
-                for analytics in analytics_query:
-                    if analytics.technologies_mentioned:
-                        for tech in analytics.technologies_mentioned:
-                            technologies_count[tech] = (
-                                technologies_count.get(tech, 0) + 1
-                            )
-
-                    if analytics.intent_categories:
-                        for intent in analytics.intent_categories:
-                            intents_count[intent] = intents_count.get(intent, 0) + 1
+                technologies_count: Counter = Counter()
+                intents_count: Counter = Counter()
+                for row in rows:
+                    technologies_count.update(row.top_technologies or {})
+                    intents_count.update(row.top_intents or {})
 
                 return AnalyticsMetrics(
-                    total_sessions=total_sessions,
-                    total_messages=total_messages,
-                    leads_captured=leads_captured,
-                    recruiter_count=recruiter_count,
-                    client_count=client_count,
-                    curious_count=curious_count,
+                    **totals,
                     avg_engagement_score=round(avg_engagement, 3),
-                    top_technologies=dict(
-                        sorted(
-                            technologies_count.items(), key=lambda x: x[1], reverse=True
-                        )[:10]
-                    ),
-                    top_intents=dict(
-                        sorted(intents_count.items(), key=lambda x: x[1], reverse=True)[
-                            :10
-                        ]
-                    ),
+                    top_technologies=dict(technologies_count.most_common(10)),
+                    top_intents=dict(intents_count.most_common(10)),
                 )
 
             except SQLAlchemyError as e:
@@ -1012,6 +1277,59 @@ class AnalyticsService:
             logger.error(f"❌ Error obteniendo pares de conversación: {e}")
             return []
 
+    def _mark_new_session(self, session_id: str) -> None:
+        """Recordar una sesión recién creada (sin turnos persistidos)."""
+        self._new_sessions[session_id] = None
+        while len(self._new_sessions) > _NEW_SESSIONS_MAX_SIZE:
+            self._new_sessions.popitem(last=False)
+
+    async def get_recent_turns(
+        self, session_id: str, limit: int, max_idle_seconds: Optional[float] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Obtener los últimos pares pregunta/respuesta de una sesión.
+
+        Usa el índice (session_id, created_at, id), de modo que es un único
+        index scan de como mucho `limit` filas. Las sesiones que esta instancia
+        acaba de crear no tienen turnos y se resuelven sin consultar la BD.
+
+        Args:
+            session_id: ID de la sesión
+            limit: Número máximo de pares
+            max_idle_seconds: Si el último turno es más antiguo, la sesión se
+                considera caducada y no se devuelve nada (opcional)
+
+        Returns:
+            Lista de (pregunta, respuesta) en orden cronológico
+        """
+        if settings.TESTING or limit <= 0:
+            return []
+        if session_id in self._new_sessions:
+            del self._new_sessions[session_id]
+            return []
+
+        columns = [ConversationPair.user_question, ConversationPair.bot_response]
+        if max_idle_seconds is not None:
+            # Comparado con el reloj del servidor, el mismo que fija created_at
+            cutoff = func.now() - timedelta(seconds=max_idle_seconds)
+            columns.append((ConversationPair.created_at >= cutoff).label("active"))
+
+        async with await self.get_session() as db:
+            result = await db.execute(
+                select(*columns)
+                .where(ConversationPair.session_id == session_id)
+                .order_by(
+                    ConversationPair.created_at.desc(), ConversationPair.id.desc()
+                )
+                .limit(limit)
+            )
+            rows = result.all()
+
+        # Misma caducidad que en memoria: inactiva desde el último turno
+        if rows and max_idle_seconds is not None and not rows[0].active:
+            return []
+        return [(row.user_question, row.bot_response) for row in reversed(rows)]
+
     async def get_top_questions(self, limit: int = 20) -> List[Dict[str, Any]]:
         """
         Obtiene las preguntas más frecuentes para análisis de interés.
@@ -1029,8 +1347,6 @@ class AnalyticsService:
         try:
             async with await self.get_session() as db:
                 # Usar SQL crudo para manejar unnest y remover nulos de forma segura
-                from sqlalchemy import text
-
                 sql = text(
                     """
                     SELECT 
@@ -1062,6 +1378,374 @@ class AnalyticsService:
             logger.error(f"❌ Error obteniendo preguntas top: {e}")
             return []
 
+    # ========================================================================
+    # ESCRITURA DIFERIDA (WRITE-BEHIND)
+    # ========================================================================
+
+    def start_writer(self) -> None:
+        """
+        Arrancar el writer en background que vuelca la cola de analytics a la BD.
+
+        Debe llamarse desde el evento de startup (con el event loop corriendo).
+        """
+        if settings.TESTING or not settings.ANALYTICS_WRITE_BEHIND:
+            return
+        if self._writer_task and not self._writer_task.done():
+            return
+
+        self._write_queue = asyncio.Queue(maxsize=settings.ANALYTICS_QUEUE_MAX_SIZE)
+        self._writer_stopping = False
+        self._writer_task = asyncio.create_task(self._run_writer())
+        logger.info(
+            f"✓ Writer de analytics iniciado (batch={settings.ANALYTICS_BATCH_SIZE}, "
+            f"intervalo={settings.ANALYTICS_FLUSH_INTERVAL_SECONDS}s)"
+        )
+
+    async def stop_writer(self) -> None:
+        """Detener el writer drenando las escrituras pendientes de la cola."""
+        if not self._writer_task:
+            return
+
+        self._writer_stopping = True
+        try:
+            await asyncio.wait_for(
+                self._writer_task, timeout=settings.ANALYTICS_DRAIN_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pending = self._write_queue.qsize() if self._write_queue else 0
+            logger.warning(
+                f"⚠️ Timeout drenando la cola de analytics, {pending} escrituras perdidas"
+            )
+            self._writer_task.cancel()
+        finally:
+            self._writer_task = None
+        logger.info("✓ Writer de analytics detenido")
+
+    def _writer_running(self) -> bool:
+        """Indica si el writer está activo y acepta escrituras."""
+        return (
+            self._writer_task is not None
+            and not self._writer_task.done()
+            and not self._writer_stopping
+        )
+
+    async def _enqueue(self, kind: str, payload: Dict[str, Any]) -> bool:
+        """
+        Encolar una escritura aplicando backpressure acotado.
+
+        Si la cola está llena se espera como máximo ANALYTICS_ENQUEUE_TIMEOUT_SECONDS;
+        pasado ese tiempo la escritura se descarta para no penalizar la request.
+
+        Returns:
+            bool: True si la escritura quedó encolada
+        """
+        item = (kind, payload)
+        try:
+            self._write_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.writer_stats["backpressure_waits"] += 1
+            try:
+                await asyncio.wait_for(
+                    self._write_queue.put(item),
+                    timeout=settings.ANALYTICS_ENQUEUE_TIMEOUT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                self.writer_stats["dropped"] += 1
+                logger.warning(
+                    f"⚠️ Cola de analytics llena, descartando escritura {kind}"
+                )
+                return False
+
+        self.writer_stats["enqueued"] += 1
+        return True
+
+    async def enqueue_message_metrics(
+        self, session_id: str, message: str, response_time_ms: Optional[int] = None
+    ) -> bool:
+        """
+        Encolar las métricas de un mensaje para escritura diferida.
+
+        Equivalente a track_message_metrics pero sin tocar la BD en la request;
+        si el writer no está activo se escribe directamente.
+
+        Args:
+            session_id: ID de la sesión
+            message: Contenido del mensaje
+            response_time_ms: Tiempo de respuesta en ms (opcional)
+
+        Returns:
+            bool: True si la escritura fue encolada o guardada
+        """
+        if settings.TESTING:
+            return True
+
+        technologies, intents = self._detect_categories(message)
+        await self._record_daily(technologies=technologies, intents=intents)
+
+        if not self._writer_running():
+            return await self.track_message_metrics(
+                session_id=session_id,
+                message=message,
+                response_time_ms=response_time_ms,
+            )
+
+        return await self._enqueue(
+            "message_metrics",
+            {
+                "session_id": session_id,
+                "message_count": 1,
+                "avg_response_time_ms": response_time_ms,
+                "technologies_mentioned": technologies,
+                "intent_categories": intents,
+            },
+        )
+
+    async def enqueue_conversation_pair(self, session_id: str, **fields: Any) -> bool:
+        """
+        Encolar un par de conversación para escritura diferida.
+
+        Acepta los mismos argumentos que save_conversation_pair; si el writer
+        no está activo se guarda directamente.
+
+        Returns:
+            bool: True si la escritura fue encolada o guardada
+        """
+        if settings.TESTING:
+            return True
+        if not self._writer_running():
+            return await self.save_conversation_pair(session_id=session_id, **fields)
+
+        return await self._enqueue(
+            "conversation_pair", {"session_id": session_id, **fields}
+        )
+
+    async def _run_writer(self) -> None:
+        """Bucle del writer: agrupa escrituras por tamaño o por tiempo y las vuelca."""
+        while True:
+            batch = await self._collect_batch()
+            if batch:
+                await self._flush_batch(batch)
+            if self._pending_rollups:
+                await self._flush_daily_rollups()
+            if not batch and self._writer_stopping:
+                break
+
+    async def _collect_batch(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Recoger escrituras hasta completar un batch o agotar el intervalo de flush.
+
+        Durante el cierre no se espera: se drena lo que quede en la cola.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ANALYTICS_FLUSH_INTERVAL_SECONDS
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+
+        while len(batch) < settings.ANALYTICS_BATCH_SIZE:
+            if self._writer_stopping:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    break
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._write_queue.get(), timeout=timeout)
+                )
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _write_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Escribir un batch en una sola transacción.
+
+        Las sesiones referenciadas se crean con un único upsert y las filas de
+        métricas y pares de conversación se insertan en bloque.
+
+        Raises:
+            SQLAlchemyError: Si falla la transacción (se hace rollback)
+        """
+        metrics_rows = [payload for kind, payload in batch if kind == "message_metrics"]
+        pair_rows = [payload for kind, payload in batch if kind == "conversation_pair"]
+        session_ids = sorted({payload["session_id"] for _, payload in batch})
+
+        async with await self.get_session() as db:
+            try:
+                # Asegurar que las sesiones existen (FK) sin pisar datos
+                await db.execute(
+                    pg_insert(ChatSession)
+                    .values([{"session_id": sid} for sid in session_ids])
+                    .on_conflict_do_nothing(index_elements=["session_id"])
+                )
+                if metrics_rows:
+                    await db.execute(insert(SessionAnalytics), metrics_rows)
+                if pair_rows:
+                    await db.execute(insert(ConversationPair), pair_rows)
+                await db.commit()
+            except SQLAlchemyError:
+                await db.rollback()
+                raise
+
+    async def _flush_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Volcar un batch en una sola transacción.
+
+        Si falla se reintenta una vez (errores transitorios de conexión); si
+        vuelve a fallar, las filas se escriben una a una para que una fila
+        inválida no descarte el resto del batch.
+        """
+        started = time.perf_counter()
+
+        try:
+            for attempt in range(2):
+                try:
+                    await self._write_batch(batch)
+                    break
+                except Exception as e:
+                    logger.warning(
+                        f"⚠️ Error volcando batch de analytics ({len(batch)}, "
+                        f"intento {attempt + 1}): {e}"
+                    )
+            else:
+                await self._flush_rows(batch)
+                return
+
+            self.writer_stats["written"] += len(batch)
+            logger.debug(f"✓ Batch de analytics volcado: {len(batch)} escrituras")
+        finally:
+            self.writer_stats["batches"] += 1
+            self.writer_stats["last_batch_size"] = len(batch)
+            self.writer_stats["last_flush_ms"] = round(
+                (time.perf_counter() - started) * 1000, 2
+            )
+
+    async def _flush_rows(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Escribir una a una las filas de un batch que ha fallado en bloque."""
+        self.writer_stats["row_fallbacks"] += 1
+        failed = 0
+        for item in batch:
+            try:
+                await self._write_batch([item])
+                self.writer_stats["written"] += 1
+            except Exception as e:
+                failed += 1
+                logger.error(
+                    f"❌ Escritura de analytics descartada ({item[0]}, "
+                    f"sesión {item[1].get('session_id')}): {e}"
+                )
+        self.writer_stats["failed"] += failed
+        logger.info(
+            f"⚠️ Batch de analytics volcado fila a fila: "
+            f"{len(batch) - failed} escritas, {failed} descartadas"
+        )
+
+    # ========================================================================
+    # ROLLUPS INCREMENTALES DE DAILY_ANALYTICS
+    # ========================================================================
+
+    @staticmethod
+    def _empty_rollup() -> Dict[str, Any]:
+        """Deltas a cero para un día."""
+        return {
+            **{counter: 0 for counter in _ROLLUP_COUNTERS},
+            "engagement_sum": 0.0,
+            "technologies": Counter(),
+            "intents": Counter(),
+        }
+
+    def _merge_rollup(self, day: date, delta: Dict[str, Any]) -> None:
+        """Acumular deltas en el buffer del día."""
+        pending = self._pending_rollups.setdefault(day, self._empty_rollup())
+        for counter in _ROLLUP_COUNTERS:
+            pending[counter] += delta.get(counter, 0)
+        pending["engagement_sum"] += delta.get("engagement_sum", 0.0)
+        pending["technologies"].update(delta.get("technologies", ()))
+        pending["intents"].update(delta.get("intents", ()))
+
+    async def _record_daily(
+        self,
+        counters: Optional[Dict[str, float]] = None,
+        technologies: Optional[List[str]] = None,
+        intents: Optional[List[str]] = None,
+        day: Optional[date] = None,
+    ) -> None:
+        """
+        Registrar eventos en la fila de daily_analytics de un día (hoy por defecto).
+
+        Con el writer activo los deltas se acumulan en memoria y se vuelcan en
+        cada ciclo de flush; sin writer se aplican inmediatamente.
+
+        Args:
+            counters: Incrementos de contadores (total_messages, engagement_sum...)
+            technologies: Tecnologías detectadas en un mensaje
+            intents: Intenciones detectadas en un mensaje
+            day: Día de la fila a actualizar
+        """
+        if settings.TESTING or not settings.ENABLE_DAILY_ROLLUPS:
+            return
+
+        self._merge_rollup(
+            day or date.today(),
+            {
+                **(counters or {}),
+                "technologies": technologies or [],
+                "intents": intents or [],
+            },
+        )
+
+        if not self._writer_running():
+            await self._flush_daily_rollups()
+
+    async def _flush_daily_rollups(self) -> None:
+        """
+        Volcar los deltas pendientes con un upsert atómico por día.
+
+        Si falla, los deltas se reincorporan al buffer para el siguiente flush.
+        """
+        pending, self._pending_rollups = self._pending_rollups, {}
+        if not pending:
+            return
+
+        try:
+            async with await self.get_session() as db:
+                try:
+                    for day, delta in sorted(pending.items()):
+                        await db.execute(
+                            _UPSERT_DAILY_ROLLUP_SQL,
+                            {
+                                "day": day,
+                                **{c: delta[c] for c in _ROLLUP_COUNTERS},
+                                "engagement_sum": delta["engagement_sum"],
+                                "technologies": json.dumps(delta["technologies"]),
+                                "intents": json.dumps(delta["intents"]),
+                            },
+                        )
+                    await db.commit()
+                except SQLAlchemyError:
+                    await db.rollback()
+                    raise
+
+            self.writer_stats["rollups_flushed"] += len(pending)
+        except Exception as e:
+            for day, delta in pending.items():
+                self._merge_rollup(day, delta)
+            logger.error(f"❌ Error volcando rollups diarios: {e}")
+
+    def get_writer_stats(self) -> Dict[str, Any]:
+        """Obtener métricas del writer (profundidad de cola, descartes, etc.)."""
+        queue = self._write_queue
+        return {
+            **self.writer_stats,
+            "running": self._writer_running(),
+            "queue_depth": queue.qsize() if queue else 0,
+            "queue_capacity": queue.maxsize if queue else 0,
+        }
+
 
 # Instancia global del servicio
 analytics_service = AnalyticsService()
@@ -0,0 +1,242 @@
+"""
+Backends de cache de respuestas del RAG.
+Define la interfaz común y dos implementaciones: LRU en memoria del proceso
+y tabla compartida en PostgreSQL (con la LRU local como primer nivel y fallback).
+"""
+
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+
+from app.models.cache import ResponseCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_response(response: Dict[str, Any]) -> str:
+    """Serializar una respuesta (incluidas sus fuentes) a JSON."""
+    return json.dumps(response, ensure_ascii=False, default=str)
+
+
+def deserialize_response(payload: str) -> Dict[str, Any]:
+    """Reconstruir una respuesta serializada con serialize_response."""
+    return json.loads(payload)
+
+
+def hash_cache_key(key: str) -> str:
+    """SHA-256 hexadecimal de una clave de cache (longitud fija de 64)."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ResponseCacheBackend(ABC):
+    """Interfaz de los backends de cache de respuestas."""
+
+    name: str = "base"
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Obtener una respuesta vigente o None."""
+
+    @abstractmethod
+    async def set(self, key: str, response: Dict[str, Any]) -> None:
+        """Guardar una respuesta con el TTL del backend."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Vaciar la cache."""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener métricas del backend."""
+        return {"backend": self.name}
+
+
+class InMemoryCacheBackend(ResponseCacheBackend):
+    """
+    Cache LRU/TTL en memoria del proceso.
+
+    Las respuestas se guardan serializadas para que los llamadores no puedan
+    mutar la copia cacheada (p. ej. la lista de sources).
+    """
+
+    name = "memory"
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        """
+        Args:
+            max_size: Número máximo de respuestas
+            ttl_seconds: Tiempo de vida de cada respuesta
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        payload, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return deserialize_response(payload)
+
+    async def set(self, key: str, response: Dict[str, Any]) -> None:
+        self._entries[key] = (
+            serialize_response(response),
+            time.monotonic() + self.ttl_seconds,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "size": len(self._entries), "max_size": self.max_size}
+
+
+class PostgresCacheBackend(ResponseCacheBackend):
+    """
+    Cache compartida entre instancias en la tabla response_cache.
+
+    Usa una LRU local como primer nivel: los hits locales no tocan la BD y,
+    si la BD falla, la cache sigue funcionando solo con el nivel local.
+    La expiración se evalúa con el reloj del servidor y el tamaño se recorta
+    periódicamente eliminando las entradas más antiguas. Las claves se guardan
+    como su SHA-256, de modo que preguntas largas no exceden la columna.
+    """
+
+    name = "postgres"
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        max_size: int,
+        ttl_seconds: int,
+        local: Optional[InMemoryCacheBackend] = None,
+        prune_every: int = 50,
+    ):
+        """
+        Args:
+            session_factory: Factoría de sesiones asíncronas (pool compartido)
+            max_size: Número máximo de filas en la tabla
+            ttl_seconds: Tiempo de vida de cada respuesta
+            local: Cache local de primer nivel (opcional)
+            prune_every: Recortar la tabla cada N escrituras
+        """
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.local = local
+        self.prune_every = prune_every
+
+        self._writes_since_prune = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.local is not None:
+            response = await self.local.get(key)
+            if response is not None:
+                return response
+
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(ResponseCacheEntry.response).where(
+                        ResponseCacheEntry.cache_key == hash_cache_key(key),
+                        ResponseCacheEntry.expires_at > func.now(),
+                    )
+                )
+                response = result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Cache compartida no disponible (get): {e}")
+            return None
+
+        if response is not None and self.local is not None:
+            await self.local.set(key, response)
+        return response
+
+    async def set(self, key: str, response: Dict[str, Any]) -> None:
+        if self.local is not None:
+            await self.local.set(key, response)
+
+        payload = deserialize_response(serialize_response(response))
+        expires_at = func.now() + timedelta(seconds=self.ttl_seconds)
+        stmt = pg_insert(ResponseCacheEntry).values(
+            cache_key=hash_cache_key(key), response=payload, expires_at=expires_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ResponseCacheEntry.cache_key],
+            set_={
+                "response": stmt.excluded.response,
+                "created_at": func.now(),
+                "expires_at": stmt.excluded.expires_at,
+            },
+        )
+
+        try:
+            async with self.session_factory() as db:
+                await db.execute(stmt)
+
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= self.prune_every:
+                    await self._prune(db)
+                    self._writes_since_prune = 0
+
+                await db.commit()
+        except SQLAlchemyError as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Cache compartida no disponible (set): {e}")
+
+    async def _prune(self, db) -> None:
+        """Eliminar entradas caducadas y las que exceden max_size (más antiguas primero)."""
+        overflow = (
+            select(ResponseCacheEntry.cache_key)
+            .order_by(ResponseCacheEntry.created_at.desc())
+            .offset(self.max_size)
+        )
+        result = await db.execute(
+            delete(ResponseCacheEntry).where(
+                (ResponseCacheEntry.expires_at <= func.now())
+                | ResponseCacheEntry.cache_key.in_(overflow)
+            )
+        )
+        if result.rowcount:
+            logger.debug(f"✓ Cache compartida recortada: {result.rowcount} entradas")
+
+    async def clear(self) -> None:
+        if self.local is not None:
+            await self.local.clear()
+        try:
+            async with self.session_factory() as db:
+                await db.execute(delete(ResponseCacheEntry))
+                await db.commit()
+        except SQLAlchemyError as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Cache compartida no disponible (clear): {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "max_size": self.max_size,
+            "errors": self.errors,
+            "local": self.local.get_stats() if self.local is not None else None,
+        }
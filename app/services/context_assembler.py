@@ -0,0 +1,123 @@
+"""
+Ensamblado del contexto del prompt con presupuesto de tokens.
+Empaqueta los chunks mejor rankeados y el historial más reciente sin superar
+un tamaño máximo de prompt.
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import List
+
+from langchain.docstore.document import Document
+
+from app.services.conversation_store import ConversationHistory
+
+logger = logging.getLogger(__name__)
+
+# Aproximación de caracteres por token de Gemini (texto en español/inglés);
+# evita tokenizar en el camino de la request
+CHARS_PER_TOKEN = 4.0
+
+# Separador entre chunks dentro del contexto
+CHUNK_SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata del número de tokens de un texto."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _chars_for(tokens: int) -> int:
+    return max(int(tokens * CHARS_PER_TOKEN), 0)
+
+
+@dataclass
+class AssembledContext:
+    """Resultado del ensamblado: qué entra en el prompt y qué se descartó."""
+
+    context: str
+    documents: List[Document]
+    history_text: str
+    history_turns: int
+    dropped_documents: List[Document] = field(default_factory=list)
+    dropped_turns: int = 0
+    truncated: bool = False
+
+
+class ContextAssembler:
+    """
+    Reparte el presupuesto de tokens del prompt entre historial y chunks.
+
+    El texto fijo (system prompt, pregunta, hints) se descuenta primero. El
+    historial se limita a max_history_tokens conservando los turnos más
+    recientes, y los chunks ocupan el resto en orden de ranking: un chunk que
+    no cabe se descarta y se prueba con el siguiente. Si no cabe ninguno, se
+    trunca el mejor para no dejar el prompt sin contexto.
+    """
+
+    def __init__(self, max_prompt_tokens: int, max_history_tokens: int):
+        """
+        Args:
+            max_prompt_tokens: Tamaño máximo estimado del prompt completo
+            max_history_tokens: Máximo de tokens dedicados al historial
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_history_tokens = max_history_tokens
+
+    def assemble(
+        self,
+        documents: List[Document],
+        history: ConversationHistory,
+        fixed_chars: int,
+    ) -> AssembledContext:
+        """
+        Elegir los chunks y el historial que entran en el presupuesto.
+
+        Args:
+            documents: Chunks recuperados, de más a menos relevante
+            history: Historial de la sesión
+            fixed_chars: Caracteres del texto que siempre va en el prompt
+                (system prompt, pregunta, hints)
+
+        Returns:
+            AssembledContext con el contexto y el historial a usar
+        """
+        fixed_tokens = math.ceil(fixed_chars / CHARS_PER_TOKEN)
+        available = max(self.max_prompt_tokens - fixed_tokens, 0)
+
+        history_budget = min(self.max_history_tokens, available)
+        history_text, history_turns = history.recent(_chars_for(history_budget))
+        available -= estimate_tokens(history_text)
+
+        remaining = _chars_for(available)
+        included: List[Document] = []
+        dropped: List[Document] = []
+        for doc in documents:
+            cost = len(doc.page_content) + (len(CHUNK_SEPARATOR) if included else 0)
+            if cost <= remaining:
+                included.append(doc)
+                remaining -= cost
+            else:
+                dropped.append(doc)
+
+        truncated = False
+        if not included and documents and remaining > 0:
+            best = dropped.pop(0)
+            included.append(
+                Document(
+                    page_content=best.page_content[:remaining],
+                    metadata=best.metadata,
+                )
+            )
+            truncated = True
+
+        return AssembledContext(
+            context=CHUNK_SEPARATOR.join(doc.page_content for doc in included),
+            documents=included,
+            history_text=history_text,
+            history_turns=history_turns,
+            dropped_documents=dropped,
+            dropped_turns=len(history) - history_turns,
+            truncated=truncated,
+        )
@@ -0,0 +1,353 @@
+"""
+Almacén acotado de memoria conversacional por sesión.
+Limita el número de sesiones y los bytes retenidos, expulsa por LRU y por
+inactividad, y barre periódicamente las sesiones caducadas.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Carga de los últimos turnos persistidos:
+# (session_id, límite, inactividad máxima en segundos) -> [(pregunta, respuesta)]
+TurnLoader = Callable[[str, int, float], Awaitable[List[Tuple[str, str]]]]
+
+# Estimación del coste fijo en memoria de cada sesión y de cada turno
+# (objetos del historial y entrada del almacén), además del texto en sí
+_SESSION_OVERHEAD_BYTES = 512
+_TURN_OVERHEAD_BYTES = 32
+
+
+class ConversationHistory:
+    """
+    Historial compacto de una sesión: ventana de los últimos pares
+    pregunta/respuesta con el texto ya renderizado para el prompt.
+
+    El texto se guarda una sola vez (en el string renderizado); la deque solo
+    guarda la longitud de cada turno para poder descartar el más antiguo
+    recortando el prefijo, sin recorrer los mensajes en cada request.
+    """
+
+    __slots__ = ("_segments", "_rendered", "_size_bytes")
+
+    def __init__(self, window_size: int):
+        """
+        Args:
+            window_size: Número de pares pregunta/respuesta que se recuerdan
+        """
+        self._segments: Deque[int] = deque(maxlen=window_size)
+        self._rendered = ""
+        self._size_bytes = _SESSION_OVERHEAD_BYTES
+
+    def __len__(self) -> int:
+        """Número de pares pregunta/respuesta en la ventana."""
+        return len(self._segments)
+
+    @staticmethod
+    def render_turn(question: str, answer: str) -> str:
+        """Formato de un turno dentro del historial del prompt."""
+        return f"Human: {question}\nAssistant: {answer}\n\n"
+
+    def append(self, question: str, answer: str) -> None:
+        """
+        Añadir un turno, descartando el más antiguo si la ventana está llena.
+
+        Args:
+            question: Pregunta del usuario
+            answer: Respuesta del asistente
+        """
+        segment = self.render_turn(question, answer)
+        if len(self._segments) == self._segments.maxlen:
+            oldest = self._segments[0]
+            self._rendered = self._rendered[oldest:] + segment
+        else:
+            self._rendered += segment
+        self._segments.append(len(segment))
+        self._size_bytes = (
+            _SESSION_OVERHEAD_BYTES
+            + len(self._segments) * _TURN_OVERHEAD_BYTES
+            + len(self._rendered.encode("utf-8"))
+        )
+
+    def recent(self, max_chars: int) -> Tuple[str, int]:
+        """
+        Texto de los turnos más recientes que caben en un presupuesto.
+
+        Los turnos más antiguos se descartan enteros; si ni siquiera el último
+        cabe, se trunca por el final.
+
+        Args:
+            max_chars: Máximo de caracteres del historial
+
+        Returns:
+            Tuple[str, int]: (texto, número de turnos incluidos)
+        """
+        if len(self._rendered) <= max_chars:
+            return self._rendered, len(self._segments)
+
+        size = 0
+        turns = 0
+        for length in reversed(self._segments):
+            if size + length > max_chars:
+                break
+            size += length
+            turns += 1
+
+        if turns:
+            return self._rendered[-size:], turns
+        if max_chars <= 0:
+            return "", 0
+        latest = self._rendered[-self._segments[-1] :]
+        return latest[: max(max_chars - 1, 0)] + "…", 1
+
+    @property
+    def history_text(self) -> str:
+        """Historial renderizado ("Human: ...\nAssistant: ...\n\n" por turno)."""
+        return self._rendered
+
+    @property
+    def size_bytes(self) -> int:
+        """Tamaño estimado en memoria del historial."""
+        return self._size_bytes
+
+
+@dataclass(slots=True)
+class _StoreEntry:
+    """Historial de una sesión con su último acceso."""
+
+    history: ConversationHistory
+    last_access: float
+    size_bytes: int = _SESSION_OVERHEAD_BYTES
+
+
+class ConversationMemoryStore:
+    """
+    Historiales conversacionales indexados por session_id con límites duros.
+
+    El OrderedDict se mantiene en orden de último acceso, de modo que tanto
+    la expulsión LRU como la de sesiones inactivas se hacen desde la cabeza
+    en O(1) por sesión expulsada, sin recorrer las sesiones vivas.
+    """
+
+    def __init__(
+        self,
+        window_size: int,
+        max_sessions: int,
+        max_bytes: int,
+        idle_ttl_seconds: float,
+        sweep_interval_seconds: float = 60.0,
+        loader: Optional[TurnLoader] = None,
+    ):
+        """
+        Args:
+            window_size: Pares pregunta/respuesta que se recuerdan por sesión
+            max_sessions: Número máximo de sesiones en memoria
+            max_bytes: Tamaño máximo estimado del almacén
+            idle_ttl_seconds: Expulsar sesiones sin actividad tras N segundos
+            sweep_interval_seconds: Periodo del barrido en background
+            loader: Carga de los turnos persistidos para hidratar sesiones
+                que no están en memoria (opcional)
+        """
+        self.window_size = window_size
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.loader = loader
+
+        self._entries: "OrderedDict[str, _StoreEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+        self.created = 0
+        self.hydrated = 0
+        self.hydration_errors = 0
+        self.evictions: Dict[str, int] = {"lru": 0, "bytes": 0, "idle": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def _pop(self, session_id: str, reason: str) -> None:
+        entry = self._entries.pop(session_id)
+        self._total_bytes -= entry.size_bytes
+        self.evictions[reason] += 1
+        logger.debug(f"Sesión expulsada de memoria ({reason}): {session_id}")
+
+    def _is_idle(self, entry: _StoreEntry, now: float) -> bool:
+        return now - entry.last_access > self.idle_ttl_seconds
+
+    def _enforce_limits(self) -> None:
+        """
+        Expulsar las sesiones menos usadas hasta cumplir los límites.
+
+        La sesión más reciente (la que se está usando) nunca se expulsa.
+        """
+        while len(self._entries) > self.max_sessions:
+            self._pop(next(iter(self._entries)), "lru")
+
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._pop(next(iter(self._entries)), "bytes")
+
+    def get_or_create(self, session_id: str) -> ConversationHistory:
+        """
+        Obtener el historial de una sesión (creándolo si no existe o caducó).
+
+        Args:
+            session_id: ID de la sesión
+
+        Returns:
+            ConversationHistory de la sesión
+        """
+        now = time.monotonic()
+        entry = self._entries.get(session_id)
+
+        if entry is not None and self._is_idle(entry, now):
+            self._pop(session_id, "idle")
+            entry = None
+
+        if entry is None:
+            logger.debug(f"Creando nueva memoria para sesión: {session_id}")
+            entry = _StoreEntry(
+                history=ConversationHistory(self.window_size), last_access=now
+            )
+            self._entries[session_id] = entry
+            self._total_bytes += entry.size_bytes
+            self.created += 1
+            self._enforce_limits()
+        else:
+            entry.last_access = now
+            self._entries.move_to_end(session_id)
+
+        return entry.history
+
+    async def get_or_hydrate(self, session_id: str) -> ConversationHistory:
+        """
+        Obtener el historial de una sesión, hidratándolo desde la base de datos
+        si no está en memoria (reinicio, scale-out u otra instancia).
+
+        El loader aplica la misma caducidad que la memoria (idle_ttl_seconds
+        desde el último turno): una sesión caducada empieza vacía tanto si ya
+        se barrió como si no. Si la carga falla se continúa con un historial
+        vacío.
+
+        Args:
+            session_id: ID de la sesión
+
+        Returns:
+            ConversationHistory de la sesión
+        """
+        if self.loader is None or session_id in self._entries:
+            return self.get_or_create(session_id)
+
+        try:
+            turns = await self.loader(
+                session_id, self.window_size, self.idle_ttl_seconds
+            )
+        except Exception as e:
+            self.hydration_errors += 1
+            logger.warning(f"⚠️ No se pudo hidratar la memoria de {session_id}: {e}")
+            turns = []
+
+        # Otra request de la misma sesión pudo crearla durante la carga
+        if session_id in self._entries:
+            return self.get_or_create(session_id)
+
+        history = self.get_or_create(session_id)
+        if turns:
+            for question, answer in turns:
+                history.append(question, answer)
+            self._update_size(session_id)
+            self.hydrated += 1
+            logger.debug(f"✓ Memoria hidratada ({len(turns)} pares): {session_id}")
+        return history
+
+    def _update_size(self, session_id: str) -> None:
+        """Actualizar el tamaño de una sesión tras modificar su historial."""
+        entry = self._entries[session_id]
+        self._total_bytes += entry.history.size_bytes - entry.size_bytes
+        entry.size_bytes = entry.history.size_bytes
+        self._enforce_limits()
+
+    def record_turn(self, session_id: str, question: str, answer: str) -> None:
+        """
+        Añadir un par pregunta/respuesta al historial de una sesión.
+
+        Args:
+            session_id: ID de la sesión
+            question: Pregunta del usuario
+            answer: Respuesta del asistente
+        """
+        self.get_or_create(session_id).append(question, answer)
+        self._update_size(session_id)
+
+    def sweep(self) -> int:
+        """
+        Expulsar las sesiones inactivas.
+
+        Returns:
+            int: Número de sesiones expulsadas
+        """
+        now = time.monotonic()
+        removed = 0
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if not self._is_idle(entry, now):
+                break
+            self._pop(session_id, "idle")
+            removed += 1
+
+        if removed:
+            logger.info(f"✓ Limpiadas {removed} sesiones inactivas")
+        return removed
+
+    def start_sweeper(self) -> None:
+        """Arrancar el barrido periódico (requiere un event loop activo)."""
+        if self._sweeper_task is not None and not self._sweeper_task.done():
+            return
+        self._sweeper_task = asyncio.create_task(self._run_sweeper())
+        logger.info(
+            f"✓ Barrido de sesiones iniciado (cada {self.sweep_interval_seconds}s)"
+        )
+
+    async def stop_sweeper(self) -> None:
+        """Detener el barrido periódico."""
+        task, self._sweeper_task = self._sweeper_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run_sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"❌ Error en el barrido de sesiones: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener gauges del almacén (sesiones vivas, bytes, expulsiones)."""
+        return {
+            "live_sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "created": self.created,
+            "hydrated": self.hydrated,
+            "hydration_errors": self.hydration_errors,
+            "evictions": dict(self.evictions),
+            "sweeper_running": (
+                self._sweeper_task is not None and not self._sweeper_task.done()
+            ),
+        }
@@ -0,0 +1,164 @@
+"""
+Artefacto versionado con los embeddings precalculados de la base de conocimiento.
+Un directorio con la matriz de vectores (.npy, memory-mappable), los chunks
+(JSONL) y un manifest; permite servir la búsqueda vectorial sin pgvector.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from app.services.routing_table import collection_fingerprint
+
+# Versión del formato del artefacto; uno de otra versión no se carga
+ARTIFACT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+
+SUPPORTED_DTYPES = ("float32", "float16")
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_artifact(
+    directory: str,
+    documents: Sequence[Document],
+    vectors: np.ndarray,
+    model_name: str,
+    dtype: str = "float32",
+) -> Dict[str, Any]:
+    """
+    Escribir el artefacto en un directorio.
+
+    El manifest se escribe el último: un directorio sin manifest (build
+    interrumpido) no se carga.
+
+    Args:
+        directory: Directorio de salida (se crea si no existe)
+        documents: Chunks de la base de conocimiento
+        vectors: Matriz (n, dim) con un vector normalizado por chunk
+        model_name: Modelo con el que se calcularon los vectores
+        dtype: "float32" o "float16" (mitad de tamaño, misma búsqueda)
+
+    Returns:
+        Dict con el manifest escrito
+
+    Raises:
+        ValueError: Si el número de vectores no coincide con el de chunks o el
+            dtype no está soportado
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype no soportado: {dtype} (usar {SUPPORTED_DTYPES})")
+    if len(vectors) != len(documents):
+        raise ValueError(
+            f"{len(vectors)} vectores para {len(documents)} chunks en el artefacto"
+        )
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    matrix = np.ascontiguousarray(vectors, dtype=dtype)
+    np.save(embeddings_path, matrix, allow_pickle=False)
+
+    chunks_path = os.path.join(directory, CHUNKS_FILE)
+    with open(chunks_path, "w", encoding="utf-8") as f:
+        for doc in documents:
+            record = {"content": doc.page_content, "metadata": doc.metadata}
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        # Misma huella que la tabla de routing: identifica los chunks indexados
+        "version": collection_fingerprint(documents),
+        "model": model_name,
+        "count": int(matrix.shape[0]),
+        "dimensions": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "dtype": dtype,
+        "built_at": time.time(),
+        "checksums": {
+            EMBEDDINGS_FILE: _sha256_file(embeddings_path),
+            CHUNKS_FILE: _sha256_file(chunks_path),
+        },
+    }
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def load_artifact(
+    directory: str, model_name: str, verify: bool = True
+) -> Tuple[np.ndarray, List[Document], Dict[str, Any]]:
+    """
+    Cargar el artefacto con la matriz memory-mapped (solo lectura).
+
+    Args:
+        directory: Directorio del artefacto
+        model_name: Modelo de embeddings de las consultas; debe coincidir
+        verify: Comprobar los checksums de los ficheros
+
+    Returns:
+        Tuple con (matriz (n, dim), chunks, manifest)
+
+    Raises:
+        FileNotFoundError: Si falta el manifest o algún fichero
+        ValueError: Si el artefacto es de otro formato, otro modelo o está
+            corrupto
+    """
+    with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Formato de artefacto {manifest.get('format_version')} "
+            f"(se esperaba {ARTIFACT_FORMAT_VERSION})"
+        )
+    if manifest.get("model") != model_name:
+        raise ValueError(
+            f"Artefacto calculado con {manifest.get('model')}, "
+            f"las consultas usan {model_name}"
+        )
+
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    chunks_path = os.path.join(directory, CHUNKS_FILE)
+    if verify:
+        files = ((EMBEDDINGS_FILE, embeddings_path), (CHUNKS_FILE, chunks_path))
+        for name, path in files:
+            if _sha256_file(path) != manifest["checksums"][name]:
+                raise ValueError(f"Checksum incorrecto en {name}")
+
+    matrix = np.load(embeddings_path, mmap_mode="r", allow_pickle=False)
+    documents: List[Document] = []
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            documents.append(
+                Document(
+                    page_content=record["content"],
+                    metadata=record.get("metadata") or {},
+                )
+            )
+
+    if matrix.ndim != 2 or matrix.shape[0] != len(documents):
+        raise ValueError(
+            f"Artefacto inconsistente: matriz {matrix.shape} para "
+            f"{len(documents)} chunks"
+        )
+    return matrix, documents, manifest
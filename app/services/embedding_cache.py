@@ -0,0 +1,205 @@
+"""
+Cache de embeddings para las consultas del usuario.
+Evita repetir el forward pass del modelo de embeddings para preguntas repetidas.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalizar una pregunta para usarla como clave de cache.
+
+    Aplica NFKC, casefold, elimina signos de puntuación y colapsa espacios,
+    de modo que "¿Qué experiencia tienes?" y "qué experiencia tienes" comparten
+    clave. Los acentos se mantienen.
+
+    Args:
+        text: Texto original de la pregunta
+
+    Returns:
+        str: Texto normalizado
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(
+        " " if unicodedata.category(ch).startswith("P") else ch for ch in text
+    )
+    return " ".join(text.split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wrapper de Embeddings con cache LRU/TTL para embed_query.
+
+    Las claves combinan el nombre del modelo y la pregunta normalizada. Los
+    documentos (embed_documents) se delegan sin cachear, ya que solo se usan
+    al indexar la base de conocimiento.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model_name: str,
+        max_size: int = 2000,
+        ttl_seconds: int = 86400,
+        persist_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            base: Embeddings subyacentes (p. ej. HuggingFaceEmbeddings)
+            model_name: Nombre del modelo, forma parte de la clave
+            max_size: Número máximo de vectores en memoria
+            ttl_seconds: Tiempo de vida de cada entrada
+            persist_path: Fichero JSON para persistir la cache entre reinicios (opcional)
+        """
+        self.base = base
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+
+        # {clave: (vector, timestamp_creación)}; se usa time.time() para que el
+        # TTL siga siendo válido tras recargar desde disco
+        self._cache: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self.load()
+
+    def _key(self, text: str) -> str:
+        """Clave de cache: modelo + pregunta normalizada."""
+        return f"{self.model_name}::{normalize_question(text)}"
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        """Buscar un vector vigente y marcarlo como usado recientemente."""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            vector, created_at = entry
+            if time.time() - created_at > self.ttl_seconds:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return vector
+
+    def _store(self, key: str, vector: List[float]) -> None:
+        """Guardar un vector expulsando la entrada menos usada si hace falta."""
+        with self._lock:
+            self._cache[key] = (vector, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding de una consulta, servido desde cache cuando es posible."""
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        self.misses += 1
+        vector = self.base.embed_query(text)
+        self._store(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de documentos (sin cache)."""
+        return self.base.embed_documents(texts)
+
+    def clear(self) -> None:
+        """Vaciar la cache y reiniciar contadores."""
+        with self._lock:
+            self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener estadísticas de la cache de embeddings."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def load(self) -> int:
+        """
+        Cargar la cache desde disco descartando entradas caducadas o de otro modelo.
+
+        Returns:
+            int: Número de entradas cargadas
+        """
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return 0
+
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ No se pudo cargar la cache de embeddings: {e}")
+            return 0
+
+        if data.get("model_name") != self.model_name:
+            logger.info("Cache de embeddings en disco de otro modelo, se ignora")
+            return 0
+
+        now = time.time()
+        entries = [
+            (key, vector, created_at)
+            for key, vector, created_at in data.get("entries", [])
+            if now - created_at <= self.ttl_seconds
+        ]
+        with self._lock:
+            for key, vector, created_at in entries[-self.max_size :]:
+                self._cache[key] = (vector, created_at)
+
+        logger.info(f"✓ Cache de embeddings cargada: {len(self._cache)} entradas")
+        return len(self._cache)
+
+    def save(self) -> bool:
+        """
+        Persistir la cache en disco con escritura atómica (fichero temporal + rename).
+
+        Returns:
+            bool: True si se guardó correctamente
+        """
+        if not self.persist_path:
+            return False
+
+        with self._lock:
+            entries = [
+                [key, vector, created_at]
+                for key, (vector, created_at) in self._cache.items()
+            ]
+
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model_name": self.model_name, "entries": entries}, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar la cache de embeddings: {e}")
+            return False
+
+        logger.info(f"✓ Cache de embeddings guardada: {len(entries)} entradas")
+        return True
@@ -0,0 +1,143 @@
+"""
+Pipeline de embeddings por lotes para construir la base de conocimiento.
+Codifica los chunks con sentence-transformers en lotes de tamaño fijo y,
+opcionalmente, reparte el trabajo en un pool de procesos.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Por debajo de este número de textos por proceso no compensa arrancar el pool
+_MIN_TEXTS_PER_WORKER = 256
+
+
+@dataclass
+class EncodeStats:
+    """Métricas de la última codificación."""
+
+    chunks: int = 0
+    seconds: float = 0.0
+    batch_size: int = 0
+    workers: int = 1
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+
+class SentenceTransformerPipeline(Embeddings):
+    """
+    Embeddings de documentos con control del tamaño de lote y del paralelismo.
+
+    Produce los mismos vectores que HuggingFaceEmbeddings con
+    normalize_embeddings=True (mismo modelo y normalización L2), pero
+    devuelve una matriz float32 contigua y mide el rendimiento. Con
+    workers > 1 usa el pool multiproceso de sentence-transformers, que
+    reparte los textos por trozos entre procesos en CPU.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 64,
+        workers: int = 1,
+        device: str = "cpu",
+    ):
+        """
+        Args:
+            model_name: Modelo de sentence-transformers
+            batch_size: Textos por forward pass
+            workers: Procesos de codificación (1 = en el proceso actual)
+            device: Dispositivo de torch
+        """
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = max(workers, 1)
+        self.device = device
+        self.model = SentenceTransformer(model_name, device=device)
+        self.last_stats = EncodeStats()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Codificar textos en una matriz (n, dim) float32 con filas normalizadas.
+
+        Args:
+            texts: Textos a codificar
+
+        Returns:
+            np.ndarray con un vector por texto
+        """
+        started = time.perf_counter()
+        workers = min(self.workers, max(len(texts) // _MIN_TEXTS_PER_WORKER, 1))
+
+        if not texts:
+            vectors = np.empty((0, 0), dtype=np.float32)
+        elif workers > 1:
+            pool = self.model.start_multi_process_pool([self.device] * workers)
+            try:
+                vectors = self.model.encode_multi_process(
+                    texts,
+                    pool,
+                    batch_size=self.batch_size,
+                    chunk_size=max(len(texts) // (workers * 4), self.batch_size),
+                )
+            finally:
+                self.model.stop_multi_process_pool(pool)
+        else:
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.size:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+
+        self.last_stats = EncodeStats(
+            chunks=len(texts),
+            seconds=time.perf_counter() - started,
+            batch_size=self.batch_size,
+            workers=workers,
+        )
+        logger.info(
+            f"✓ {len(texts)} chunks codificados en {self.last_stats.seconds:.2f}s "
+            f"({self.last_stats.chunks_per_second:.1f} chunks/s, "
+            f"lote {self.batch_size}, {workers} procesos)"
+        )
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Interfaz de LangChain sobre encode()."""
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding de una consulta (sin pool ni métricas)."""
+        vector = self.model.encode(
+            [text], convert_to_numpy=True, show_progress_bar=False
+        )[0].astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de la última codificación."""
+        return {
+            "model": self.model_name,
+            "chunks": self.last_stats.chunks,
+            "seconds": round(self.last_stats.seconds, 3),
+            "chunks_per_second": round(self.last_stats.chunks_per_second, 1),
+            "batch_size": self.last_stats.batch_size,
+            "workers": self.last_stats.workers,
+        }
@@ -6,16 +6,19 @@ Implementa derechos de acceso, portabilidad, eliminación y anonimización.
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from sqlalchemy import and_, create_engine, delete, func, select, update
+from sqlalchemy import and_, delete, func, or_, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.core.database import get_session_factory
 from app.models.analytics import (
     Base,
+    ChatMessage,
     ChatSession,
+    ConversationPair,
     DailyAnalytics,
     GDPRConsent,
     SessionAnalytics,
@@ -38,19 +41,14 @@ class GDPRService:
 
     def __init__(self):
         """Inicializar el servicio GDPR."""
-        self.engine = create_engine(
-            settings.database_url,
-            pool_size=5,
-            max_overflow=10,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-        )
+        # Pool de conexiones asíncrono compartido con AnalyticsService
+        self.AsyncSessionLocal = get_session_factory()
 
         logger.info("✓ GDPRService inicializado")
 
-    def get_session(self) -> Session:
+    async def get_session(self) -> AsyncSession:
         """Obtener sesión de base de datos."""
-        return Session(self.engine)
+        return self.AsyncSessionLocal()
 
     async def record_consent(
         self,
@@ -71,12 +69,13 @@ class GDPRService:
         Returns:
             bool: True si el registro fue exitoso
         """
-        with self.get_session() as db:
+        async with await self.get_session() as db:
             try:
                 # Verificar que la sesión existe
-                session = db.execute(
+                result = await db.execute(
                     select(ChatSession).where(ChatSession.session_id == session_id)
-                ).scalar_one_or_none()
+                )
+                session = result.scalar_one_or_none()
 
                 if not session:
                     logger.warning(
@@ -98,7 +97,7 @@ class GDPRService:
                 session.gdpr_consent_given = True
                 session.last_activity = datetime.utcnow()
 
-                db.commit()
+                await db.commit()
 
                 logger.info(
                     f"✓ Consentimiento GDPR registrado para sesión: {session_id}"
@@ -109,7 +108,7 @@ class GDPRService:
                 logger.error(
                     f"❌ Error registrando consentimiento para {session_id}: {e}"
                 )
-                db.rollback()
+                await db.rollback()
                 return False
 
     async def get_user_data(self, session_id: str) -> Optional[Dict[str, Any]]:
@@ -122,12 +121,13 @@ class GDPRService:
         Returns:
             Dict con todos los datos del usuario o None si no existe
         """
-        with self.get_session() as db:
+        async with await self.get_session() as db:
             try:
                 # Obtener sesión
-                session = db.execute(
+                result = await db.execute(
                     select(ChatSession).where(ChatSession.session_id == session_id)
-                ).scalar_one_or_none()
+                )
+                session = result.scalar_one_or_none()
 
                 if not session:
                     logger.warning(
@@ -136,24 +136,18 @@ class GDPRService:
                     return None
 
                 # Obtener analytics de la sesión
-                analytics_query = (
-                    db.execute(
-                        select(SessionAnalytics).where(
-                            SessionAnalytics.session_id == session_id
-                        )
+                analytics_result = await db.execute(
+                    select(SessionAnalytics).where(
+                        SessionAnalytics.session_id == session_id
                     )
-                    .scalars()
-                    .all()
                 )
+                analytics_query = analytics_result.scalars().all()
 
                 # Obtener consentimientos
-                consents_query = (
-                    db.execute(
-                        select(GDPRConsent).where(GDPRConsent.session_id == session_id)
-                    )
-                    .scalars()
-                    .all()
+                consents_result = await db.execute(
+                    select(GDPRConsent).where(GDPRConsent.session_id == session_id)
                 )
+                consents_query = consents_result.scalars().all()
 
                 # Compilar datos del usuario
                 user_data = {
@@ -161,8 +155,7 @@ class GDPRService:
                     "personal_data": {
                         "email": session.email,
                         "user_type": session.user_type,
-                        "company": session.company,
-                        "role": session.role,
+                        "linkedin": session.linkedin,
                     },
                     "session_data": {
                         "created_at": session.created_at.isoformat(),
@@ -213,12 +206,13 @@ class GDPRService:
         Returns:
             bool: True si la eliminación fue exitosa
         """
-        with self.get_session() as db:
+        async with await self.get_session() as db:
             try:
                 # Verificar que la sesión existe
-                session = db.execute(
+                result = await db.execute(
                     select(ChatSession).where(ChatSession.session_id == session_id)
-                ).scalar_one_or_none()
+                )
+                session = result.scalar_one_or_none()
 
                 if not session:
                     logger.warning(
@@ -227,23 +221,23 @@ class GDPRService:
                     return False
 
                 # Eliminar analytics de la sesión
-                db.execute(
+                await db.execute(
                     delete(SessionAnalytics).where(
                         SessionAnalytics.session_id == session_id
                     )
                 )
 
                 # Eliminar consentimientos
-                db.execute(
+                await db.execute(
                     delete(GDPRConsent).where(GDPRConsent.session_id == session_id)
                 )
 
                 # Eliminar la sesión
-                db.execute(
+                await db.execute(
                     delete(ChatSession).where(ChatSession.session_id == session_id)
                 )
 
-                db.commit()
+                await db.commit()
 
                 logger.info(f"✓ Datos del usuario eliminados para sesión: {session_id}")
                 return True
@@ -252,7 +246,7 @@ class GDPRService:
                 logger.error(
                     f"❌ Error eliminando datos del usuario para {session_id}: {e}"
                 )
-                db.rollback()
+                await db.rollback()
                 return False
 
     async def export_user_data(self, session_id: str) -> Optional[str]:
@@ -301,12 +295,13 @@ class GDPRService:
         Returns:
             bool: True si la anonimización fue exitosa
         """
-        with self.get_session() as db:
+        async with await self.get_session() as db:
             try:
                 # Buscar sesión
-                session = db.execute(
+                result = await db.execute(
                     select(ChatSession).where(ChatSession.session_id == session_id)
-                ).scalar_one_or_none()
+                )
+                session = result.scalar_one_or_none()
 
                 if not session:
                     logger.warning(
@@ -316,88 +311,169 @@ class GDPRService:
 
                 # Anonimizar datos personales
                 session.email = None
-                session.company = None
-                session.role = None
-                session.user_type = "anonymous"
+                session.linkedin = None
+                session.user_type = None
 
                 # Eliminar consentimientos (ya no son necesarios)
-                db.execute(
+                await db.execute(
                     delete(GDPRConsent).where(GDPRConsent.session_id == session_id)
                 )
 
-                db.commit()
+                await db.commit()
 
                 logger.info(f"✓ Sesión anonimizada: {session_id}")
                 return True
 
             except SQLAlchemyError as e:
                 logger.error(f"❌ Error anonimizando sesión {session_id}: {e}")
-                db.rollback()
+                await db.rollback()
                 return False
 
-    async def cleanup_expired_data(self) -> int:
+    async def cleanup_expired_data(
+        self, batch_size: Optional[int] = None, max_batches: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
-        Limpiar datos expirados según políticas de retención.
+        Aplicar las políticas de retención con operaciones por lotes.
+
+        Primero anonimiza las sesiones inactivas sin consentimiento y después
+        elimina las muy antiguas junto con sus datos dependientes. Cada lote se
+        selecciona por keyset (session_id) y se confirma en su propia transacción,
+        así que una ejecución interrumpida o limitada con max_batches se reanuda
+        simplemente volviendo a llamar al método: las sesiones ya procesadas dejan
+        de cumplir los criterios.
+
+        Args:
+            batch_size: Sesiones por lote (por defecto RETENTION_BATCH_SIZE)
+            max_batches: Máximo de lotes a procesar en esta ejecución (opcional)
 
         Returns:
-            int: Número de sesiones procesadas
+            Dict con filas afectadas por tabla, lotes procesados y si terminó
         """
-        with self.get_session() as db:
-            try:
-                # Calcular fecha de expiración
-                expiration_date = datetime.utcnow() - timedelta(
-                    days=settings.DATA_RETENTION_DAYS
-                )
-                anonymization_date = datetime.utcnow() - timedelta(
-                    days=settings.ANONYMIZE_AFTER_DAYS
-                )
-
-                processed_count = 0
+        batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        now = datetime.utcnow()
+        anonymization_date = now - timedelta(days=settings.ANONYMIZE_AFTER_DAYS)
+        expiration_date = now - timedelta(days=settings.DATA_RETENTION_DAYS)
+
+        report: Dict[str, Any] = {
+            "anonymized": {"chat_sessions": 0, "gdpr_consents": 0},
+            "deleted": {
+                "session_analytics": 0,
+                "gdpr_consents": 0,
+                "chat_messages": 0,
+                "conversation_pairs": 0,
+                "chat_sessions": 0,
+            },
+            "batches": 0,
+            "completed": False,
+        }
 
-                # Buscar sesiones para anonimizar (sin consentimiento, inactivas)
-                sessions_to_anonymize = (
-                    db.execute(
-                        select(ChatSession).where(
-                            and_(
-                                ChatSession.last_activity < anonymization_date,
-                                ChatSession.gdpr_consent_given == False,
-                            )
-                        )
+        try:
+            # Fase 1: anonimizar (solo sesiones que aún tienen datos personales)
+            anonymize_filter = and_(
+                ChatSession.last_activity < anonymization_date,
+                ChatSession.gdpr_consent_given == False,
+                or_(
+                    ChatSession.email.is_not(None),
+                    ChatSession.linkedin.is_not(None),
+                    ChatSession.user_type.is_not(None),
+                ),
+            )
+            async for session_ids in self._iter_session_batches(
+                anonymize_filter, batch_size, max_batches, report
+            ):
+                async with await self.get_session() as db:
+                    result = await db.execute(
+                        update(ChatSession)
+                        .where(ChatSession.session_id.in_(session_ids))
+                        .values(email=None, linkedin=None, user_type=None)
                     )
-                    .scalars()
-                    .all()
-                )
-
-                for session in sessions_to_anonymize:
-                    await self.anonymize_session(session.session_id)
-                    processed_count += 1
-
-                # Buscar sesiones para eliminar (muy antiguas sin consentimiento)
-                sessions_to_delete = (
-                    db.execute(
-                        select(ChatSession).where(
-                            and_(
-                                ChatSession.created_at < expiration_date,
-                                ChatSession.gdpr_consent_given == False,
-                            )
+                    report["anonymized"]["chat_sessions"] += result.rowcount
+                    result = await db.execute(
+                        delete(GDPRConsent).where(
+                            GDPRConsent.session_id.in_(session_ids)
                         )
                     )
-                    .scalars()
-                    .all()
-                )
+                    report["anonymized"]["gdpr_consents"] += result.rowcount
+                    await db.commit()
+
+            # Fase 2: eliminar sesiones expiradas y sus datos dependientes
+            delete_filter = and_(
+                ChatSession.created_at < expiration_date,
+                ChatSession.gdpr_consent_given == False,
+            )
+            async for session_ids in self._iter_session_batches(
+                delete_filter, batch_size, max_batches, report
+            ):
+                async with await self.get_session() as db:
+                    for model, table_name in (
+                        (SessionAnalytics, "session_analytics"),
+                        (GDPRConsent, "gdpr_consents"),
+                        (ChatMessage, "chat_messages"),
+                        (ConversationPair, "conversation_pairs"),
+                        (ChatSession, "chat_sessions"),
+                    ):
+                        result = await db.execute(
+                            delete(model).where(model.session_id.in_(session_ids))
+                        )
+                        report["deleted"][table_name] += result.rowcount
+                    await db.commit()
+
+            report["completed"] = (
+                max_batches is None or report["batches"] < max_batches
+            )
+
+        except SQLAlchemyError as e:
+            logger.error(f"❌ Error en limpieza de datos: {e}")
+            report["error"] = str(e)
+
+        logger.info(
+            f"✓ Retención aplicada en {report['batches']} lotes | "
+            f"anonimizadas={report['anonymized']['chat_sessions']} "
+            f"eliminadas={report['deleted']['chat_sessions']} "
+            f"completada={report['completed']}"
+        )
+        return report
 
-                for session in sessions_to_delete:
-                    await self.delete_user_data(session.session_id)
-                    processed_count += 1
+    async def _iter_session_batches(
+        self,
+        criteria,
+        batch_size: int,
+        max_batches: Optional[int],
+        report: Dict[str, Any],
+    ) -> AsyncIterator[List[str]]:
+        """
+        Iterar por lotes de session_id que cumplen un criterio (paginación keyset).
 
-                logger.info(
-                    f"✓ Limpieza de datos completada: {processed_count} sesiones procesadas"
-                )
-                return processed_count
+        Args:
+            criteria: Condición SQLAlchemy sobre ChatSession
+            batch_size: Tamaño de cada lote
+            max_batches: Límite global de lotes (compartido vía report["batches"])
+            report: Informe de la ejecución (se incrementa el contador de lotes)
 
-            except SQLAlchemyError as e:
-                logger.error(f"❌ Error en limpieza de datos: {e}")
-                return 0
+        Yields:
+            Lista de session_id del lote
+        """
+        last_session_id: Optional[str] = None
+
+        while max_batches is None or report["batches"] < max_batches:
+            query = select(ChatSession.session_id).where(criteria)
+            if last_session_id is not None:
+                query = query.where(ChatSession.session_id > last_session_id)
+            query = query.order_by(ChatSession.session_id).limit(batch_size)
+
+            async with await self.get_session() as db:
+                result = await db.execute(query)
+                session_ids = list(result.scalars().all())
+
+            if not session_ids:
+                return
+
+            report["batches"] += 1
+            last_session_id = session_ids[-1]
+            yield session_ids
+
+            if len(session_ids) < batch_size:
+                return
 
     async def get_consent_status(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -409,22 +485,25 @@ class GDPRService:
         Returns:
             Dict con estado del consentimiento o None si no existe
         """
-        with self.get_session() as db:
+        async with await self.get_session() as db:
             try:
                 # Obtener sesión
-                session = db.execute(
+                result = await db.execute(
                     select(ChatSession).where(ChatSession.session_id == session_id)
-                ).scalar_one_or_none()
+                )
+                session = result.scalar_one_or_none()
 
                 if not session:
                     return None
 
                 # Obtener último consentimiento
-                latest_consent = db.execute(
+                consent_result = await db.execute(
                     select(GDPRConsent)
                     .where(GDPRConsent.session_id == session_id)
                     .order_by(GDPRConsent.consent_timestamp.desc())
-                ).scalar_one_or_none()
+                    .limit(1)
+                )
+                latest_consent = consent_result.scalar_one_or_none()
 
                 return {
                     "session_id": session_id,
@@ -465,12 +544,13 @@ class GDPRService:
         Returns:
             bool: True si la revocación fue exitosa
         """
-        with self.get_session() as db:
+        async with await self.get_session() as db:
             try:
                 # Buscar sesión
-                session = db.execute(
+                result = await db.execute(
                     select(ChatSession).where(ChatSession.session_id == session_id)
-                ).scalar_one_or_none()
+                )
+                session = result.scalar_one_or_none()
 
                 if not session:
                     logger.warning(
@@ -483,17 +563,16 @@ class GDPRService:
                 session.last_activity = datetime.utcnow()
 
                 # Eliminar consentimientos previos
-                db.execute(
+                await db.execute(
                     delete(GDPRConsent).where(GDPRConsent.session_id == session_id)
                 )
 
                 # Anonimizar datos personales
                 session.email = None
-                session.company = None
-                session.role = None
-                session.user_type = "anonymous"
+                session.linkedin = None
+                session.user_type = None
 
-                db.commit()
+                await db.commit()
 
                 logger.info(
                     f"✓ Consentimiento revocado y datos anonimizados para sesión: {session_id}"
@@ -502,7 +581,7 @@ class GDPRService:
 
             except SQLAlchemyError as e:
                 logger.error(f"❌ Error revocando consentimiento para {session_id}: {e}")
-                db.rollback()
+                await db.rollback()
                 return False
 
 
@@ -0,0 +1,471 @@
+"""
+Indexado incremental de la base de conocimiento en pgvector.
+Embebe solo los chunks nuevos o modificados (por hash de contenido) y publica
+la nueva versión de la colección con un intercambio atómico de nombres, de
+modo que las búsquedas nunca ven un índice vacío o a medio construir.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Sufijos de las colecciones auxiliares: "<nombre>__v<N>" (versiones
+# anteriores, para rollback) y "<nombre>__staging_v<N>" (en construcción)
+_VERSION_SUFFIX = "__v"
+_STAGING_SUFFIX = "__staging_v"
+
+_SELECT_COLLECTION_SQL = text(
+    "SELECT uuid, cmetadata FROM langchain_pg_collection WHERE name = :name LIMIT 1"
+)
+_SELECT_ROWS_SQL = text(
+    "SELECT uuid, document, cmetadata FROM langchain_pg_embedding "
+    "WHERE collection_id = :collection_id"
+)
+_INSERT_COLLECTION_SQL = text(
+    "INSERT INTO langchain_pg_collection (uuid, name, cmetadata) "
+    "VALUES (:uuid, :name, CAST(:cmetadata AS json))"
+)
+# Los chunks sin cambios se copian dentro de la base de datos con su vector
+_COPY_ROWS_SQL = text(
+    """
+    INSERT INTO langchain_pg_embedding
+        (uuid, collection_id, embedding, document, cmetadata, custom_id)
+    SELECT gen_random_uuid(), :collection_id, embedding, document, cmetadata, custom_id
+    FROM langchain_pg_embedding
+    WHERE uuid = ANY(CAST(:uuids AS uuid[]))
+    """
+)
+_INSERT_ROW_SQL = text(
+    """
+    INSERT INTO langchain_pg_embedding
+        (uuid, collection_id, embedding, document, cmetadata, custom_id)
+    VALUES (:uuid, :collection_id, CAST(:embedding AS vector), :document,
+            CAST(:cmetadata AS json), :custom_id)
+    """
+)
+# Inserción multi-fila con psycopg2.extras.execute_values
+_BULK_INSERT_SQL = (
+    "INSERT INTO langchain_pg_embedding "
+    "(uuid, collection_id, embedding, document, cmetadata, custom_id) VALUES %s"
+)
+_BULK_INSERT_TEMPLATE = "(%s, %s, %s::vector, %s, %s::json, %s)"
+_BULK_INSERT_PAGE_SIZE = 500
+_RENAME_COLLECTION_SQL = text(
+    "UPDATE langchain_pg_collection SET name = :name WHERE uuid = :uuid"
+)
+_PUBLISH_COLLECTION_SQL = text(
+    "UPDATE langchain_pg_collection SET name = :name, "
+    "cmetadata = CAST(:cmetadata AS json) WHERE uuid = :uuid"
+)
+_SELECT_OLD_VERSIONS_SQL = text(
+    """
+    SELECT uuid FROM langchain_pg_collection
+    WHERE name LIKE :pattern ESCAPE '\\'
+    ORDER BY COALESCE((cmetadata->>'version')::int, 0) DESC
+    OFFSET :keep
+    """
+)
+_DELETE_COLLECTION_SQL = text("DELETE FROM langchain_pg_collection WHERE uuid = :uuid")
+
+
+def content_hash(doc: Document) -> str:
+    """
+    Hash del contenido y los metadatos de un chunk.
+
+    Un chunk con el mismo hash que uno ya indexado conserva su vector; si
+    cambia el texto o cualquier metadato se vuelve a embeber.
+
+    Args:
+        doc: Chunk de la base de conocimiento
+
+    Returns:
+        str: SHA-256 en hexadecimal
+    """
+    payload = json.dumps(
+        {"content": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _vector_literal(vector: Sequence[float]) -> str:
+    """
+    Vector en el formato de texto de pgvector ("[0.1,0.2,...]").
+
+    9 dígitos significativos bastan para reconstruir exactamente un float32.
+    """
+    return "[" + ",".join(format(float(x), ".9g") for x in vector) + "]"
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass
+class IndexPlan:
+    """Cambios necesarios para que la colección refleje los chunks actuales."""
+
+    # uuid de las filas vivas que se conservan (sin re-embeber)
+    keep: List[str] = field(default_factory=list)
+    # Chunks nuevos o modificados, con su hash
+    embed: List[Tuple[str, Document]] = field(default_factory=list)
+    # Filas vivas que ya no corresponden a ningún chunk
+    removed: int = 0
+
+    @property
+    def unchanged(self) -> bool:
+        """Si la colección ya está al día."""
+        return not self.embed and not self.removed
+
+
+@dataclass
+class IndexResult:
+    """Resumen de una sincronización."""
+
+    collection_name: str
+    version: int
+    kept: int
+    embedded: int
+    removed: int
+    swapped: bool
+    elapsed_ms: float
+    embed_seconds: float = 0.0
+    insert_seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Rendimiento de la codificación de los chunks embebidos."""
+        return self.embedded / self.embed_seconds if self.embed_seconds else 0.0
+
+
+class IncrementalIndexer:
+    """
+    Sincroniza una colección de PGVector con la lista de chunks actual.
+
+    Cada sincronización con cambios construye una colección nueva (copiando
+    en SQL las filas sin cambios y embebiendo solo el resto) y la publica
+    renombrándola en una única transacción. La colección anterior se
+    conserva como "<nombre>__v<N>" para poder volver atrás.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        collection_name: str,
+        embeddings: Embeddings,
+        keep_versions: int = 1,
+    ):
+        """
+        Args:
+            connection_string: URL de la base de datos (driver síncrono)
+            collection_name: Nombre de la colección que sirve el backend
+            embeddings: Modelo de embeddings (el mismo que usa el backend); si
+                expone encode() (SentenceTransformerPipeline) se usa la matriz
+                que devuelve directamente
+            keep_versions: Versiones anteriores que se conservan para rollback
+        """
+        self.connection_string = connection_string
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.keep_versions = keep_versions
+
+    def _ensure_schema(self, engine: Engine) -> None:
+        """Crear la extensión y las tablas de PGVector si aún no existen."""
+        if inspect(engine).has_table("langchain_pg_collection"):
+            return
+        from langchain_community.vectorstores import PGVector
+
+        logger.info("Creando tablas de pgvector")
+        PGVector(
+            connection_string=self.connection_string,
+            embedding_function=self.embeddings,
+            collection_name=self.collection_name,
+        )
+
+    def _load_live(
+        self, conn: Connection
+    ) -> Tuple[Optional[str], Dict[str, Any], Dict[str, str]]:
+        """
+        Leer la colección publicada.
+
+        Returns:
+            Tuple con (uuid de la colección, sus metadatos, {hash: uuid de fila})
+        """
+        collection = conn.execute(
+            _SELECT_COLLECTION_SQL, {"name": self.collection_name}
+        ).first()
+        if collection is None:
+            return None, {}, {}
+
+        metadata = collection.cmetadata or {}
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+
+        rows: Dict[str, str] = {}
+        for row in conn.execute(_SELECT_ROWS_SQL, {"collection_id": collection.uuid}):
+            row_metadata = row.cmetadata
+            if isinstance(row_metadata, str):
+                row_metadata = json.loads(row_metadata)
+            doc = Document(page_content=row.document or "", metadata=row_metadata or {})
+            rows.setdefault(content_hash(doc), str(row.uuid))
+        return str(collection.uuid), metadata, rows
+
+    @staticmethod
+    def plan(documents: List[Document], live_rows: Dict[str, str]) -> IndexPlan:
+        """
+        Calcular qué chunks se conservan, cuáles se embeben y cuántos sobran.
+
+        Args:
+            documents: Chunks actuales de la base de conocimiento
+            live_rows: {hash: uuid de fila} de la colección publicada
+
+        Returns:
+            IndexPlan con los cambios
+        """
+        result = IndexPlan()
+        seen = set()
+        for doc in documents:
+            digest = content_hash(doc)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            if digest in live_rows:
+                result.keep.append(live_rows[digest])
+            else:
+                result.embed.append((digest, doc))
+        result.removed = sum(1 for digest in live_rows if digest not in seen)
+        return result
+
+    def sync(self, documents: List[Document]) -> IndexResult:
+        """
+        Sincronizar la colección con los chunks actuales.
+
+        Args:
+            documents: Chunks generados por build_knowledge_base.py
+
+        Returns:
+            IndexResult con el resumen de la sincronización
+
+        Raises:
+            RuntimeError: Si otra sincronización de la misma colección está en curso
+        """
+        started = time.perf_counter()
+        engine = create_engine(self.connection_string, pool_pre_ping=True)
+        try:
+            self._ensure_schema(engine)
+            with engine.connect() as lock_conn:
+                # Un solo indexador por colección (lock de sesión)
+                acquired = lock_conn.execute(
+                    text("SELECT pg_try_advisory_lock(hashtext(:name))"),
+                    {"name": self.collection_name},
+                ).scalar()
+                lock_conn.commit()
+                if not acquired:
+                    raise RuntimeError(
+                        f"Ya hay una sincronización en curso de {self.collection_name}"
+                    )
+                try:
+                    result = self._sync_locked(engine, documents)
+                finally:
+                    lock_conn.execute(
+                        text("SELECT pg_advisory_unlock(hashtext(:name))"),
+                        {"name": self.collection_name},
+                    )
+                    lock_conn.commit()
+        finally:
+            engine.dispose()
+
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def _sync_locked(self, engine: Engine, documents: List[Document]) -> IndexResult:
+        with engine.connect() as conn:
+            live_id, live_metadata, live_rows = self._load_live(conn)
+        version = int(live_metadata.get("version", 0))
+        plan = self.plan(documents, live_rows)
+
+        if live_id is not None and plan.unchanged:
+            logger.info(
+                f"✓ Colección {self.collection_name} al día (v{version}, "
+                f"{len(plan.keep)} chunks)"
+            )
+            return IndexResult(
+                self.collection_name, version, len(plan.keep), 0, 0, False, 0.0
+            )
+
+        # Embeber fuera de la transacción de publicación
+        embed_started = time.perf_counter()
+        vectors = self._embed([doc.page_content for _, doc in plan.embed])
+        embed_seconds = time.perf_counter() - embed_started
+
+        new_version = version + 1
+        collection_metadata = {
+            "version": new_version,
+            "chunks": len(plan.keep) + len(plan.embed),
+            "built_at": time.time(),
+        }
+        insert_started = time.perf_counter()
+        with engine.begin() as conn:
+            staging_id = self._build_staging(
+                conn, new_version, collection_metadata, plan, vectors
+            )
+            self._publish(conn, staging_id, collection_metadata, live_id, version)
+        insert_seconds = time.perf_counter() - insert_started
+        self._drop_old_versions(engine)
+
+        logger.info(
+            f"✓ Colección {self.collection_name} publicada v{new_version}: "
+            f"{len(plan.keep)} sin cambios, {len(plan.embed)} embebidos, "
+            f"{plan.removed} eliminados"
+        )
+        return IndexResult(
+            self.collection_name,
+            new_version,
+            len(plan.keep),
+            len(plan.embed),
+            plan.removed,
+            True,
+            0.0,
+            embed_seconds=embed_seconds,
+            insert_seconds=insert_seconds,
+        )
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Codificar los chunks en una matriz (n, dim)."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        encode = getattr(self.embeddings, "encode", None)
+        if callable(encode):
+            return encode(texts)
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def _build_staging(
+        self,
+        conn: Connection,
+        version: int,
+        collection_metadata: Dict[str, Any],
+        plan: IndexPlan,
+        vectors: np.ndarray,
+    ) -> str:
+        """
+        Crear la colección de la nueva versión con todas sus filas.
+
+        Returns:
+            str: uuid de la colección creada
+        """
+        staging_id = str(uuid.uuid4())
+        conn.execute(
+            _INSERT_COLLECTION_SQL,
+            {
+                "uuid": staging_id,
+                "name": f"{self.collection_name}{_STAGING_SUFFIX}{version}",
+                "cmetadata": json.dumps(collection_metadata),
+            },
+        )
+        if plan.keep:
+            conn.execute(
+                _COPY_ROWS_SQL, {"collection_id": staging_id, "uuids": plan.keep}
+            )
+        if plan.embed:
+            rows = [
+                (
+                    str(uuid.uuid4()),
+                    staging_id,
+                    _vector_literal(vector),
+                    doc.page_content,
+                    json.dumps(doc.metadata, default=str),
+                    digest,
+                )
+                for (digest, doc), vector in zip(plan.embed, vectors)
+            ]
+            self._insert_rows(conn, rows)
+        return staging_id
+
+    @staticmethod
+    def _insert_rows(conn: Connection, rows: List[Tuple[str, ...]]) -> None:
+        """
+        Insertar filas nuevas en bloque.
+
+        Con psycopg2 se usa execute_values (INSERT multi-fila por páginas, en
+        la misma transacción); con otros drivers, executemany.
+        """
+        if conn.dialect.driver == "psycopg2":
+            from psycopg2.extras import execute_values
+
+            cursor = conn.connection.cursor()
+            try:
+                execute_values(
+                    cursor,
+                    _BULK_INSERT_SQL,
+                    rows,
+                    template=_BULK_INSERT_TEMPLATE,
+                    page_size=_BULK_INSERT_PAGE_SIZE,
+                )
+            finally:
+                cursor.close()
+            return
+
+        keys = (
+            "uuid", "collection_id", "embedding", "document", "cmetadata", "custom_id"
+        )
+        conn.execute(_INSERT_ROW_SQL, [dict(zip(keys, row)) for row in rows])
+
+    def _publish(
+        self,
+        conn: Connection,
+        staging_id: str,
+        collection_metadata: Dict[str, Any],
+        live_id: Optional[str],
+        live_version: int,
+    ) -> None:
+        """
+        Intercambiar la colección publicada por la nueva.
+
+        Se ejecuta en la misma transacción que la construcción: las búsquedas
+        ven la versión anterior completa hasta el commit y la nueva después.
+        """
+        if live_id is not None:
+            conn.execute(
+                _RENAME_COLLECTION_SQL,
+                {
+                    "name": f"{self.collection_name}{_VERSION_SUFFIX}{live_version}",
+                    "uuid": live_id,
+                },
+            )
+        conn.execute(
+            _PUBLISH_COLLECTION_SQL,
+            {
+                "name": self.collection_name,
+                "cmetadata": json.dumps(collection_metadata),
+                "uuid": staging_id,
+            },
+        )
+
+    def _drop_old_versions(self, engine: Engine) -> None:
+        """Eliminar las versiones anteriores que exceden keep_versions."""
+        pattern = _escape_like(f"{self.collection_name}{_VERSION_SUFFIX}") + "%"
+        with engine.begin() as conn:
+            stale = conn.execute(
+                _SELECT_OLD_VERSIONS_SQL,
+                {"pattern": pattern, "keep": self.keep_versions},
+            ).fetchall()
+            for row in stale:
+                conn.execute(_DELETE_COLLECTION_SQL, {"uuid": row.uuid})
+        if stale:
+            logger.info(
+                f"✓ Eliminadas {len(stale)} versiones antiguas de la colección"
+            )
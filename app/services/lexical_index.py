@@ -0,0 +1,228 @@
+"""
+Índice léxico BM25 en memoria y fusión con la búsqueda vectorial.
+Recupera chunks por coincidencia exacta de términos (nombres de proyectos,
+tecnologías) que la búsqueda semántica por sí sola puede no priorizar.
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.docstore.document import Document
+
+from app.services.embedding_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Parámetros estándar de BM25 (Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def _fold_accents(text: str) -> str:
+    """Eliminar tildes y diacríticos ("formación" -> "formacion")."""
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+# Palabras vacías en español e inglés (no aportan al ranking léxico)
+_STOPWORDS = frozenset(
+    _fold_accents(word)
+    for word in """
+    a al algo algún alguna algunas alguno algunos ante antes como con contra cual
+    cuales cuando de del desde donde dos el ella ellas ellos en entre era eres es
+    esa ese eso esta este esto estos estas fue fueron ha has hay la las le les lo
+    los me mi mis muy más nos o os para pero por porque qué que se sin sobre su
+    sus te tu tus tú un una uno unos unas y ya yo cuál cómo dónde cuándo tienes
+    tiene
+    an and are as at be by did do does for from had has have how i in is it its
+    me my of on or that the their this to was what when where which who why with
+    you your
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenizar para el índice léxico.
+
+    Normaliza como las claves de cache (NFKC, casefold, sin puntuación),
+    elimina tildes para que "formación" y "formacion" coincidan y descarta
+    palabras vacías.
+
+    Args:
+        text: Texto a tokenizar
+
+    Returns:
+        Lista de términos
+    """
+    folded = _fold_accents(normalize_question(text))
+    return [
+        token
+        for token in folded.split()
+        if token not in _STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def document_key(doc: Document) -> str:
+    """
+    Identidad de un chunk para fusionar resultados de distintos índices.
+
+    Se usa el contenido: los sub-chunks de un mismo proyecto comparten
+    metadatos, y cada índice devuelve sus propias instancias de Document.
+    """
+    return doc.page_content
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    Identificador corto y estable de un chunk (hash de su contenido).
+
+    Sirve como clave persistible (cache de scores, tabla de routing) con la
+    misma identidad que document_key.
+    """
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]], k: int, rrf_k: int = 60
+) -> List[Document]:
+    """
+    Fusionar varios rankings con Reciprocal Rank Fusion.
+
+    score(d) = Σ 1 / (rrf_k + posición), con posiciones desde 1. Los empates
+    se resuelven por el orden del primer ranking en que aparece el chunk.
+
+    Args:
+        rankings: Rankings a fusionar, cada uno de más a menos relevante
+        k: Número de documentos a devolver
+        rrf_k: Constante de suavizado de RRF
+
+    Returns:
+        Los k documentos con mayor score fusionado
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    first_seen: Dict[str, Tuple[int, Document]] = {}
+    for ranking in rankings:
+        for position, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            scores[key] += 1.0 / (rrf_k + position)
+            first_seen.setdefault(key, (len(first_seen), doc))
+
+    ordered = sorted(scores, key=lambda key: (-scores[key], first_seen[key][0]))
+    return [first_seen[key][1] for key in ordered[:k]]
+
+
+class BM25Index:
+    """
+    Índice BM25 sobre los chunks de la base de conocimiento.
+
+    Se construye una vez (índice invertido término → [(chunk, peso)], con el
+    IDF y la normalización por longitud ya aplicados al peso) y se reemplaza
+    entero al refrescar. Con unas decenas de chunks una consulta solo recorre las
+    listas de sus propios términos.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            k1: Saturación de la frecuencia del término
+            b: Peso de la normalización por longitud del chunk
+        """
+        self.k1 = k1
+        self.b = b
+
+        # Snapshot inmutable (postings, documentos); se reemplaza al reconstruir
+        self._snapshot: Tuple[Dict[str, List[Tuple[int, float]]], List[Document]]
+        self._snapshot = ({}, [])
+        self.built_at: Optional[float] = None
+        self.last_build_ms: float = 0.0
+
+    @property
+    def size(self) -> int:
+        """Número de chunks indexados."""
+        return len(self._snapshot[1])
+
+    @property
+    def documents(self) -> List[Document]:
+        """Chunks del snapshot actual."""
+        return self._snapshot[1]
+
+    def build(self, documents: List[Document]) -> int:
+        """
+        Construir el índice a partir de los chunks.
+
+        Args:
+            documents: Chunks de la base de conocimiento
+
+        Returns:
+            int: Número de chunks indexados
+        """
+        started = time.perf_counter()
+        term_freqs = [Counter(tokenize(doc.page_content)) for doc in documents]
+        lengths = [sum(tf.values()) for tf in term_freqs]
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+        doc_freq: Counter = Counter()
+        for tf in term_freqs:
+            doc_freq.update(tf.keys())
+
+        total = len(documents)
+        postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for index, tf in enumerate(term_freqs):
+            relative_length = lengths[index] / avg_length if avg_length else 0.0
+            norm = self.k1 * (1 - self.b + self.b * relative_length)
+            for term, freq in tf.items():
+                df = doc_freq[term]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                # Peso final del término en el chunk: la consulta solo suma
+                weight = idf * freq * (self.k1 + 1) / (freq + norm)
+                postings[term].append((index, weight))
+
+        self._snapshot = (dict(postings), list(documents))
+        self.built_at = time.time()
+        self.last_build_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        logger.info(
+            f"✓ Índice BM25 construido: {total} chunks, {len(postings)} términos "
+            f"({self.last_build_ms}ms)"
+        )
+        return total
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """
+        Top-k chunks por score BM25.
+
+        Args:
+            query: Pregunta del usuario
+            k: Número de documentos a devolver
+
+        Returns:
+            Lista de (documento, score) con score > 0, de mayor a menor
+        """
+        postings, documents = self._snapshot
+        if not documents or k <= 0:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            for index, weight in postings.get(term, ()):
+                scores[index] += weight
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(documents[index], score) for index, score in top]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener el estado del índice."""
+        postings, _ = self._snapshot
+        return {
+            "size": self.size,
+            "terms": len(postings),
+            "built_at": self.built_at,
+            "last_build_ms": self.last_build_ms,
+        }
@@ -0,0 +1,224 @@
+"""
+Re-ranking de los chunks recuperados con un cross-encoder local.
+Puntúa cada par (pregunta, chunk) con un modelo pequeño en CPU para quedarse
+con menos chunks pero más relevantes, dentro de un presupuesto de latencia.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+from app.services.embedding_cache import normalize_question
+from app.services.lexical_index import chunk_id
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Re-ranker con cross-encoder (sentence-transformers) y cache de scores.
+
+    Los pares que no están en cache se puntúan en un único forward pass
+    (batch con todos los candidatos) en un hilo dedicado, que se espera sin
+    bloquear el event loop. Si el scoring no termina dentro del presupuesto
+    (sin límite con timeout_ms=None), se devuelve el orden de la recuperación;
+    el forward pass sigue en background y sus scores quedan en cache para la
+    siguiente pregunta igual.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        top_n: int,
+        timeout_ms: Optional[float] = 150.0,
+        cache_max_size: int = 5000,
+        max_length: int = 512,
+    ):
+        """
+        Args:
+            model_name: Modelo cross-encoder de HuggingFace
+            top_n: Chunks que se conservan tras el re-ranking
+            timeout_ms: Presupuesto de latencia del scoring (None: sin límite,
+                para los usos offline)
+            cache_max_size: Máximo de scores (pregunta, chunk) en cache
+            max_length: Longitud máxima en tokens de cada par
+        """
+        self.model_name = model_name
+        self.top_n = top_n
+        self.timeout_ms = timeout_ms
+        self.cache_max_size = cache_max_size
+        self.max_length = max_length
+
+        self._model = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Future] = None
+
+        # {(pregunta normalizada, chunk_id): score}
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.reranked = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timeouts = 0
+        self.busy = 0
+        self.errors = 0
+        self.last_latency_ms: float = 0.0
+
+    @property
+    def is_loaded(self) -> bool:
+        """Si el modelo está cargado y el re-ranking disponible."""
+        return self._model is not None
+
+    def load(self) -> None:
+        """
+        Cargar el modelo en CPU.
+
+        Raises:
+            ImportError: Si sentence-transformers no está instalado
+        """
+        from sentence_transformers import CrossEncoder
+
+        started = time.perf_counter()
+        self._model = CrossEncoder(
+            self.model_name, max_length=self.max_length, device="cpu"
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="reranker"
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"✓ Cross-encoder cargado: {self.model_name} ({elapsed_ms:.0f}ms)")
+
+    def shutdown(self) -> None:
+        """Liberar el hilo de scoring."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def _store_scores(self, keys: List[Tuple[str, str]], scores: List[float]) -> None:
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_max_size:
+                self._scores.popitem(last=False)
+
+    def _score_batch(
+        self, keys: List[Tuple[str, str]], pairs: List[Tuple[str, str]]
+    ) -> List[float]:
+        """Forward pass único con todos los pares; guarda los scores en cache."""
+        scores = [
+            float(score)
+            for score in self._model.predict(
+                pairs, batch_size=len(pairs), show_progress_bar=False
+            )
+        ]
+        self._store_scores(keys, scores)
+        return scores
+
+    async def rerank(
+        self, question: str, documents: List[Document]
+    ) -> List[Document]:
+        """
+        Reordenar los chunks por relevancia y quedarse con los top_n.
+
+        Args:
+            question: Pregunta del usuario
+            documents: Chunks recuperados, en el orden de la recuperación
+
+        Returns:
+            Los top_n chunks por score del cross-encoder, o los top_n en el
+            orden original si el scoring no está disponible o excede el
+            presupuesto de latencia
+        """
+        if not documents:
+            return documents
+        fallback = documents[: self.top_n]
+        if self._model is None or self._executor is None:
+            return fallback
+
+        started = time.perf_counter()
+        question_key = normalize_question(question)
+        keys = [(question_key, chunk_id(doc)) for doc in documents]
+
+        scores: List[Optional[float]] = [self._lookup(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self.cache_hits += len(documents) - len(missing)
+        self.cache_misses += len(missing)
+
+        if missing:
+            # Un solo forward pass en vuelo: si el anterior sigue ocupando el
+            # hilo (p. ej. tras un timeout), no se encola otro
+            if self._pending is not None and not self._pending.done():
+                self.busy += 1
+                logger.debug("⚠️ Re-ranker ocupado, se mantiene el orden de recuperación")
+                return fallback
+
+            pairs = [(question, documents[i].page_content) for i in missing]
+            missing_keys = [keys[i] for i in missing]
+            future = self._executor.submit(self._score_batch, missing_keys, pairs)
+            self._pending = future
+            remaining = None
+            if self.timeout_ms is not None:
+                elapsed = time.perf_counter() - started
+                remaining = max(self.timeout_ms / 1000 - elapsed, 0.0)
+            try:
+                # shield: el timeout no cancela el forward pass, que termina
+                # en background y deja sus scores en cache
+                batch_scores = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)), timeout=remaining
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logger.info(
+                    f"⚠️ Re-ranking excedió {self.timeout_ms:.0f}ms, "
+                    "se mantiene el orden de recuperación"
+                )
+                return fallback
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Error en el re-ranking: {e}")
+                return fallback
+
+            for i, score in zip(missing, batch_scores):
+                scores[i] = score
+
+        # sorted es estable: a igual score se respeta el orden de recuperación
+        ranked = sorted(range(len(documents)), key=lambda i: -scores[i])
+        self.reranked += 1
+        self.last_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.debug(
+            f"🔍 Re-ranking: {len(documents)} candidatos -> {self.top_n} "
+            f"({self.last_latency_ms}ms, {len(missing)} pares puntuados)"
+        )
+        return [documents[i] for i in ranked[: self.top_n]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener métricas del re-ranker."""
+        return {
+            "model": self.model_name,
+            "loaded": self.is_loaded,
+            "top_n": self.top_n,
+            "timeout_ms": self.timeout_ms,
+            "reranked": self.reranked,
+            "cache_size": len(self._scores),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "timeouts": self.timeouts,
+            "busy": self.busy,
+            "errors": self.errors,
+            "last_latency_ms": self.last_latency_ms,
+        }
@@ -0,0 +1,195 @@
+"""
+Tabla de routing precalculada: pregunta frecuente -> chunks recuperados.
+La genera offline scripts/setup/build_routing_table.py a partir de
+conversation_pairs; un acierto evita el embedding y la búsqueda de la pregunta.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+from app.services.embedding_cache import normalize_question
+from app.services.lexical_index import chunk_id
+
+logger = logging.getLogger(__name__)
+
+# Versión del formato del fichero; una tabla de otra versión se ignora
+ROUTING_TABLE_VERSION = 1
+
+
+def collection_fingerprint(documents: Iterable[Document]) -> str:
+    """
+    Huella de los chunks indexados (independiente del orden).
+
+    Cambia en cuanto se añade, elimina o modifica cualquier chunk, lo que
+    invalida las tablas de routing construidas sobre la colección anterior.
+
+    Args:
+        documents: Chunks de la colección
+
+    Returns:
+        str: Hash SHA-256 de los identificadores de chunk ordenados
+    """
+    digest = hashlib.sha256()
+    for identifier in sorted(chunk_id(doc) for doc in documents):
+        digest.update(identifier.encode("ascii"))
+    return digest.hexdigest()
+
+
+def write_routing_table(
+    path: str,
+    fingerprint: str,
+    routes: Mapping[str, Tuple[int, List[Document]]],
+) -> None:
+    """
+    Escribir la tabla de routing en disco (de forma atómica).
+
+    Los chunks se guardan una sola vez y cada ruta los referencia por id.
+
+    Args:
+        path: Fichero JSON de salida
+        fingerprint: Huella de la colección sobre la que se recuperaron
+        routes: {pregunta normalizada: (frecuencia, chunks recuperados)}
+    """
+    chunks: Dict[str, Dict[str, Any]] = {}
+    entries: Dict[str, Dict[str, Any]] = {}
+    for question, (count, documents) in routes.items():
+        ids = []
+        for doc in documents:
+            identifier = chunk_id(doc)
+            chunks.setdefault(
+                identifier, {"content": doc.page_content, "metadata": doc.metadata}
+            )
+            ids.append(identifier)
+        entries[question] = {"count": count, "chunk_ids": ids}
+
+    payload = {
+        "version": ROUTING_TABLE_VERSION,
+        "fingerprint": fingerprint,
+        "built_at": time.time(),
+        "chunks": chunks,
+        "routes": entries,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class RoutingTable:
+    """
+    Tabla de routing en memoria (solo lectura).
+
+    Se carga entera al arrancar y solo se activa si su huella coincide con la
+    de los chunks indexados; si la colección cambió y la tabla no se ha
+    regenerado, se ignora y todas las preguntas pasan por la búsqueda.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Fichero JSON generado por build_routing_table.py
+        """
+        self.path = path
+        self._routes: Mapping[str, Tuple[Document, ...]] = MappingProxyType({})
+        self.fingerprint: Optional[str] = None
+        self.built_at: Optional[float] = None
+        self.stale = False
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        """Número de preguntas con ruta activa."""
+        return len(self._routes)
+
+    def load(self, expected_fingerprint: str) -> int:
+        """
+        Cargar la tabla si corresponde a la colección indexada.
+
+        Args:
+            expected_fingerprint: Huella de los chunks indexados actualmente
+
+        Returns:
+            int: Número de rutas activas (0 si la tabla no existe, es de otra
+            versión o está desactualizada)
+        """
+        self._routes = MappingProxyType({})
+        self.stale = False
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"⚠️ Tabla de routing no encontrada: {self.path}")
+            return 0
+
+        if payload.get("version") != ROUTING_TABLE_VERSION:
+            logger.warning(
+                f"⚠️ Tabla de routing con versión {payload.get('version')} "
+                f"(se esperaba {ROUTING_TABLE_VERSION}), ignorada"
+            )
+            return 0
+
+        self.fingerprint = payload.get("fingerprint")
+        self.built_at = payload.get("built_at")
+        if self.fingerprint != expected_fingerprint:
+            self.stale = True
+            logger.warning(
+                "⚠️ Tabla de routing desactualizada (los chunks indexados "
+                "cambiaron), ignorada hasta regenerarla"
+            )
+            return 0
+
+        chunks = {
+            identifier: Document(
+                page_content=chunk["content"], metadata=chunk.get("metadata", {})
+            )
+            for identifier, chunk in payload.get("chunks", {}).items()
+        }
+        self._routes = MappingProxyType(
+            {
+                question: tuple(chunks[i] for i in route["chunk_ids"])
+                for question, route in payload.get("routes", {}).items()
+            }
+        )
+        logger.info(
+            f"✓ Tabla de routing cargada: {self.size} preguntas, "
+            f"{len(chunks)} chunks"
+        )
+        return self.size
+
+    def lookup(self, question: str) -> Optional[List[Document]]:
+        """
+        Chunks precalculados para una pregunta.
+
+        Args:
+            question: Pregunta del usuario (se normaliza como las claves de cache)
+
+        Returns:
+            Lista de chunks en el orden de la recuperación, o None si no hay ruta
+        """
+        documents = self._routes.get(normalize_question(question))
+        if documents is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(documents)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener el estado de la tabla."""
+        return {
+            "path": self.path,
+            "routes": self.size,
+            "stale": self.stale,
+            "built_at": self.built_at,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,193 @@
+"""
+Cache semántico de respuestas.
+Reutiliza respuestas de preguntas parafraseadas comparando sus embeddings.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _SemanticEntry:
+    """Entrada del cache: pregunta original, vector normalizado y respuesta."""
+
+    question: str
+    vector: np.ndarray
+    response: Dict[str, Any]
+    created_at: float
+
+
+class _SemanticBucket:
+    """Entradas de un user_type con su matriz de vectores (reconstruida bajo demanda)."""
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, _SemanticEntry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+
+    def invalidate(self) -> None:
+        self._matrix = None
+
+    def matrix(self) -> Tuple[np.ndarray, List[str]]:
+        if self._matrix is None:
+            self._keys = list(self.entries.keys())
+            self._matrix = np.vstack([self.entries[k].vector for k in self._keys])
+        return self._matrix, self._keys
+
+
+class SemanticResponseCache:
+    """
+    Cache LRU/TTL de respuestas indexado por similitud coseno de la pregunta.
+
+    Las entradas se separan por user_type para no servir a un recruiter la
+    respuesta adaptada a otro perfil.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        near_miss_margin: float = 0.05,
+        max_size: int = 500,
+        ttl_seconds: int = 1800,
+    ):
+        """
+        Args:
+            threshold: Similitud coseno mínima para considerar un hit
+            near_miss_margin: Margen bajo el umbral que se contabiliza como near-miss
+            max_size: Máximo de entradas por user_type
+            ttl_seconds: Tiempo de vida de cada entrada
+        """
+        self.threshold = threshold
+        self.near_miss_margin = near_miss_margin
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._buckets: Dict[str, _SemanticBucket] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+
+    @staticmethod
+    def _normalize_vector(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _purge_expired(self, bucket: _SemanticBucket) -> None:
+        """Eliminar las entradas caducadas de un bucket."""
+        now = time.time()
+        expired = [
+            key
+            for key, entry in bucket.entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]
+        for key in expired:
+            del bucket.entries[key]
+        if expired:
+            bucket.invalidate()
+
+    def lookup(
+        self, vector: List[float], user_type: str
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Buscar la pregunta cacheada más similar para un user_type.
+
+        Args:
+            vector: Embedding de la pregunta
+            user_type: Tipo de usuario
+
+        Returns:
+            (respuesta, similitud) si supera el umbral, None en caso contrario
+        """
+        with self._lock:
+            bucket = self._buckets.get(user_type)
+            if bucket is not None:
+                self._purge_expired(bucket)
+
+            if bucket is None or not bucket.entries:
+                self.misses += 1
+                return None
+
+            matrix, keys = bucket.matrix()
+            scores = matrix @ self._normalize_vector(vector)
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+
+            if similarity >= self.threshold:
+                key = keys[best]
+                # El orden LRU no afecta a la matriz: solo cambia al añadir/eliminar
+                bucket.entries.move_to_end(key)
+                self.hits += 1
+                entry = bucket.entries[key]
+                logger.debug(
+                    f"✓ Cache semántico hit ({similarity:.3f}): '{entry.question[:50]}'"
+                )
+                return entry.response, similarity
+
+            self.misses += 1
+            if similarity >= self.threshold - self.near_miss_margin:
+                self.near_misses += 1
+            return None
+
+    def store(
+        self,
+        question: str,
+        vector: List[float],
+        user_type: str,
+        response: Dict[str, Any],
+    ) -> None:
+        """
+        Guardar una respuesta asociada al embedding de su pregunta.
+
+        Args:
+            question: Pregunta original
+            vector: Embedding de la pregunta
+            user_type: Tipo de usuario
+            response: Respuesta a cachear
+        """
+        key = normalize_question(question)
+        entry = _SemanticEntry(
+            question=question,
+            vector=self._normalize_vector(vector),
+            response=response,
+            created_at=time.time(),
+        )
+
+        with self._lock:
+            bucket = self._buckets.setdefault(user_type, _SemanticBucket())
+            bucket.entries[key] = entry
+            bucket.entries.move_to_end(key)
+            while len(bucket.entries) > self.max_size:
+                bucket.entries.popitem(last=False)
+            bucket.invalidate()
+
+    def clear(self) -> None:
+        """Vaciar el cache y reiniciar contadores."""
+        with self._lock:
+            self._buckets.clear()
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener estadísticas del cache semántico."""
+        total = self.hits + self.misses
+        return {
+            "size": sum(len(b.entries) for b in self._buckets.values()),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_misses": self.near_misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,116 @@
+"""
+Detección de categorías por patrones en una sola pasada.
+Compila las tablas de patrones (tecnologías, intenciones...) en una única
+expresión regular y resuelve cada coincidencia a sus categorías con un dict.
+"""
+
+import re
+from typing import Dict, FrozenSet, List, Mapping, Sequence, Tuple
+
+_WORD_BOUNDARY = r"\b"
+
+
+class CategoryMatcher:
+    """
+    Matcher multi-patrón precompilado.
+
+    Todos los patrones distintos se unen en una alternancia sin grupos de
+    captura (los grupos nombrados hacen la búsqueda varias veces más lenta en
+    el motor de re). Si todos están delimitados por \\b, los delimitadores se
+    factorizan fuera de la alternancia para que solo se prueben las
+    alternativas en los límites de palabra.
+
+    Cada texto coincidente (en minúsculas) se resuelve una única vez a las
+    categorías cuyos patrones lo reconocen y el resultado se memoriza; un
+    patrón compartido por varias categorías (p. ej. "trabajo" en experience y
+    availability) las activa todas. El recorrido termina en cuanto se han
+    detectado todas las categorías posibles.
+
+    Las coincidencias no se solapan, así que un patrón contenido dentro de
+    otro que ya ha coincidido en la misma posición (p. ej. "learning" dentro
+    de "machine learning") no se cuenta aparte.
+    """
+
+    def __init__(self, tables: Mapping[str, Mapping[str, Sequence[str]]]):
+        """
+        Args:
+            tables: {tabla: {categoría: [patrones regex]}}, p. ej.
+                {"technologies": {...}, "intents": {...}}
+        """
+        self.tables = tuple(tables)
+
+        # Orden de salida de cada tabla: el de declaración de sus categorías
+        self._order: Dict[Tuple[str, str], int] = {}
+        targets_by_pattern: Dict[str, List[Tuple[str, str]]] = {}
+        for table, categories in tables.items():
+            for category, patterns in categories.items():
+                self._order[(table, category)] = len(self._order)
+                for pattern in patterns:
+                    targets = targets_by_pattern.setdefault(pattern, [])
+                    if (table, category) not in targets:
+                        targets.append((table, category))
+
+        self._patterns = [
+            (re.compile(pattern, re.IGNORECASE), tuple(targets))
+            for pattern, targets in targets_by_pattern.items()
+        ]
+        self._regex = re.compile(
+            self._build_alternation(list(targets_by_pattern)), re.IGNORECASE
+        )
+        self._resolved: Dict[str, FrozenSet[Tuple[str, str]]] = {}
+
+    @staticmethod
+    def _build_alternation(patterns: List[str]) -> str:
+        """Unir los patrones en una alternancia, factorizando \\b si es común."""
+        if not patterns:
+            return r"(?!)"
+
+        bounded = all(
+            p.startswith(_WORD_BOUNDARY) and p.endswith(_WORD_BOUNDARY)
+            for p in patterns
+        )
+        if bounded:
+            inner = "|".join(f"(?:{p[2:-2]})" for p in patterns)
+            return rf"\b(?:{inner})\b"
+        return "|".join(f"(?:{p})" for p in patterns)
+
+    @property
+    def pattern_count(self) -> int:
+        """Número de patrones distintos compilados."""
+        return len(self._patterns)
+
+    def _resolve(self, token: str) -> FrozenSet[Tuple[str, str]]:
+        """Categorías cuyos patrones reconocen un texto coincidente."""
+        targets = self._resolved.get(token)
+        if targets is None:
+            targets = frozenset(
+                target
+                for compiled, pattern_targets in self._patterns
+                if compiled.fullmatch(token)
+                for target in pattern_targets
+            )
+            self._resolved[token] = targets
+        return targets
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """
+        Detectar las categorías presentes en un texto.
+
+        Args:
+            text: Texto a analizar (no hace falta pasarlo a minúsculas)
+
+        Returns:
+            Dict[str, List[str]]: Categorías detectadas por tabla, en el orden
+            en que se declararon
+        """
+        found = set()
+        total = len(self._order)
+        for match in self._regex.finditer(text):
+            found.update(self._resolve(match.group().lower()))
+            if len(found) == total:
+                break
+
+        result: Dict[str, List[str]] = {table: [] for table in self.tables}
+        for table, category in sorted(found, key=self._order.__getitem__):
+            result[table].append(category)
+        return result
@@ -0,0 +1,244 @@
+"""
+Índice vectorial exacto en memoria.
+Carga los embeddings de la colección de pgvector en una matriz NumPy y
+resuelve el top-k con un único producto matriz-vector.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import create_engine, text
+
+from app.services.embedding_artifact import load_artifact
+
+logger = logging.getLogger(__name__)
+
+# Tablas creadas por langchain_community.vectorstores.PGVector
+_LOAD_COLLECTION_SQL = """
+    SELECT e.document, e.cmetadata{embedding_column}
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE c.name = :collection_name
+    """
+
+
+def fetch_collection(
+    connection_string: str, collection_name: str, with_embeddings: bool = True
+) -> Tuple[List[Document], List[List[float]]]:
+    """
+    Leer los chunks (y opcionalmente sus vectores) de una colección pgvector.
+
+    Args:
+        connection_string: URL de la base de datos
+        collection_name: Nombre de la colección
+        with_embeddings: Leer también los vectores
+
+    Returns:
+        Tuple con los documentos y sus vectores (lista vacía si no se piden)
+    """
+    query = text(
+        _LOAD_COLLECTION_SQL.format(
+            embedding_column=", e.embedding::text AS embedding"
+            if with_embeddings
+            else ""
+        )
+    )
+    engine = create_engine(connection_string, pool_pre_ping=True)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(query, {"collection_name": collection_name}).fetchall()
+    finally:
+        engine.dispose()
+
+    documents: List[Document] = []
+    vectors: List[List[float]] = []
+    for row in rows:
+        metadata = row.cmetadata
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        documents.append(
+            Document(page_content=row.document or "", metadata=metadata or {})
+        )
+        if with_embeddings:
+            vectors.append(json.loads(row.embedding))
+    return documents, vectors
+
+
+class InMemoryVectorIndex:
+    """
+    Índice de búsqueda exacta por similitud coseno sobre una matriz contigua.
+
+    La base de conocimiento son unas decenas de chunks, así que la búsqueda
+    exacta en memoria es más rápida que un round trip a Cloud SQL y sigue
+    respondiendo aunque la base de datos esté degradada.
+    """
+
+    def __init__(
+        self, embeddings: Embeddings, connection_string: str, collection_name: str
+    ):
+        """
+        Args:
+            embeddings: Modelo para embeber las consultas (mismo que al indexar)
+            connection_string: URL de la base de datos con la colección pgvector
+            collection_name: Nombre de la colección a cargar
+        """
+        self.embeddings = embeddings
+        self.connection_string = connection_string
+        self.collection_name = collection_name
+
+        # Snapshot inmutable (matriz, documentos); se reemplaza entero al refrescar
+        self._snapshot: Tuple[np.ndarray, List[Document]] = (
+            np.empty((0, 0), dtype=np.float32),
+            [],
+        )
+        self._refresh_lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self.last_load_ms: float = 0.0
+        # Origen del snapshot: "pgvector" o "artifact"
+        self.source: Optional[str] = None
+        self.artifact_version: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        """Número de chunks cargados."""
+        return len(self._snapshot[1])
+
+    def load(self) -> int:
+        """
+        Cargar (o recargar) la colección desde pgvector.
+
+        Si la carga falla se mantiene el snapshot anterior.
+
+        Returns:
+            int: Número de chunks cargados
+        """
+        with self._refresh_lock:
+            started = time.perf_counter()
+            documents, vectors = fetch_collection(
+                self.connection_string, self.collection_name
+            )
+
+            self._snapshot = (self._build_matrix(vectors), documents)
+            self.loaded_at = time.time()
+            self.last_load_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.source = "pgvector"
+            self.artifact_version = None
+
+        logger.info(
+            f"✓ Índice vectorial en memoria cargado: {len(documents)} chunks "
+            f"({self.last_load_ms}ms)"
+        )
+        return len(documents)
+
+    def load_artifact(self, directory: str, model_name: str) -> int:
+        """
+        Cargar el índice desde un artefacto precalculado, sin base de datos.
+
+        La matriz se mapea en memoria tal cual (ya está normalizada), de modo
+        que no se copia al arrancar y las páginas se comparten entre procesos.
+        Si la carga falla se mantiene el snapshot anterior.
+
+        Args:
+            directory: Directorio del artefacto (build_embedding_artifact.py)
+            model_name: Modelo de embeddings de las consultas
+
+        Returns:
+            int: Número de chunks cargados
+        """
+        with self._refresh_lock:
+            started = time.perf_counter()
+            matrix, documents, manifest = load_artifact(directory, model_name)
+
+            self._snapshot = (matrix, documents)
+            self.loaded_at = time.time()
+            self.last_load_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.source = "artifact"
+            self.artifact_version = manifest["version"]
+
+        logger.info(
+            f"✓ Índice vectorial cargado desde artefacto: {len(documents)} chunks, "
+            f"{manifest['dtype']} ({self.last_load_ms}ms)"
+        )
+        return len(documents)
+
+    @staticmethod
+    def _build_matrix(vectors: List[List[float]]) -> np.ndarray:
+        """Construir la matriz float32 con filas normalizadas (L2)."""
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @property
+    def documents(self) -> List[Document]:
+        """Chunks del snapshot actual."""
+        return self._snapshot[1]
+
+    def similarity_search_with_score_by_vector(
+        self, vector: List[float], k: int
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k documentos por similitud coseno para un vector de consulta.
+
+        Args:
+            vector: Embedding de la consulta
+            k: Número de documentos a devolver
+
+        Returns:
+            Lista de (documento, similitud) ordenada de mayor a menor
+        """
+        matrix, documents = self._snapshot
+        if not documents or k <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        scores = matrix @ query
+        k = min(k, len(documents))
+        if k < len(documents):
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        else:
+            top = np.argsort(-scores)
+
+        return [(documents[i], float(scores[i])) for i in top]
+
+    def similarity_search(self, query: str, k: int) -> List[Document]:
+        """
+        Top-k documentos para una consulta en texto.
+
+        Args:
+            query: Pregunta del usuario
+            k: Número de documentos a devolver
+
+        Returns:
+            Lista de documentos más similares
+        """
+        vector = self.embeddings.embed_query(query)
+        return [
+            doc for doc, _ in self.similarity_search_with_score_by_vector(vector, k)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener el estado del índice."""
+        matrix, _ = self._snapshot
+        return {
+            "collection": self.collection_name,
+            "size": self.size,
+            "dimensions": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "source": self.source,
+            "artifact_version": self.artifact_version,
+            "loaded_at": self.loaded_at,
+            "last_load_ms": self.last_load_ms,
+        }
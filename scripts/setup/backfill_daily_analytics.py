@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Rellena daily_analytics para los días anteriores a los rollups incrementales.
+
+Con ENABLE_DAILY_ROLLUPS las métricas generales suman las filas de
+daily_analytics; los días con sesiones de antes de activarlo no tienen fila.
+Este script las crea desde chat_sessions y session_analytics con la misma
+definición de día que los rollups. Los días que ya tienen fila no se tocan.
+
+Uso:
+    python scripts/setup/backfill_daily_analytics.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services.analytics_service import analytics_service  # noqa: E402
+
+
+def main() -> None:
+    print("📊 Rellenando daily_analytics para días sin rollup...\n")
+    filled = asyncio.run(analytics_service.backfill_daily_metrics())
+    print(f"✅ {filled} días rellenados")
+
+
+if __name__ == "__main__":
+    main()
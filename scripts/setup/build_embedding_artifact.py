@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Genera el artefacto de embeddings de la base de conocimiento.
+
+Procesa data/portfolio.yaml con build_knowledge_base.py, codifica los chunks
+con el pipeline por lotes y escribe en un directorio la matriz de vectores
+(.npy), los chunks (JSONL) y un manifest versionado. RAGService lo mapea en
+memoria al arrancar (EMBEDDING_ARTIFACT_PATH) y sirve la búsqueda vectorial
+sin conectarse a pgvector. No necesita base de datos: se ejecuta al construir
+la imagen Docker.
+
+Uso:
+    python scripts/setup/build_embedding_artifact.py --output artifacts/knowledge
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.config import settings  # noqa: E402
+from app.services.embedding_artifact import (  # noqa: E402
+    SUPPORTED_DTYPES,
+    write_artifact,
+)
+from app.services.embedding_pipeline import SentenceTransformerPipeline  # noqa: E402
+from build_knowledge_base import load_and_prepare_chunks  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Genera el artefacto de embeddings")
+    parser.add_argument(
+        "--portfolio",
+        default=str(project_root / "data" / "portfolio.yaml"),
+        help="YAML del portfolio",
+    )
+    parser.add_argument(
+        "--output",
+        default=settings.EMBEDDING_ARTIFACT_PATH or "artifacts/knowledge",
+        help="Directorio de salida",
+    )
+    parser.add_argument(
+        "--dtype", choices=SUPPORTED_DTYPES, default="float32", help="Tipo de la matriz"
+    )
+    parser.add_argument("--batch-size", type=int, default=64, help="Textos por lote")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Procesos de codificación"
+    )
+    args = parser.parse_args()
+
+    print("📦 Generando artefacto de embeddings...\n")
+    with contextlib.redirect_stdout(io.StringIO()):
+        chunks = load_and_prepare_chunks(args.portfolio)
+    if not chunks:
+        print(f"❌ No se generaron chunks desde {args.portfolio}")
+        sys.exit(1)
+    print(f"✓ {len(chunks)} chunks generados")
+
+    pipeline = SentenceTransformerPipeline(
+        model_name=settings.EMBEDDING_MODEL_NAME,
+        batch_size=args.batch_size,
+        workers=args.workers,
+    )
+    vectors = pipeline.encode([doc.page_content for doc in chunks])
+    stats = pipeline.last_stats
+    print(
+        f"✓ Codificados en {stats.seconds:.2f}s "
+        f"({stats.chunks_per_second:.1f} chunks/s)"
+    )
+
+    manifest = write_artifact(
+        args.output, chunks, vectors, settings.EMBEDDING_MODEL_NAME, dtype=args.dtype
+    )
+    print(f"\n✅ Artefacto escrito en {args.output}")
+    print(f"   - Versión: {manifest['version'][:12]}")
+    print(
+        f"   - Matriz: {manifest['count']}x{manifest['dimensions']} "
+        f"{manifest['dtype']}"
+    )
+    print(f"   - Modelo: {manifest['model']}")
+
+
+if __name__ == "__main__":
+    main()
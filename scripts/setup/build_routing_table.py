@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Genera la tabla de routing de las preguntas más frecuentes.
+
+Lee las preguntas de conversation_pairs, las agrupa por su forma normalizada
+y, para las top-N, precalcula los chunks con la misma búsqueda que usa
+RAGService (vectorial/híbrida + re-ranking si está activo, aquí sin límite de
+latencia). RAGService carga la tabla al arrancar (ROUTING_TABLE_PATH) y la
+ignora si los chunks indexados han cambiado desde que se generó: hay que
+volver a ejecutar este script después de actualizar el vector store.
+
+Uso:
+    python scripts/setup/build_routing_table.py --output data/routing_table.json
+"""
+
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from dotenv import load_dotenv
+from langchain.docstore.document import Document
+
+load_dotenv()
+
+from app.core.config import settings  # noqa: E402
+from app.services.analytics_service import analytics_service  # noqa: E402
+from app.services.embedding_cache import normalize_question  # noqa: E402
+from app.services.routing_table import (  # noqa: E402
+    collection_fingerprint,
+    write_routing_table,
+)
+
+
+async def load_frequent_questions(
+    top_n: int, min_count: int
+) -> Dict[str, Tuple[int, str]]:
+    """
+    Preguntas más frecuentes agrupadas por su forma normalizada.
+
+    get_top_questions agrupa por el texto literal; se piden más filas de las
+    necesarias para que las variantes ("¿Dónde vives?", "donde vives")
+    sumen en la misma clave.
+
+    Returns:
+        {pregunta normalizada: (frecuencia, variante literal más frecuente)}
+    """
+    rows = await analytics_service.get_top_questions(limit=top_n * 10)
+    counts: Counter = Counter()
+    variants: Dict[str, str] = {}
+    for row in rows:
+        key = normalize_question(row["question"])
+        if key:
+            counts[key] += row["count"]
+            # Filas ordenadas por frecuencia: la primera es la más usada
+            variants.setdefault(key, row["question"])
+
+    return {
+        key: (count, variants[key])
+        for key, count in counts.most_common(top_n)
+        if count >= min_count
+    }
+
+
+async def search_routes(
+    rag_service, questions: Dict[str, Tuple[int, str]]
+) -> Dict[str, Tuple[int, List[Document]]]:
+    """
+    Recuperar los chunks de cada pregunta con la búsqueda del servicio.
+
+    Returns:
+        {pregunta normalizada: (frecuencia, chunks)}
+    """
+    routes = {}
+    for key, (count, question) in questions.items():
+        documents = await rag_service._search_documents(question)
+        routes[key] = (count, documents)
+        print(f"   {count:>5}x  {question[:60]}  ->  {len(documents)} chunks")
+    return routes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Genera la tabla de routing")
+    parser.add_argument(
+        "--output",
+        default=settings.ROUTING_TABLE_PATH or "data/routing_table.json",
+        help="Fichero JSON de salida",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=settings.ROUTING_TABLE_TOP_N,
+        help="Número de preguntas a precalcular",
+    )
+    parser.add_argument(
+        "--min-count",
+        type=int,
+        default=settings.ROUTING_TABLE_MIN_COUNT,
+        help="Frecuencia mínima de una pregunta",
+    )
+    args = parser.parse_args()
+
+    print("🧭 Generando tabla de routing...\n")
+    questions = asyncio.run(load_frequent_questions(args.top, args.min_count))
+    if not questions:
+        print("⚠️ No hay preguntas con suficiente frecuencia en conversation_pairs")
+        sys.exit(1)
+    print(f"✓ {len(questions)} preguntas frecuentes\n")
+
+    # Misma configuración de búsqueda que el servicio, sin tabla previa
+    settings.ROUTING_TABLE_PATH = None
+    from app.services.rag_service import RAGService
+
+    rag_service = RAGService()
+    if rag_service.reranker is not None:
+        # Offline no hay presupuesto de latencia: con un timeout el primer
+        # forward pass (modelo en frío) guardaría el orden de recuperación
+        rag_service.reranker.timeout_ms = None
+    fingerprint = collection_fingerprint(rag_service._collection_documents())
+
+    routes = asyncio.run(search_routes(rag_service, questions))
+
+    write_routing_table(args.output, fingerprint, routes)
+    print(f"\n✅ Tabla de routing escrita en {args.output}")
+    print(f"   - Huella de la colección: {fingerprint[:12]}...")
+    print(
+        "   - Recargar en las instancias activas con "
+        "POST /api/v1/vector-index/refresh"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 Script para inicializar el vector store en pgvector con los chunks del portfolio.
-Ejecutar una sola vez para cargar la base de conocimientos.
+Es incremental: solo embebe los chunks nuevos o modificados y publica la nueva
+versión de la colección de forma atómica (ver app/services/knowledge_indexer.py).
 """
 import os
 import sys
@@ -9,12 +10,16 @@ from pathlib import Path
 
 # Añadir el directorio raíz al path para imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from dotenv import load_dotenv
 from langchain_community.vectorstores import PGVector
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.docstore.document import Document
 
+from app.services.embedding_pipeline import SentenceTransformerPipeline
+from app.services.knowledge_indexer import IncrementalIndexer
+
 # Importación opcional para evitar errores en producción
 # Intentar importar desde el mismo directorio primero
 load_and_prepare_chunks = None  # type: ignore
@@ -33,6 +38,13 @@ except ImportError:
         BUILD_KNOWLEDGE_BASE_AVAILABLE = False
         print("⚠️ build_knowledge_base no disponible - funcionando en modo limitado")
 
+COLLECTION_NAME = os.getenv("VECTOR_COLLECTION_NAME", "portfolio_knowledge")
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Pipeline de embeddings: textos por lote y procesos (ajustar a los cores del builder)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+
 
 def get_connection_string() -> str:
     """
@@ -93,15 +105,19 @@ def initialize_vector_store_script():
         return False
 
     # 3. Inicializar embeddings locales (100% gratis, sin APIs)
-    print("🔧 Configurando HuggingFace Embeddings (local)...")
+    print("🔧 Configurando pipeline de embeddings (sentence-transformers local)...")
     try:
-        # Usar modelo local de HuggingFace - no requiere API ni internet
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-            model_kwargs={"device": "cpu"},
-            encode_kwargs={"normalize_embeddings": True},
+        # Mismos vectores que HuggingFaceEmbeddings(normalize_embeddings=True),
+        # codificados por lotes y opcionalmente en varios procesos
+        embeddings = SentenceTransformerPipeline(
+            model_name=EMBEDDING_MODEL_NAME,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            workers=EMBEDDING_WORKERS,
+        )
+        print(
+            f"✓ Embeddings configurados (lote {EMBEDDING_BATCH_SIZE}, "
+            f"{EMBEDDING_WORKERS} procesos)\n"
         )
-        print("✓ Embeddings configurados (modelo local)\n")
     except Exception as e:
         print(f"❌ Error configurando embeddings: {e}")
         print("   Asegúrate de tener configuradas las credenciales de GCP")
@@ -116,37 +132,30 @@ def initialize_vector_store_script():
         print(f"❌ Error configurando conexión: {e}")
         return False
 
-    # 5. Crear vector store en pgvector
-    print("💾 Guardando chunks en pgvector...")
-    print(f"   Esto puede tardar varios minutos ({len(chunks)} chunks)...\n")
+    # 5. Sincronizar la colección (incremental, sin vaciar la colección publicada)
+    print("💾 Sincronizando chunks con pgvector...")
+    print("   Solo se embeben los chunks nuevos o modificados\n")
 
     try:
-        # Primero, intentar borrar la colección existente si existe
-        print("🧹 Eliminando vectores antiguos de la base de datos...")
-        try:
-            temp_store = PGVector(
-                connection_string=connection_string,
-                embedding_function=embeddings,
-                collection_name="portfolio_knowledge",
-            )
-            temp_store.delete_collection()
-            print("✓ Vectores antiguos eliminados\n")
-        except Exception as e:
-            # Si no existe la colección, es normal - continuar
-            print(f"   (No había vectores antiguos o error al limpiar: {e})\n")
-        
-        # Ahora crear el nuevo vector store con los chunks actualizados
-        print("📚 Guardando nuevos chunks en pgvector...\n")
-        vector_store = PGVector.from_documents(
-            documents=chunks,
-            embedding=embeddings,
+        indexer = IncrementalIndexer(
             connection_string=connection_string,
-            collection_name="portfolio_knowledge",
-            pre_delete_collection=False,  # Ya limpiamos manualmente arriba
+            collection_name=COLLECTION_NAME,
+            embeddings=embeddings,
         )
-        print(f"✅ Vector store inicializado exitosamente!")
-        print(f"   - {len(chunks)} chunks guardados")
-        print(f"   - Colección: portfolio_knowledge")
+        result = indexer.sync(chunks)
+        if result.swapped:
+            print(f"✅ Vector store publicado (versión {result.version})")
+        else:
+            print(f"✅ Vector store ya estaba al día (versión {result.version})")
+        print(f"   - {result.kept} chunks sin cambios")
+        print(f"   - {result.embedded} chunks embebidos")
+        if result.embedded:
+            print(
+                f"     ({result.chunks_per_second:.1f} chunks/s codificando, "
+                f"inserción y publicación en {result.insert_seconds:.2f}s)"
+            )
+        print(f"   - {result.removed} chunks eliminados")
+        print(f"   - Colección: {COLLECTION_NAME} ({result.elapsed_ms:.0f}ms)")
         print(f"   - Base de datos: {os.getenv('CLOUD_SQL_DB', 'chatbot_db')}\n")
 
         return True
@@ -169,7 +178,7 @@ def test_vector_store():
 
     try:
         embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+            model_name=EMBEDDING_MODEL_NAME,
             model_kwargs={"device": "cpu"},
             encode_kwargs={"normalize_embeddings": True},
         )
@@ -179,7 +188,7 @@ def test_vector_store():
         vector_store = PGVector(
             connection_string=connection_string,
             embedding_function=embeddings,
-            collection_name="portfolio_knowledge",
+            collection_name=COLLECTION_NAME,
         )
 
         # Consulta de prueba
@@ -270,27 +279,27 @@ async def initialize_vector_store(chunks: list[Document]) -> bool:
             return False
         
         # Configurar embeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+        embeddings = SentenceTransformerPipeline(
+            model_name=EMBEDDING_MODEL_NAME,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            workers=EMBEDDING_WORKERS,
         )
         
         # Obtener connection string
         connection_string = get_connection_string()
         
-        # Crear vector store
-        vector_store = PGVector(
+        # Sincronizar de forma incremental (publicación atómica de la nueva versión)
+        indexer = IncrementalIndexer(
             connection_string=connection_string,
-            embedding_function=embeddings,
-            collection_name="portfolio_chunks"
+            collection_name=COLLECTION_NAME,
+            embeddings=embeddings,
+        )
+        print(f"📚 Sincronizando {len(chunks)} chunks enriquecidos...")
+        result = indexer.sync(chunks)
+        print(
+            f"   {result.embedded} embebidos ({result.chunks_per_second:.1f} chunks/s), "
+            f"{result.kept} sin cambios, {result.removed} eliminados"
         )
-        
-        # Limpiar colección existente
-        print("🧹 Limpiando colección existente...")
-        vector_store.delete_collection()
-        
-        # Cargar chunks
-        print(f"📚 Cargando {len(chunks)} chunks enriquecidos...")
-        vector_store.add_documents(chunks)
         
         print("✅ Vector store inicializado exitosamente")
         return True
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+⏱️ BENCHMARKS - AI Resume Agent
+Micro-benchmarks de las rutas calientes que no necesitan base de datos ni LLM.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+# Añadir el directorio del proyecto al path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+# Evitar inicializar servicios con dependencias externas al importar la app
+os.environ.setdefault("TESTING", "true")
+
+from langchain.prompts import PromptTemplate
+
+from app.services.analytics_service import INTENT_PATTERNS, TECHNOLOGY_PATTERNS
+from app.services.lexical_index import BM25Index
+from app.services.prompt_registry import DEFAULT_SYSTEM_PROMPT, PromptRegistry
+from app.services.text_matching import CategoryMatcher
+
+sys.path.insert(0, str(project_root / "scripts" / "setup"))
+from build_knowledge_base import load_and_prepare_chunks  # noqa: E402
+
+PORTFOLIO_PATH = project_root / "data" / "portfolio.yaml"
+
+# Mensajes realistas (mezcla de español/inglés, con y sin coincidencias)
+SAMPLE_MESSAGES = [
+    "Hola, ¿qué experiencia tienes con Python y FastAPI?",
+    "What's your background with AWS, Kubernetes and Terraform?",
+    "¿Tienes disponibilidad para una nueva oportunidad de trabajo?",
+    "Cuéntame sobre tus estudios en la universidad y tu formación",
+    "Have you built RAG systems with LLM and PostgreSQL?",
+    "¿Qué proyecto te ha gustado más en tu última empresa?",
+    "Me interesa contratar a alguien con conocimientos de React y Node.js",
+    "hola",
+    "¿Cuántos años llevas programando? ¿Qué tecnologías dominas?",
+    "I'm looking for someone with deep learning and machine learning experience "
+    "who has deployed models on GCP using Docker and a CI/CD pipeline with Jenkins",
+]
+
+
+def legacy_detect(
+    message: str, tables: Dict[str, Dict[str, List[str]]]
+) -> Dict[str, List[str]]:
+    """Implementación anterior: re.search por patrón y categoría, sin compilar."""
+    message_lower = message.lower()
+    result = {}
+    for table, categories in tables.items():
+        detected = []
+        for category, patterns in categories.items():
+            for pattern in patterns:
+                if re.search(pattern, message_lower, re.IGNORECASE):
+                    detected.append(category)
+                    break
+        result[table] = detected
+    return result
+
+
+def run_timed(name: str, func: Callable[[], object], number: int, repeat: int) -> float:
+    """Ejecutar func y devolver el mejor tiempo por llamada en microsegundos."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    micros = best * 1_000_000
+    print(f"  {name:<28} {micros:>10.2f} µs/iteración")
+    return micros
+
+
+def benchmark_category_matcher(messages: Sequence[str], number: int, repeat: int) -> None:
+    """Comparar la detección de categorías anterior con el CategoryMatcher."""
+    print("\n🔍 Detección de tecnologías e intenciones")
+    tables = {"technologies": TECHNOLOGY_PATTERNS, "intents": INTENT_PATTERNS}
+    matcher = CategoryMatcher(tables)
+
+    mismatches = [
+        m for m in messages if legacy_detect(m, tables) != matcher.match(m)
+    ]
+    if mismatches:
+        print(f"❌ Resultados distintos en {len(mismatches)} mensajes:")
+        for message in mismatches:
+            print(f"   - {message}")
+        sys.exit(1)
+    print(
+        f"  ✓ Mismos resultados en {len(messages)} mensajes "
+        f"({matcher.pattern_count} patrones compilados)"
+    )
+
+    legacy = run_timed(
+        "re.search por patrón",
+        lambda: [legacy_detect(m, tables) for m in messages],
+        number,
+        repeat,
+    )
+    compiled = run_timed(
+        "CategoryMatcher",
+        lambda: [matcher.match(m) for m in messages],
+        number,
+        repeat,
+    )
+    print(f"  ⚡ Speedup: x{legacy / compiled:.1f}")
+
+
+def benchmark_system_prompt(number: int, repeat: int) -> None:
+    """Comparar la construcción del PromptTemplate por request con el registro."""
+    print("\n📝 System prompt por request")
+    registry = PromptRegistry()
+    context = "\n\n".join(SAMPLE_MESSAGES * 5)
+    question = SAMPLE_MESSAGES[0]
+
+    def legacy() -> str:
+        template = PromptTemplate(
+            template=DEFAULT_SYSTEM_PROMPT, input_variables=["context", "question"]
+        )
+        return template.format(context=context, question=question)
+
+    def compiled() -> str:
+        return registry.get("recruiter").format(context=context, question=question)
+
+    if legacy() != compiled():
+        print("❌ El prompt del registro no coincide con el de PromptTemplate")
+        sys.exit(1)
+    print(f"  ✓ Mismo prompt ({len(compiled())} caracteres)")
+
+    legacy_time = run_timed("PromptTemplate + format", legacy, number, repeat)
+    compiled_time = run_timed("PromptRegistry.get + format", compiled, number, repeat)
+    print(
+        f"  ⚡ Ahorro por request: {legacy_time - compiled_time:.2f} µs "
+        f"(x{legacy_time / compiled_time:.1f})"
+    )
+
+
+def benchmark_bm25(messages: Sequence[str], number: int, repeat: int) -> None:
+    """Medir la consulta al índice BM25 sobre los chunks reales del portfolio."""
+    print("\n📚 Búsqueda léxica BM25 (chunks de build_knowledge_base.py)")
+    with contextlib.redirect_stdout(io.StringIO()):
+        chunks = load_and_prepare_chunks(str(PORTFOLIO_PATH))
+
+    index = BM25Index()
+    index.build(chunks)
+    print(f"  ✓ {index.size} chunks indexados en {index.last_build_ms}ms")
+
+    total = run_timed(
+        f"BM25 top-20 x{len(messages)}",
+        lambda: [index.search(m, k=20) for m in messages],
+        number,
+        repeat,
+    )
+    print(f"  ⚡ {total / len(messages):.2f} µs por consulta")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks del backend")
+    parser.add_argument(
+        "--number", type=int, default=2000, help="Iteraciones por medición"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Mediciones (se toma la mejor)"
+    )
+    args = parser.parse_args()
+
+    print("⏱️ Benchmarks - AI Resume Agent")
+    benchmark_category_matcher(SAMPLE_MESSAGES, args.number, args.repeat)
+    benchmark_system_prompt(args.number, args.repeat)
+    benchmark_bm25(SAMPLE_MESSAGES, args.number, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ except ImportError:
     # dotenv es opcional, continuar sin él
     pass
 
+from app.services.cache_backends import InMemoryCacheBackend
 from app.services.rag_service import RAGService
 from app.core.config import settings
 
@@ -47,13 +48,19 @@ class ComprehensiveTester:
             self.rag_service = RAGService()
             
             # Desactivar cache explícitamente para testing
-            self.rag_service.response_cache.clear()
+            # (cache local nueva: no vaciar la cache compartida entre instancias)
+            self.rag_service.response_cache = InMemoryCacheBackend(
+                max_size=settings.MAX_CACHE_SIZE,
+                ttl_seconds=settings.CACHE_TTL_MINUTES * 60,
+            )
+            if self.rag_service.semantic_cache is not None:
+                self.rag_service.semantic_cache.clear()
             self.rag_service.cache_hits = 0
             self.rag_service.cache_misses = 0
             print("✓ Cache desactivado para testing")
             
             # Obtener configuración del prompt y LLM
-            self.prompt_template = self.rag_service._create_system_prompt()
+            self.prompt_template = self.rag_service.prompt_registry.get()
             self.llm_params = {
                 "temperature": settings.GEMINI_TEMPERATURE,
                 "top_p": settings.GEMINI_TOP_P,
@@ -98,11 +105,8 @@ class ComprehensiveTester:
                 user_type="IT"
             )
             
-            # Obtener contexto y vectores
-            retriever = self.rag_service.vector_store.as_retriever(
-                search_kwargs={"k": settings.VECTOR_SEARCH_K}
-            )
-            docs = retriever.get_relevant_documents(question)
+            # Obtener contexto con el mismo backend de retrieval que el servicio
+            docs = self.rag_service._retrieve_documents(question)
             
             # Extraer información
             response = result.get("response", "")
@@ -0,0 +1,9 @@
+"""
+Configuración común de los tests.
+Los servicios se importan en modo testing: sin conexiones a la base de datos
+ni carga de modelos.
+"""
+
+import os
+
+os.environ.setdefault("TESTING", "true")
@@ -0,0 +1,215 @@
+"""
+Tests del writer diferido de analytics (cola, batches, reintento y fallback)
+"""
+
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.services.analytics_service import AnalyticsService
+
+
+class FakeSession:
+    """Sesión asíncrona falsa que registra las escrituras confirmadas."""
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, params=None):
+        if self.db.failures:
+            self.db.failures -= 1
+            raise OperationalError("INSERT", {}, Exception("conexión perdida"))
+        rows = params or []
+        if any(row["session_id"] in self.db.bad_sessions for row in rows):
+            raise OperationalError("INSERT", {}, Exception("fila inválida"))
+        self.pending.extend(row["session_id"] for row in rows)
+
+    async def commit(self):
+        self.db.transactions += 1
+        self.db.written.extend(self.pending)
+
+    async def rollback(self):
+        self.pending = []
+
+
+class FakeDatabase:
+    """Factoría de sesiones falsas con fallos configurables."""
+
+    def __init__(self, failures=0, bad_sessions=()):
+        self.failures = failures
+        self.bad_sessions = set(bad_sessions)
+        self.transactions = 0
+        self.written = []
+
+    async def get_session(self):
+        return FakeSession(self)
+
+
+def metrics(session_id):
+    return ("message_metrics", {"session_id": session_id, "message_count": 1})
+
+
+def make_service(db=None, queue_size=10):
+    service = AnalyticsService()
+    service._write_queue = asyncio.Queue(maxsize=queue_size)
+    if db is not None:
+        service.get_session = db.get_session
+    return service
+
+
+class TestEnqueue:
+    """Tests de la cola acotada con backpressure"""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_until_full(self):
+        """Con hueco en la cola la escritura se encola sin esperar"""
+        service = make_service(queue_size=2)
+
+        assert await service._enqueue(*metrics("s1"))
+        assert await service._enqueue(*metrics("s2"))
+        assert service.writer_stats["enqueued"] == 2
+        assert service.writer_stats["backpressure_waits"] == 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_after_timeout(self, monkeypatch):
+        """Con la cola llena se espera un tiempo acotado y se descarta"""
+        monkeypatch.setattr(settings, "ANALYTICS_ENQUEUE_TIMEOUT_SECONDS", 0.01)
+        service = make_service(queue_size=1)
+        await service._enqueue(*metrics("s1"))
+
+        assert not await service._enqueue(*metrics("s2"))
+        assert service.writer_stats["backpressure_waits"] == 1
+        assert service.writer_stats["dropped"] == 1
+        assert service._write_queue.qsize() == 1
+
+    @pytest.mark.asyncio
+    async def test_full_queue_waits_for_free_slot(self, monkeypatch):
+        """Si el writer libera hueco a tiempo la escritura no se pierde"""
+        monkeypatch.setattr(settings, "ANALYTICS_ENQUEUE_TIMEOUT_SECONDS", 1.0)
+        service = make_service(queue_size=1)
+        await service._enqueue(*metrics("s1"))
+
+        waiting = asyncio.create_task(service._enqueue(*metrics("s2")))
+        await asyncio.sleep(0)
+        service._write_queue.get_nowait()
+
+        assert await waiting
+        assert service.writer_stats["backpressure_waits"] == 1
+        assert service.writer_stats["dropped"] == 0
+
+
+class TestCollectBatch:
+    """Tests de la agrupación por tamaño y por tiempo"""
+
+    @pytest.mark.asyncio
+    async def test_batch_limited_by_size(self, monkeypatch):
+        """Un batch no supera ANALYTICS_BATCH_SIZE escrituras"""
+        monkeypatch.setattr(settings, "ANALYTICS_BATCH_SIZE", 2)
+        service = make_service()
+        for sid in ("s1", "s2", "s3"):
+            await service._enqueue(*metrics(sid))
+
+        batch = await service._collect_batch()
+
+        assert [payload["session_id"] for _, payload in batch] == ["s1", "s2"]
+        assert service._write_queue.qsize() == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_closed_by_flush_interval(self, monkeypatch):
+        """Pasado el intervalo de flush se vuelca lo recogido aunque sea poco"""
+        monkeypatch.setattr(settings, "ANALYTICS_FLUSH_INTERVAL_SECONDS", 0.01)
+        service = make_service()
+        await service._enqueue(*metrics("s1"))
+
+        assert len(await service._collect_batch()) == 1
+        assert await service._collect_batch() == []
+
+    @pytest.mark.asyncio
+    async def test_stopping_drains_without_waiting(self, monkeypatch):
+        """Durante el cierre se drena la cola sin esperar al intervalo"""
+        monkeypatch.setattr(settings, "ANALYTICS_FLUSH_INTERVAL_SECONDS", 60)
+        service = make_service()
+        await service._enqueue(*metrics("s1"))
+        service._writer_stopping = True
+
+        batch = await asyncio.wait_for(service._collect_batch(), timeout=1)
+
+        assert len(batch) == 1
+
+
+class TestFlushBatch:
+    """Tests del volcado en bloque, el reintento y el fallback fila a fila"""
+
+    @pytest.mark.asyncio
+    async def test_batch_written_in_one_transaction(self):
+        """Un batch sano se escribe en una sola transacción"""
+        db = FakeDatabase()
+        service = make_service(db)
+
+        await service._flush_batch([metrics("s1"), metrics("s2")])
+
+        assert db.transactions == 1
+        assert db.written == ["s1", "s2"]
+        assert service.writer_stats["written"] == 2
+        assert service.writer_stats["row_fallbacks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_transient_error_retried_once(self):
+        """Un error transitorio se resuelve con un único reintento del batch"""
+        db = FakeDatabase(failures=1)
+        service = make_service(db)
+
+        await service._flush_batch([metrics("s1"), metrics("s2")])
+
+        assert db.written == ["s1", "s2"]
+        assert service.writer_stats["written"] == 2
+        assert service.writer_stats["row_fallbacks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_invalid_row_falls_back_to_per_row_writes(self):
+        """Una fila inválida no descarta el resto del batch"""
+        db = FakeDatabase(bad_sessions={"bad"})
+        service = make_service(db)
+
+        await service._flush_batch([metrics("s1"), metrics("bad"), metrics("s2")])
+
+        assert db.written == ["s1", "s2"]
+        assert service.writer_stats["row_fallbacks"] == 1
+        assert service.writer_stats["written"] == 2
+        assert service.writer_stats["failed"] == 1
+        assert service.writer_stats["batches"] == 1
+
+
+class TestDailyRollups:
+    """Tests del buffer de deltas de daily_analytics"""
+
+    @pytest.mark.asyncio
+    async def test_engagement_sum_buffered_per_day(self, monkeypatch):
+        """La variación de engagement se acumula en el día indicado"""
+        service = make_service()
+        service._writer_running = lambda: True
+        monkeypatch.setattr(settings, "TESTING", False)
+        monkeypatch.setattr(settings, "ENABLE_DAILY_ROLLUPS", True)
+        yesterday = date.today() - timedelta(days=1)
+
+        await service._record_daily({"total_sessions": 1, "engagement_sum": 0.1})
+        await service._record_daily({"engagement_sum": 0.2}, day=yesterday)
+        await service._record_daily({"engagement_sum": 0.05}, day=yesterday)
+
+        today_delta = service._pending_rollups[date.today()]
+        assert today_delta["total_sessions"] == 1
+        assert today_delta["engagement_sum"] == pytest.approx(0.1)
+        assert service._pending_rollups[yesterday]["engagement_sum"] == (
+            pytest.approx(0.25)
+        )
+        assert service._pending_rollups[yesterday]["total_sessions"] == 0
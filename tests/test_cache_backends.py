@@ -0,0 +1,71 @@
+"""
+Tests del backend de cache de respuestas en memoria (InMemoryCacheBackend)
+"""
+
+import pytest
+
+from app.services import cache_backends
+from app.services.cache_backends import InMemoryCacheBackend, hash_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_backends.time, "monotonic", lambda: now[0])
+    return now
+
+
+def answer(text):
+    return {"response": text, "sources": [{"title": "CV"}]}
+
+
+class TestHashCacheKey:
+    """Tests de las claves de la cache compartida"""
+
+    def test_fixed_length_digest(self):
+        """Las claves largas se reducen a 64 caracteres hexadecimales"""
+        key = hash_cache_key("client:" + "pregunta " * 200)
+
+        assert len(key) == 64
+        assert key == hash_cache_key("client:" + "pregunta " * 200)
+        assert key != hash_cache_key("recruiter:" + "pregunta " * 200)
+
+
+class TestInMemoryCacheBackend:
+    """Tests de copias, TTL y LRU de la cache local"""
+
+    @pytest.mark.asyncio
+    async def test_returns_independent_copies(self, clock):
+        """Mutar la respuesta devuelta (o la guardada) no altera la cache"""
+        cache = InMemoryCacheBackend(max_size=10, ttl_seconds=60)
+        original = answer("Python")
+        await cache.set("k", original)
+        original["sources"].append({"title": "mutado"})
+
+        cached = await cache.get("k")
+        cached["sources"].clear()
+
+        assert await cache.get("k") == answer("Python")
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_are_removed(self, clock):
+        """Pasado el TTL la respuesta deja de servirse"""
+        cache = InMemoryCacheBackend(max_size=10, ttl_seconds=60)
+        await cache.set("k", answer("Python"))
+        clock[0] += 60
+
+        assert await cache.get("k") is None
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self, clock):
+        """Al superar max_size se expulsa la respuesta menos usada"""
+        cache = InMemoryCacheBackend(max_size=2, ttl_seconds=60)
+        await cache.set("a", answer("a"))
+        await cache.set("b", answer("b"))
+        await cache.get("a")  # "b" pasa a ser la menos usada
+        await cache.set("c", answer("c"))
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == answer("a")
+        assert await cache.get("c") == answer("c")
@@ -0,0 +1,151 @@
+"""
+Tests del ensamblado del contexto con presupuesto de tokens (ContextAssembler)
+"""
+
+from langchain.docstore.document import Document
+
+from app.services.context_assembler import (
+    CHARS_PER_TOKEN,
+    CHUNK_SEPARATOR,
+    ContextAssembler,
+    estimate_tokens,
+)
+from app.services.conversation_store import ConversationHistory
+
+
+def doc(content, **metadata):
+    return Document(page_content=content, metadata=metadata)
+
+
+def history_with(*turns, window_size=5):
+    history = ConversationHistory(window_size)
+    for question, answer in turns:
+        history.append(question, answer)
+    return history
+
+
+class TestEstimateTokens:
+    """Tests de la estimación de tokens"""
+
+    def test_rounds_up(self):
+        """Se redondea hacia arriba a partir de CHARS_PER_TOKEN caracteres"""
+        assert CHARS_PER_TOKEN == 4.0
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("abcd") == 1
+        assert estimate_tokens("abcde") == 2
+
+
+class TestContextAssembler:
+    """Tests del reparto del presupuesto entre chunks e historial"""
+
+    def test_everything_fits(self):
+        """Con presupuesto suficiente entran todos los chunks en orden"""
+        assembler = ContextAssembler(max_prompt_tokens=100, max_history_tokens=20)
+        docs = [doc("a" * 40), doc("b" * 40)]
+
+        assembled = assembler.assemble(docs, history_with(), fixed_chars=0)
+
+        assert assembled.context == "a" * 40 + CHUNK_SEPARATOR + "b" * 40
+        assert assembled.documents == docs
+        assert assembled.dropped_documents == []
+        assert not assembled.truncated
+
+    def test_skips_chunk_that_does_not_fit(self):
+        """Un chunk que no cabe se descarta y se prueba con el siguiente"""
+        # 50 tokens = 200 caracteres
+        assembler = ContextAssembler(max_prompt_tokens=50, max_history_tokens=0)
+        first, too_big, small = doc("a" * 150), doc("b" * 100), doc("c" * 40)
+
+        assembled = assembler.assemble(
+            [first, too_big, small], history_with(), fixed_chars=0
+        )
+
+        assert assembled.documents == [first, small]
+        assert assembled.dropped_documents == [too_big]
+        assert not assembled.truncated
+
+    def test_separator_counts_against_budget(self):
+        """El separador entre chunks también consume presupuesto"""
+        # 200 caracteres: 100 + (2 + 98) = 200, pero 100 + (2 + 99) no cabe
+        assembler = ContextAssembler(max_prompt_tokens=50, max_history_tokens=0)
+        fits = assembler.assemble(
+            [doc("a" * 100), doc("b" * 98)], history_with(), fixed_chars=0
+        )
+        overflows = assembler.assemble(
+            [doc("a" * 100), doc("b" * 99)], history_with(), fixed_chars=0
+        )
+        assert len(fits.documents) == 2
+        assert len(overflows.documents) == 1
+
+    def test_truncates_best_chunk_when_none_fits(self):
+        """Si no cabe ningún chunk se trunca el mejor rankeado"""
+        # 10 tokens = 40 caracteres
+        assembler = ContextAssembler(max_prompt_tokens=10, max_history_tokens=0)
+        best, other = doc("a" * 100, id="best"), doc("b" * 80, id="other")
+
+        assembled = assembler.assemble([best, other], history_with(), fixed_chars=0)
+
+        assert assembled.truncated
+        assert assembled.context == "a" * 40
+        assert assembled.documents[0].metadata == {"id": "best"}
+        assert assembled.dropped_documents == [other]
+
+    def test_fixed_text_is_discounted_first(self):
+        """El texto fijo (system prompt, pregunta) se descuenta del presupuesto"""
+        # 50 tokens - 30 fijos = 20 tokens = 80 caracteres
+        assembler = ContextAssembler(max_prompt_tokens=50, max_history_tokens=0)
+        assembled = assembler.assemble(
+            [doc("a" * 100)], history_with(), fixed_chars=120
+        )
+        assert assembled.truncated
+        assert len(assembled.context) == 80
+
+    def test_no_budget_left(self):
+        """Sin presupuesto no entra nada, ni truncado"""
+        assembler = ContextAssembler(max_prompt_tokens=10, max_history_tokens=10)
+        docs = [doc("a" * 10)]
+
+        assembled = assembler.assemble(
+            docs, history_with(("hola", "qué tal")), fixed_chars=1000
+        )
+
+        assert assembled.context == ""
+        assert assembled.documents == []
+        assert assembled.dropped_documents == docs
+        assert not assembled.truncated
+        assert assembled.history_text == ""
+        assert assembled.dropped_turns == 1
+
+    def test_history_keeps_most_recent_whole_turns(self):
+        """El historial se recorta por turnos enteros, empezando por el más antiguo"""
+        turns = [("q1", "a1"), ("q2", "a2"), ("q3", "a3")]
+        turn_chars = len(ConversationHistory.render_turn("q1", "a1"))
+        # Presupuesto para dos turnos y no para tres
+        history_tokens = -(-2 * turn_chars // int(CHARS_PER_TOKEN))
+        assert history_tokens * CHARS_PER_TOKEN < 3 * turn_chars
+        assembler = ContextAssembler(
+            max_prompt_tokens=1000, max_history_tokens=history_tokens
+        )
+
+        assembled = assembler.assemble([], history_with(*turns), fixed_chars=0)
+
+        assert assembled.history_turns == 2
+        assert assembled.dropped_turns == 1
+        assert assembled.history_text == (
+            ConversationHistory.render_turn("q2", "a2")
+            + ConversationHistory.render_turn("q3", "a3")
+        )
+
+    def test_history_reduces_chunk_budget(self):
+        """Los tokens del historial se descuentan antes de empaquetar chunks"""
+        history = history_with(("q" * 30, "a" * 30))
+        history_chars = len(history.history_text)
+        assembler = ContextAssembler(max_prompt_tokens=50, max_history_tokens=50)
+
+        assembled = assembler.assemble([doc("x" * 200)], history, fixed_chars=0)
+
+        assert assembled.history_turns == 1
+        assert assembled.truncated
+        expected = int((50 - estimate_tokens(history.history_text)) * CHARS_PER_TOKEN)
+        assert len(assembled.context) == expected
+        assert len(assembled.context) + history_chars <= 50 * CHARS_PER_TOKEN
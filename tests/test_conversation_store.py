@@ -0,0 +1,213 @@
+"""
+Tests de la memoria conversacional acotada (ConversationHistory y
+ConversationMemoryStore)
+"""
+
+import pytest
+
+from app.services import conversation_store
+from app.services.conversation_store import (
+    ConversationHistory,
+    ConversationMemoryStore,
+)
+
+render = ConversationHistory.render_turn
+
+
+class FakeClock:
+    """Reloj monotónico controlable para las expulsiones por inactividad."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(conversation_store.time, "monotonic", fake)
+    return fake
+
+
+def make_store(**overrides):
+    options = {
+        "window_size": 3,
+        "max_sessions": 10,
+        "max_bytes": 1024 * 1024,
+        "idle_ttl_seconds": 60,
+    }
+    options.update(overrides)
+    return ConversationMemoryStore(**options)
+
+
+class TestConversationHistory:
+    """Tests del historial compacto de una sesión"""
+
+    def test_window_drops_oldest_turn(self):
+        """Al llenar la ventana se descarta el turno más antiguo"""
+        history = ConversationHistory(window_size=2)
+        for i in range(3):
+            history.append(f"q{i}", f"a{i}")
+
+        assert len(history) == 2
+        assert history.history_text == render("q1", "a1") + render("q2", "a2")
+
+    def test_recent_returns_everything_within_budget(self):
+        """Si todo cabe se devuelve el historial completo"""
+        history = ConversationHistory(window_size=3)
+        history.append("q1", "a1")
+        history.append("q2", "a2")
+
+        assert history.recent(10_000) == (history.history_text, 2)
+
+    def test_recent_trims_whole_turns(self):
+        """Los turnos antiguos se descartan enteros, nunca a medias"""
+        history = ConversationHistory(window_size=3)
+        history.append("q1", "a1")
+        history.append("q2", "respuesta más larga")
+        history.append("q3", "a3")
+        last_two = render("q2", "respuesta más larga") + render("q3", "a3")
+
+        text, turns = history.recent(len(last_two) + 5)
+
+        assert (text, turns) == (last_two, 2)
+
+    def test_recent_truncates_latest_turn_if_nothing_fits(self):
+        """Si ni el último turno cabe, se trunca con una elipsis"""
+        history = ConversationHistory(window_size=3)
+        history.append("q1", "a1")
+        history.append("pregunta", "respuesta muy larga")
+
+        text, turns = history.recent(10)
+
+        assert turns == 1
+        assert len(text) == 10
+        assert text == render("pregunta", "respuesta muy larga")[:9] + "…"
+
+    def test_recent_without_budget(self):
+        """Sin presupuesto no se devuelve historial"""
+        history = ConversationHistory(window_size=3)
+        history.append("q1", "a1")
+
+        assert history.recent(0) == ("", 0)
+
+    def test_size_tracks_rendered_text(self):
+        """El tamaño estimado crece con el texto y se recalcula al descartar"""
+        history = ConversationHistory(window_size=1)
+        empty_size = history.size_bytes
+        history.append("q", "a" * 100)
+        big_size = history.size_bytes
+        history.append("q", "a")
+
+        assert empty_size < history.size_bytes < big_size
+
+
+class TestConversationMemoryStore:
+    """Tests de los límites y expulsiones del almacén"""
+
+    def test_get_or_create_reuses_history(self, clock):
+        """La misma sesión devuelve el mismo historial"""
+        store = make_store()
+        history = store.get_or_create("s1")
+
+        assert store.get_or_create("s1") is history
+        assert store.created == 1
+
+    def test_lru_eviction(self, clock):
+        """Al superar max_sessions se expulsa la menos usada"""
+        store = make_store(max_sessions=2)
+        store.get_or_create("s1")
+        store.get_or_create("s2")
+        store.get_or_create("s1")  # s2 pasa a ser la menos usada
+        store.get_or_create("s3")
+
+        assert "s1" in store and "s3" in store
+        assert "s2" not in store
+        assert store.evictions["lru"] == 1
+
+    def test_bytes_eviction_keeps_current_session(self, clock):
+        """El límite de bytes expulsa las antiguas, nunca la sesión en uso"""
+        store = make_store(max_bytes=3000)
+        store.record_turn("s1", "q", "a" * 1000)
+        store.record_turn("s2", "q", "b" * 1000)
+        store.record_turn("s3", "q", "c" * 5000)
+
+        assert list(store._entries) == ["s3"]
+        assert store.evictions["bytes"] == 2
+
+    def test_idle_session_starts_empty(self, clock):
+        """Una sesión inactiva más de idle_ttl se recrea vacía"""
+        store = make_store(idle_ttl_seconds=60)
+        store.record_turn("s1", "q", "a")
+        clock.now += 61
+
+        assert len(store.get_or_create("s1")) == 0
+        assert store.evictions["idle"] == 1
+
+    def test_sweep_removes_only_idle_sessions(self, clock):
+        """El barrido expulsa solo las sesiones inactivas"""
+        store = make_store(idle_ttl_seconds=60)
+        store.get_or_create("old")
+        clock.now += 45
+        store.get_or_create("recent")
+        clock.now += 30
+
+        assert store.sweep() == 1
+        assert "recent" in store and "old" not in store
+
+    def test_record_turn_respects_window(self, clock):
+        """record_turn guarda como mucho window_size turnos por sesión"""
+        store = make_store(window_size=2)
+        for i in range(4):
+            store.record_turn("s1", f"q{i}", f"a{i}")
+
+        history = store.get_or_create("s1")
+        assert history.history_text == render("q2", "a2") + render("q3", "a3")
+
+
+class TestHydration:
+    """Tests de la hidratación desde los turnos persistidos"""
+
+    @pytest.mark.asyncio
+    async def test_hydrates_missing_session(self, clock):
+        """Una sesión que no está en memoria se carga con el loader"""
+        calls = []
+
+        async def loader(session_id, limit, max_idle_seconds):
+            calls.append((session_id, limit, max_idle_seconds))
+            return [("q1", "a1"), ("q2", "a2")]
+
+        store = make_store(window_size=3, idle_ttl_seconds=60, loader=loader)
+        history = await store.get_or_hydrate("s1")
+
+        assert calls == [("s1", 3, 60)]
+        assert history.history_text == render("q1", "a1") + render("q2", "a2")
+        assert store.hydrated == 1
+
+    @pytest.mark.asyncio
+    async def test_sessions_in_memory_are_not_loaded(self, clock):
+        """Si la sesión ya está en memoria no se consulta el loader"""
+
+        async def loader(session_id, limit, max_idle_seconds):
+            raise AssertionError("no debería llamarse")
+
+        store = make_store(loader=loader)
+        store.record_turn("s1", "q", "a")
+
+        assert len(await store.get_or_hydrate("s1")) == 1
+
+    @pytest.mark.asyncio
+    async def test_loader_failure_returns_empty_history(self, clock):
+        """Si la carga falla se continúa con un historial vacío"""
+
+        async def loader(session_id, limit, max_idle_seconds):
+            raise RuntimeError("BD no disponible")
+
+        store = make_store(loader=loader)
+        history = await store.get_or_hydrate("s1")
+
+        assert len(history) == 0
+        assert store.hydration_errors == 1
+        assert "s1" in store
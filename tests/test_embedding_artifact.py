@@ -0,0 +1,125 @@
+"""
+Tests del artefacto de embeddings precalculados (write_artifact / load_artifact)
+"""
+
+import os
+
+import numpy as np
+import pytest
+from langchain.docstore.document import Document
+
+from app.services.embedding_artifact import (
+    CHUNKS_FILE,
+    EMBEDDINGS_FILE,
+    MANIFEST_FILE,
+    load_artifact,
+    write_artifact,
+)
+from app.services.vector_index import InMemoryVectorIndex
+
+MODEL = "modelo-test"
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    """Artefacto escrito con una matriz aleatoria normalizada."""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(6, 4)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    documents = [
+        Document(page_content=f"chunk {i}", metadata={"source": "cv.yaml", "n": i})
+        for i in range(6)
+    ]
+    directory = str(tmp_path / "artifact")
+    manifest = write_artifact(directory, documents, vectors, MODEL)
+    return directory, documents, vectors, manifest
+
+
+class TestRoundTrip:
+    """Tests de escritura y lectura del artefacto"""
+
+    def test_round_trip(self, artifact):
+        """Se recuperan la misma matriz, los mismos chunks y el manifest"""
+        directory, documents, vectors, manifest = artifact
+
+        matrix, loaded, loaded_manifest = load_artifact(directory, MODEL)
+
+        np.testing.assert_array_equal(matrix, vectors)
+        assert [d.page_content for d in loaded] == [d.page_content for d in documents]
+        assert [d.metadata for d in loaded] == [d.metadata for d in documents]
+        assert loaded_manifest == manifest
+        assert manifest["count"] == 6 and manifest["dimensions"] == 4
+
+    def test_matrix_is_memory_mapped(self, artifact):
+        """La matriz se mapea en memoria en solo lectura"""
+        matrix, _, _ = load_artifact(artifact[0], MODEL)
+
+        assert isinstance(matrix, np.memmap)
+        assert not matrix.flags.writeable
+
+    def test_float16_artifact(self, tmp_path, artifact):
+        """Con float16 el artefacto ocupa la mitad y mantiene los vectores"""
+        _, documents, vectors, _ = artifact
+        directory = str(tmp_path / "half")
+        write_artifact(directory, documents, vectors, MODEL, dtype="float16")
+
+        matrix, _, manifest = load_artifact(directory, MODEL)
+
+        assert manifest["dtype"] == "float16"
+        np.testing.assert_allclose(matrix, vectors, atol=1e-3)
+
+    def test_vector_index_loads_artifact(self, artifact):
+        """El índice en memoria sirve búsquedas desde el artefacto"""
+        directory, documents, vectors, manifest = artifact
+        index = InMemoryVectorIndex(None, "postgresql://test", "portfolio")
+
+        assert index.load_artifact(directory, MODEL) == 6
+
+        results = index.similarity_search_with_score_by_vector(vectors[3].tolist(), 1)
+        assert results[0][0].page_content == documents[3].page_content
+        assert index.source == "artifact"
+        assert index.artifact_version == manifest["version"]
+
+
+class TestValidation:
+    """Tests del rechazo de artefactos inválidos"""
+
+    def test_model_mismatch_rejected(self, artifact):
+        """Un artefacto de otro modelo no se carga"""
+        with pytest.raises(ValueError, match="otro-modelo"):
+            load_artifact(artifact[0], "otro-modelo")
+
+    @pytest.mark.parametrize("name", [EMBEDDINGS_FILE, CHUNKS_FILE])
+    def test_checksum_mismatch_rejected(self, artifact, name):
+        """Un fichero modificado tras el build se detecta por checksum"""
+        path = os.path.join(artifact[0], name)
+        with open(path, "ab") as f:
+            f.write(b"\n")
+
+        with pytest.raises(ValueError, match="Checksum"):
+            load_artifact(artifact[0], MODEL)
+
+    def test_missing_manifest_rejected(self, artifact):
+        """Un build interrumpido (sin manifest) no se carga"""
+        os.remove(os.path.join(artifact[0], MANIFEST_FILE))
+
+        with pytest.raises(FileNotFoundError):
+            load_artifact(artifact[0], MODEL)
+
+    def test_failed_load_keeps_index_snapshot(self, artifact):
+        """Si el artefacto es inválido el índice mantiene su snapshot"""
+        directory = artifact[0]
+        index = InMemoryVectorIndex(None, "postgresql://test", "portfolio")
+        index.load_artifact(directory, MODEL)
+
+        with pytest.raises(ValueError):
+            index.load_artifact(directory, "otro-modelo")
+
+        assert index.size == 6
+
+    def test_vector_count_must_match_chunks(self, tmp_path, artifact):
+        """No se escribe un artefacto con más vectores que chunks"""
+        _, documents, vectors, _ = artifact
+
+        with pytest.raises(ValueError):
+            write_artifact(str(tmp_path / "bad"), documents[:2], vectors, MODEL)
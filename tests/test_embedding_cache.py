@@ -0,0 +1,133 @@
+"""
+Tests de la cache de embeddings de consultas (CachedQueryEmbeddings)
+"""
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.services import embedding_cache
+from app.services.embedding_cache import CachedQueryEmbeddings, normalize_question
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeddings deterministas que cuentan las llamadas al modelo."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(base, **overrides):
+    options = {"model_name": "modelo", "max_size": 10, "ttl_seconds": 60}
+    options.update(overrides)
+    return CachedQueryEmbeddings(base, **options)
+
+
+class TestNormalizeQuestion:
+    """Tests de la normalización de preguntas"""
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "¿Qué experiencia tienes?",
+            "qué experiencia tienes",
+            "  QUÉ   experiencia\ttienes ?? ",
+        ],
+    )
+    def test_equivalent_questions_share_key(self, text):
+        """Mayúsculas, puntuación y espacios no cambian la clave"""
+        assert normalize_question(text) == "qué experiencia tienes"
+
+    def test_accents_are_kept(self):
+        """Los acentos se mantienen (cambian el significado)"""
+        assert normalize_question("Qué") != normalize_question("Que")
+
+
+class TestCachedQueryEmbeddings:
+    """Tests de TTL, LRU y persistencia de la cache"""
+
+    def test_repeated_question_hits_cache(self, clock):
+        """Una pregunta repetida (normalizada) no vuelve a llamar al modelo"""
+        base = CountingEmbeddings()
+        cache = make_cache(base)
+
+        first = cache.embed_query("¿Qué stack usas?")
+        second = cache.embed_query("qué stack usas")
+
+        assert first == second
+        assert base.calls == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_expired_entry_is_recomputed(self, clock):
+        """Pasado el TTL el embedding se recalcula"""
+        base = CountingEmbeddings()
+        cache = make_cache(base, ttl_seconds=60)
+        cache.embed_query("python")
+        clock[0] += 61
+
+        cache.embed_query("python")
+
+        assert base.calls == 2
+
+    def test_lru_eviction(self, clock):
+        """Al superar max_size se expulsa la pregunta menos usada"""
+        base = CountingEmbeddings()
+        cache = make_cache(base, max_size=2)
+        cache.embed_query("uno")
+        cache.embed_query("dos")
+        cache.embed_query("uno")  # "dos" pasa a ser la menos usada
+        cache.embed_query("tres")
+        base.calls = 0
+
+        cache.embed_query("uno")
+        cache.embed_query("dos")
+
+        assert base.calls == 1
+
+    def test_save_and_load_round_trip(self, clock, tmp_path):
+        """Las entradas vigentes sobreviven a un reinicio"""
+        path = str(tmp_path / "embeddings.json")
+        cache = make_cache(CountingEmbeddings(), persist_path=path)
+        vector = cache.embed_query("python")
+        assert cache.save()
+
+        base = CountingEmbeddings()
+        restored = make_cache(base, persist_path=path)
+
+        assert restored.get_stats()["size"] == 1
+        assert restored.embed_query("Python?") == vector
+        assert base.calls == 0
+
+    def test_load_skips_expired_entries(self, clock, tmp_path):
+        """Al cargar se descartan las entradas caducadas"""
+        path = str(tmp_path / "embeddings.json")
+        cache = make_cache(CountingEmbeddings(), persist_path=path)
+        cache.embed_query("python")
+        cache.save()
+        clock[0] += 61
+
+        assert make_cache(CountingEmbeddings(), persist_path=path).load() == 0
+
+    def test_load_ignores_other_model(self, clock, tmp_path):
+        """Una cache guardada con otro modelo no se reutiliza"""
+        path = str(tmp_path / "embeddings.json")
+        cache = make_cache(CountingEmbeddings(), persist_path=path)
+        cache.embed_query("python")
+        cache.save()
+
+        other = make_cache(CountingEmbeddings(), model_name="otro", persist_path=path)
+
+        assert other.get_stats()["size"] == 0
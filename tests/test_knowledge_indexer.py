@@ -0,0 +1,76 @@
+"""
+Tests del plan de indexado incremental (content_hash e IncrementalIndexer.plan)
+"""
+
+from langchain.docstore.document import Document
+
+from app.services.knowledge_indexer import IncrementalIndexer, content_hash
+
+
+def doc(content, **metadata):
+    return Document(page_content=content, metadata=metadata)
+
+
+def live(*documents):
+    """Filas publicadas: {hash: uuid} para los chunks dados."""
+    return {content_hash(d): f"uuid-{i}" for i, d in enumerate(documents)}
+
+
+class TestContentHash:
+    """Tests del hash de los chunks"""
+
+    def test_stable_and_key_order_independent(self):
+        """El hash no depende del orden de las claves de metadatos"""
+        first = Document(page_content="Python", metadata={"a": 1, "b": 2})
+        second = Document(page_content="Python", metadata={"b": 2, "a": 1})
+
+        assert content_hash(first) == content_hash(second)
+
+    def test_changes_with_content_or_metadata(self):
+        """Cambiar el texto o un metadato cambia el hash"""
+        base = content_hash(doc("Python", section="skills"))
+
+        assert content_hash(doc("Java", section="skills")) != base
+        assert content_hash(doc("Python", section="projects")) != base
+
+
+class TestPlan:
+    """Tests del cálculo de cambios frente a la colección publicada"""
+
+    def test_unchanged_collection(self):
+        """Si los chunks no cambian no hay nada que embeber"""
+        chunks = [doc("Python"), doc("Java")]
+
+        plan = IncrementalIndexer.plan(chunks, live(*chunks))
+
+        assert plan.unchanged
+        assert sorted(plan.keep) == ["uuid-0", "uuid-1"]
+
+    def test_new_and_modified_chunks_are_embedded(self):
+        """Solo se embeben los chunks nuevos o modificados"""
+        published = [doc("Python"), doc("Java", section="skills")]
+        current = [doc("Python"), doc("Java", section="projects"), doc("Go")]
+
+        plan = IncrementalIndexer.plan(current, live(*published))
+
+        assert plan.keep == ["uuid-0"]
+        assert [d.page_content for _, d in plan.embed] == ["Java", "Go"]
+        assert plan.embed[0][0] == content_hash(current[1])
+        assert plan.removed == 1
+
+    def test_removed_chunks_are_counted(self):
+        """Los chunks que desaparecen se cuentan como eliminados"""
+        published = [doc("Python"), doc("Java"), doc("Go")]
+
+        plan = IncrementalIndexer.plan([doc("Python")], live(*published))
+
+        assert plan.keep == ["uuid-0"]
+        assert plan.embed == []
+        assert plan.removed == 2
+        assert not plan.unchanged
+
+    def test_duplicate_chunks_embedded_once(self):
+        """Chunks idénticos se embeben una sola vez"""
+        plan = IncrementalIndexer.plan([doc("Python"), doc("Python")], {})
+
+        assert len(plan.embed) == 1
@@ -0,0 +1,156 @@
+"""
+Tests del índice léxico BM25 y de la fusión RRF
+"""
+
+from langchain.docstore.document import Document
+
+from app.services.lexical_index import (
+    BM25Index,
+    chunk_id,
+    document_key,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+
+def doc(content, **metadata):
+    return Document(page_content=content, metadata=metadata)
+
+
+def contents(documents):
+    return [d.page_content for d in documents]
+
+
+class TestTokenize:
+    """Tests de la normalización de términos"""
+
+    def test_folds_accents_and_case(self):
+        """Tildes y mayúsculas no cambian el término"""
+        assert tokenize("Formación") == tokenize("formacion") == ["formacion"]
+
+    def test_drops_stopwords_and_punctuation(self):
+        """Se descartan palabras vacías (es/en) y puntuación"""
+        assert tokenize("¿Dónde está la empresa?") == ["empresa"]
+        assert tokenize("What is your stack?") == ["stack"]
+
+    def test_keeps_digits_but_not_single_letters(self):
+        """Las letras sueltas se descartan, los dígitos no"""
+        assert tokenize("k 8 python 3") == ["8", "python", "3"]
+
+
+class TestBM25Index:
+    """Tests del ranking BM25"""
+
+    def build(self, *texts):
+        index = BM25Index()
+        index.build([doc(text, id=str(i)) for i, text in enumerate(texts)])
+        return index
+
+    def test_empty_index(self):
+        """Un índice vacío no devuelve resultados"""
+        assert BM25Index().search("python", k=5) == []
+
+    def test_only_matching_documents(self):
+        """Solo se devuelven chunks con algún término de la consulta"""
+        index = self.build("python fastapi", "java spring", "react vue")
+        results = index.search("python", k=5)
+        assert contents(d for d, _ in results) == ["python fastapi"]
+        assert results[0][1] > 0
+
+    def test_rare_terms_weigh_more(self):
+        """Un término raro (IDF alto) pesa más que uno frecuente"""
+        index = self.build(
+            "proyecto python",
+            "proyecto kubernetes",
+            "proyecto java",
+            "proyecto react",
+        )
+        results = index.search("proyecto kubernetes", k=4)
+        assert results[0][0].page_content == "proyecto kubernetes"
+        assert results[0][1] > results[1][1]
+
+    def test_shorter_documents_rank_higher(self):
+        """A igual frecuencia, el chunk más corto puntúa más (normalización)"""
+        index = self.build(
+            "terraform",
+            "terraform docker jenkins ansible helm grafana prometheus",
+            "java",
+        )
+        results = index.search("terraform", k=2)
+        assert contents(d for d, _ in results) == [
+            "terraform",
+            "terraform docker jenkins ansible helm grafana prometheus",
+        ]
+
+    def test_term_frequency_saturates(self):
+        """Repetir un término sube el score, pero menos que linealmente"""
+        index = self.build("python", "python python", "python python python java")
+        scores = {d.page_content: s for d, s in index.search("python", k=3)}
+        assert scores["python python"] > scores["python"]
+        assert scores["python python"] < 2 * scores["python"]
+
+    def test_k_limits_results(self):
+        """Se devuelven como mucho k chunks, ordenados por score"""
+        index = self.build("go", "go go", "go rust", "go go go")
+        results = index.search("go", k=2)
+        assert len(results) == 2
+        assert results[0][1] >= results[1][1]
+
+    def test_rebuild_replaces_snapshot(self):
+        """Reconstruir reemplaza el índice entero"""
+        index = self.build("python")
+        index.build([doc("java")])
+        assert index.size == 1
+        assert index.search("python", k=5) == []
+
+
+class TestReciprocalRankFusion:
+    """Tests de la fusión de rankings"""
+
+    def test_documents_in_both_rankings_win(self):
+        """Un chunk presente en ambos rankings supera a los que están en uno"""
+        vector = [doc("a"), doc("b"), doc("c")]
+        lexical = [doc("d"), doc("c"), doc("e")]
+        fused = reciprocal_rank_fusion([vector, lexical], k=3)
+        assert contents(fused) == ["c", "a", "d"]
+
+    def test_ties_keep_first_seen_order(self):
+        """A igual score se respeta el orden del primer ranking"""
+        fused = reciprocal_rank_fusion([[doc("a")], [doc("b")]], k=2)
+        assert contents(fused) == ["a", "b"]
+
+    def test_deduplicates_by_content(self):
+        """Instancias distintas con el mismo contenido son el mismo chunk"""
+        first = doc("python", source="vector")
+        fused = reciprocal_rank_fusion(
+            [[first, doc("java")], [doc("python", source="bm25")]], k=5
+        )
+        assert contents(fused) == ["python", "java"]
+        assert fused[0] is first
+
+    def test_rrf_scores(self):
+        """score(d) = Σ 1 / (rrf_k + posición)"""
+        # b: 1/(1+2) + 1/(1+1) = 0.83 > a: 1/(1+1) = 0.5
+        fused = reciprocal_rank_fusion(
+            [[doc("a"), doc("b")], [doc("b")]], k=2, rrf_k=1
+        )
+        assert contents(fused) == ["b", "a"]
+
+    def test_k_truncates(self):
+        """Se devuelven como mucho k chunks"""
+        fused = reciprocal_rank_fusion([[doc("a"), doc("b"), doc("c")]], k=2)
+        assert contents(fused) == ["a", "b"]
+
+
+class TestChunkIdentity:
+    """Tests de la identidad de los chunks"""
+
+    def test_chunk_id_depends_only_on_content(self):
+        """El id es estable y no depende de los metadatos"""
+        assert chunk_id(doc("python", id="1")) == chunk_id(doc("python", id="2"))
+        assert chunk_id(doc("python")) != chunk_id(doc("java"))
+        assert len(chunk_id(doc("python"))) == 16
+
+    def test_document_key_is_content(self):
+        """La clave de fusión es el contenido"""
+        assert document_key(doc("python", id="1")) == "python"
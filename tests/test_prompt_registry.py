@@ -0,0 +1,125 @@
+"""
+Tests de los system prompts precompilados (CompiledPrompt y PromptRegistry)
+"""
+
+import json
+import os
+
+import pytest
+
+from app.services.prompt_registry import (
+    DEFAULT_SYSTEM_PROMPT,
+    CompiledPrompt,
+    PromptRegistry,
+)
+
+TEMPLATE = "Hola {{equipo}}.\nCONTEXTO:\n{context}\nPREGUNTA: {question}\n"
+
+
+def write(path, content, mtime):
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+class TestCompiledPrompt:
+    """Tests del parseo y formateo de templates"""
+
+    def test_format_matches_str_format(self):
+        """format() produce lo mismo que str.format"""
+        prompt = CompiledPrompt.compile(TEMPLATE)
+        values = {"context": "Python y {llaves}", "question": "¿Qué stack?"}
+
+        assert prompt.format(**values) == TEMPLATE.format(**values)
+
+    def test_literal_length(self):
+        """literal_length cuenta solo el texto fijo (llaves escapadas incluidas)"""
+        prompt = CompiledPrompt.compile(TEMPLATE)
+
+        assert prompt.literal_length == len(prompt.format(context="", question=""))
+
+    def test_builtin_prompt_compiles(self):
+        """El prompt integrado es un template válido"""
+        prompt = CompiledPrompt.compile(DEFAULT_SYSTEM_PROMPT)
+
+        assert "PREGUNTA: ¿Quién eres?" in prompt.format(
+            context="", question="¿Quién eres?"
+        )
+
+    @pytest.mark.parametrize(
+        "template",
+        [
+            "Solo {context}",
+            "{context} {question} {extra}",
+            "{context!r} {question}",
+            "{context:>10} {question}",
+        ],
+    )
+    def test_invalid_templates_rejected(self, template):
+        """Campos distintos de context/question o con formato se rechazan"""
+        with pytest.raises(ValueError):
+            CompiledPrompt.compile(template)
+
+
+class TestPromptRegistry:
+    """Tests de las fuentes y la recarga en caliente"""
+
+    def test_builtin_prompt_without_source(self):
+        """Sin fichero se usa el prompt integrado para todos los tipos"""
+        registry = PromptRegistry()
+
+        assert registry.get("recruiter").template == DEFAULT_SYSTEM_PROMPT
+        assert registry.get("desconocido") is registry.get()
+
+    def test_plain_text_source(self, tmp_path):
+        """Un fichero de texto define el prompt de todos los tipos"""
+        source = tmp_path / "prompt.txt"
+        write(source, TEMPLATE, 1000)
+
+        registry = PromptRegistry(str(source))
+
+        assert registry.get("client").template == TEMPLATE
+        assert registry.get().template == TEMPLATE
+
+    def test_json_source_per_user_type(self, tmp_path):
+        """Un JSON define prompts por tipo; el resto usa "default" """
+        source = tmp_path / "prompts.json"
+        recruiter = "RRHH {context} {question}"
+        write(source, json.dumps({"default": TEMPLATE, "recruiter": recruiter}), 1000)
+
+        registry = PromptRegistry(str(source))
+
+        assert registry.get("recruiter").template == recruiter
+        assert registry.get("client").template == TEMPLATE
+
+    def test_hot_reload_on_mtime_change(self, tmp_path):
+        """Si cambia el mtime del fichero se recompila el registro"""
+        source = tmp_path / "prompt.txt"
+        write(source, TEMPLATE, 1000)
+        registry = PromptRegistry(str(source), reload_interval=0)
+
+        updated = "Nuevo {context} {question}"
+        write(source, updated, 2000)
+
+        assert registry.get().template == updated
+        assert registry.reloads == 2
+
+    def test_invalid_update_keeps_snapshot(self, tmp_path):
+        """Un fichero inválido no sustituye al snapshot vigente"""
+        source = tmp_path / "prompt.txt"
+        write(source, TEMPLATE, 1000)
+        registry = PromptRegistry(str(source), reload_interval=0)
+
+        write(source, "Sin campos", 2000)
+
+        assert registry.get().template == TEMPLATE
+        assert registry.reload_errors == 1
+
+    def test_invalid_source_falls_back_to_builtin(self, tmp_path):
+        """Si el fichero es inválido desde el arranque se usa el integrado"""
+        source = tmp_path / "prompts.json"
+        write(source, "{no es json", 1000)
+
+        registry = PromptRegistry(str(source))
+
+        assert registry.get().template == DEFAULT_SYSTEM_PROMPT
+        assert registry.reload_errors == 1
@@ -0,0 +1,144 @@
+"""
+Tests del single-flight de RAGService (preguntas idénticas en vuelo)
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.cache_backends import InMemoryCacheBackend
+from app.services.conversation_store import ConversationMemoryStore
+from app.services.rag_service import RAGService
+
+
+def make_service():
+    """RAGService sin LLM ni vector store: solo el estado del single-flight."""
+    service = RAGService.__new__(RAGService)
+    service.conversations = ConversationMemoryStore(
+        window_size=3, max_sessions=10, max_bytes=1024 * 1024, idle_ttl_seconds=60
+    )
+    service.response_cache = InMemoryCacheBackend(max_size=10, ttl_seconds=60)
+    service.cache_hits = 0
+    service.cache_misses = 0
+    service.semantic_cache = None
+    service.routing_table = None
+    service._inflight_generations = {}
+    service.coalesced_requests = 0
+    return service
+
+
+class TestSingleFlight:
+    """Tests de la generación compartida entre llamadores concurrentes"""
+
+    @pytest.mark.asyncio
+    async def test_identical_questions_share_one_generation(self):
+        """Dos preguntas idénticas en vuelo generan una sola vez"""
+        service = make_service()
+        release = asyncio.Event()
+        calls = []
+
+        async def fake_generate(cache_key, question, memory, session_id, *args):
+            calls.append(session_id)
+            await release.wait()
+            return {"response": "respuesta", "sources": []}, "respuesta"
+
+        service._generate_uncached = fake_generate
+
+        first = asyncio.create_task(service.generate_response("¿Python?", "s1"))
+        second = asyncio.create_task(service.generate_response("¿Python?", "s2"))
+        while not service.coalesced_requests:
+            await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+
+        assert len(calls) == 1
+        assert service.coalesced_requests == 1
+        assert [r["session_id"] for r in results] == ["s1", "s2"]
+        assert all(r["response"] == "respuesta" for r in results)
+        assert service._inflight_generations == {}
+
+    @pytest.mark.asyncio
+    async def test_each_session_records_its_own_turn(self):
+        """Cada llamador guarda el turno en su propia sesión"""
+        service = make_service()
+        release = asyncio.Event()
+
+        async def fake_generate(*args):
+            await release.wait()
+            return {"response": "respuesta", "sources": []}, "respuesta"
+
+        service._generate_uncached = fake_generate
+
+        tasks = [
+            asyncio.create_task(service.generate_response("¿Python?", sid))
+            for sid in ("s1", "s2")
+        ]
+        while not service.coalesced_requests:
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+        for session_id in ("s1", "s2"):
+            history = service.conversations.get_or_create(session_id)
+            assert len(history) == 1
+            assert "respuesta" in history.history_text
+
+    @pytest.mark.asyncio
+    async def test_failed_generation_is_released(self):
+        """Si la generación falla, todos reciben el error y la clave se libera"""
+        service = make_service()
+        release = asyncio.Event()
+        calls = []
+
+        async def failing_generate(*args):
+            calls.append(args)
+            await release.wait()
+            raise RuntimeError("Gemini no disponible")
+
+        service._generate_uncached = failing_generate
+
+        tasks = [
+            asyncio.create_task(service.generate_response("¿Python?", sid))
+            for sid in ("s1", "s2")
+        ]
+        while not service.coalesced_requests:
+            await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert service._inflight_generations == {}
+
+        # Un reintento posterior genera de nuevo en lugar de reutilizar el fallo
+        with pytest.raises(RuntimeError):
+            await service.generate_response("¿Python?", "s1")
+        assert len(calls) == 2
+
+
+class TestMemoryText:
+    """Tests del texto que se guarda en la memoria conversacional"""
+
+    @pytest.mark.asyncio
+    async def test_memory_records_sanitized_response(self):
+        """La memoria guarda la respuesta saneada, no el texto crudo del LLM"""
+        service = make_service()
+
+        async def fake_build_prompt(*args):
+            return "prompt", []
+
+        class FakeLLM:
+            async def agenerate(self, prompt):
+                return SimpleNamespace(
+                    text="Mira https://evil.example <script>x()</script>aquí"
+                )
+
+        service._build_prompt = fake_build_prompt
+        service.llm = FakeLLM()
+
+        result = await service.generate_response("¿Python?", "s1")
+
+        history = service.conversations.get_or_create("s1").history_text
+        assert result["response"] == "Mira [URL] aquí"
+        assert "Mira [URL] aquí" in history
+        assert "https://" not in history and "<script>" not in history
@@ -0,0 +1,142 @@
+"""
+Tests del re-ranking con cross-encoder (CrossEncoderReranker)
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain.docstore.document import Document
+
+from app.services.reranker import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    """Cross-encoder falso: puntúa por la longitud del chunk."""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.pairs = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.pairs.extend(pairs)
+        return [len(content) for _, content in pairs]
+
+
+def docs(*contents):
+    return [Document(page_content=content) for content in contents]
+
+
+def contents(documents):
+    return [doc.page_content for doc in documents]
+
+
+@pytest.fixture
+def make_reranker():
+    """Re-ranker con el modelo falso y un hilo de scoring real."""
+    executors = []
+
+    def factory(model=None, **overrides):
+        options = {"model_name": "fake", "top_n": 2, "timeout_ms": None}
+        options.update(overrides)
+        reranker = CrossEncoderReranker(**options)
+        reranker._model = model or FakeCrossEncoder()
+        reranker._executor = ThreadPoolExecutor(max_workers=1)
+        executors.append(reranker)
+        return reranker
+
+    yield factory
+    for reranker in executors:
+        reranker.shutdown()
+
+
+class TestRerank:
+    """Tests del orden y el fallback del re-ranking"""
+
+    @pytest.mark.asyncio
+    async def test_orders_by_score_and_keeps_top_n(self, make_reranker):
+        """Se devuelven los top_n chunks por score del cross-encoder"""
+        reranker = make_reranker()
+
+        ranked = await reranker.rerank("pregunta", docs("a", "ccc", "bb"))
+
+        assert contents(ranked) == ["ccc", "bb"]
+        assert reranker.reranked == 1
+
+    @pytest.mark.asyncio
+    async def test_not_loaded_keeps_retrieval_order(self):
+        """Sin modelo cargado se mantiene el orden de la recuperación"""
+        reranker = CrossEncoderReranker("fake", top_n=2)
+
+        ranked = await reranker.rerank("pregunta", docs("a", "ccc", "bb"))
+
+        assert contents(ranked) == ["a", "ccc"]
+
+    @pytest.mark.asyncio
+    async def test_scores_are_cached(self, make_reranker):
+        """La misma pregunta (normalizada) no vuelve a puntuar los chunks"""
+        model = FakeCrossEncoder()
+        reranker = make_reranker(model)
+        await reranker.rerank("¿Qué stack usas?", docs("a", "ccc", "bb"))
+
+        candidates = docs("a", "ccc", "bb", "dddd")
+        ranked = await reranker.rerank("qué stack usas", candidates)
+
+        assert contents(ranked) == ["dddd", "ccc"]
+        assert [content for _, content in model.pairs] == ["a", "ccc", "bb", "dddd"]
+        assert (reranker.cache_hits, reranker.cache_misses) == (3, 4)
+
+
+class TestLatencyBudget:
+    """Tests del presupuesto de latencia y del guardado de ocupado"""
+
+    @pytest.mark.asyncio
+    async def test_timeout_falls_back_and_caches_late_scores(self, make_reranker):
+        """Si el scoring excede el presupuesto se devuelve el orden original"""
+        gate = threading.Event()
+        reranker = make_reranker(FakeCrossEncoder(gate), timeout_ms=10)
+
+        ranked = await reranker.rerank("pregunta", docs("a", "ccc", "bb"))
+
+        assert contents(ranked) == ["a", "ccc"]
+        assert reranker.timeouts == 1
+
+        # El forward pass termina en background y sus scores quedan en cache
+        gate.set()
+        reranker._pending.result(timeout=5)
+        ranked = await reranker.rerank("pregunta", docs("a", "ccc", "bb"))
+        assert contents(ranked) == ["ccc", "bb"]
+        assert reranker.cache_hits == 3
+
+    @pytest.mark.asyncio
+    async def test_busy_scorer_is_not_queued(self, make_reranker):
+        """Con un forward pass aún en vuelo no se encola otro"""
+        gate = threading.Event()
+        model = FakeCrossEncoder(gate)
+        reranker = make_reranker(model, timeout_ms=10)
+        await reranker.rerank("pregunta", docs("a", "ccc"))
+
+        ranked = await reranker.rerank("otra pregunta", docs("bb", "dddd"))
+
+        assert contents(ranked) == ["bb", "dddd"]
+        assert reranker.busy == 1
+        gate.set()
+        reranker._pending.result(timeout=5)
+        assert [content for _, content in model.pairs] == ["a", "ccc"]
+
+    @pytest.mark.asyncio
+    async def test_scoring_error_falls_back(self, make_reranker):
+        """Un error del modelo no rompe la recuperación"""
+
+        class FailingCrossEncoder:
+            def predict(self, *args, **kwargs):
+                raise RuntimeError("modelo no disponible")
+
+        reranker = make_reranker(FailingCrossEncoder())
+
+        ranked = await reranker.rerank("pregunta", docs("a", "ccc", "bb"))
+
+        assert contents(ranked) == ["a", "ccc"]
+        assert reranker.errors == 1
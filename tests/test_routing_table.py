@@ -0,0 +1,145 @@
+"""
+Tests de la tabla de routing precalculada (RoutingTable)
+"""
+
+import json
+
+import pytest
+from langchain.docstore.document import Document
+
+from app.services.cache_backends import InMemoryCacheBackend
+from app.services.conversation_store import ConversationMemoryStore
+from app.services.rag_service import RAGService
+from app.services.routing_table import (
+    RoutingTable,
+    collection_fingerprint,
+    write_routing_table,
+)
+from app.services.semantic_cache import SemanticResponseCache
+
+CHUNKS = [
+    Document(page_content="Experiencia con Python", metadata={"section": "skills"}),
+    Document(page_content="Proyecto AcuaMattic", metadata={"section": "projects"}),
+    Document(page_content="Formación", metadata={"section": "education"}),
+]
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    path = str(tmp_path / "routing.json")
+    write_routing_table(
+        path,
+        collection_fingerprint(CHUNKS),
+        {
+            "qué stack usas": (12, [CHUNKS[0], CHUNKS[1]]),
+            "qué proyectos tienes": (5, [CHUNKS[1]]),
+        },
+    )
+    return path
+
+
+class TestCollectionFingerprint:
+    """Tests de la huella de la colección"""
+
+    def test_independent_of_order(self):
+        """El orden de los chunks no cambia la huella"""
+        assert collection_fingerprint(CHUNKS) == collection_fingerprint(CHUNKS[::-1])
+
+    def test_changes_with_content(self):
+        """Modificar o eliminar un chunk cambia la huella"""
+        changed = CHUNKS[:2] + [Document(page_content="Formación actualizada")]
+
+        assert collection_fingerprint(changed) != collection_fingerprint(CHUNKS)
+        assert collection_fingerprint(CHUNKS[:2]) != collection_fingerprint(CHUNKS)
+
+
+class TestRoutingTable:
+    """Tests de carga y consulta de la tabla"""
+
+    def test_lookup_normalizes_question(self, table_path):
+        """Las preguntas se buscan normalizadas, en el orden de la recuperación"""
+        table = RoutingTable(table_path)
+        assert table.load(collection_fingerprint(CHUNKS)) == 2
+
+        documents = table.lookup("¿Qué STACK usas?")
+
+        assert [d.page_content for d in documents] == [
+            "Experiencia con Python",
+            "Proyecto AcuaMattic",
+        ]
+        assert documents[0].metadata == {"section": "skills"}
+        assert table.lookup("¿Dónde vives?") is None
+        assert (table.hits, table.misses) == (1, 1)
+
+    def test_stale_fingerprint_rejected(self, table_path):
+        """Una tabla construida sobre otra colección se ignora"""
+        table = RoutingTable(table_path)
+
+        assert table.load(collection_fingerprint(CHUNKS[:2])) == 0
+        assert table.stale
+        assert table.lookup("qué stack usas") is None
+
+    def test_reload_after_collection_change_clears_routes(self, table_path):
+        """Si la colección cambia, recargar desactiva las rutas anteriores"""
+        table = RoutingTable(table_path)
+        table.load(collection_fingerprint(CHUNKS))
+
+        table.load("otra-huella")
+
+        assert table.size == 0
+
+    def test_missing_file(self, tmp_path):
+        """Sin fichero la tabla queda vacía"""
+        table = RoutingTable(str(tmp_path / "no_existe.json"))
+
+        assert table.load(collection_fingerprint(CHUNKS)) == 0
+        assert not table.stale
+
+    def test_other_version_ignored(self, table_path):
+        """Una tabla con otra versión de formato se ignora"""
+        with open(table_path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        payload["version"] = 999
+        with open(table_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+        assert RoutingTable(table_path).load(collection_fingerprint(CHUNKS)) == 0
+
+
+class TestRoutedGeneration:
+    """Tests del uso de la tabla de routing en RAGService"""
+
+    @pytest.mark.asyncio
+    async def test_routed_question_skips_embedding(self, table_path):
+        """Una pregunta con ruta no se embebe ni se busca"""
+        service = RAGService.__new__(RAGService)
+        service.conversations = ConversationMemoryStore(
+            window_size=3, max_sessions=10, max_bytes=1024 * 1024, idle_ttl_seconds=60
+        )
+        service.response_cache = InMemoryCacheBackend(max_size=10, ttl_seconds=60)
+        service.cache_hits = service.cache_misses = 0
+        service.semantic_cache = SemanticResponseCache()
+        service.routing_table = RoutingTable(table_path)
+        service.routing_table.load(collection_fingerprint(CHUNKS))
+        service._inflight_generations = {}
+        service.coalesced_requests = 0
+
+        async def no_embedding(question):
+            raise AssertionError("no debería embeberse")
+
+        received = {}
+
+        async def fake_generate(cache_key, question, memory, session_id, *args):
+            received["query_vector"], received["routed_docs"] = args[-2:]
+            return {"response": "Python", "sources": []}, "Python"
+
+        service._embed_question = no_embedding
+        service._generate_uncached = fake_generate
+
+        await service.generate_response("¿Qué stack usas?", "s1")
+
+        assert received["query_vector"] is None
+        assert [d.page_content for d in received["routed_docs"]] == [
+            "Experiencia con Python",
+            "Proyecto AcuaMattic",
+        ]
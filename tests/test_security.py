@@ -0,0 +1,48 @@
+"""
+Tests de la protección de los endpoints operativos (require_admin_key)
+"""
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import require_admin_key
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/admin", dependencies=[Depends(require_admin_key)])
+    async def admin_endpoint():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+class TestRequireAdminKey:
+    """Tests de la cabecera X-Admin-Key"""
+
+    def test_valid_key(self, client, monkeypatch):
+        """Con la clave configurada se permite el acceso"""
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", "secreto")
+
+        response = client.post("/admin", headers={"X-Admin-Key": "secreto"})
+
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize("headers", [{}, {"X-Admin-Key": "otra"}])
+    def test_missing_or_wrong_key(self, client, monkeypatch, headers):
+        """Sin cabecera o con una clave incorrecta se rechaza"""
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", "secreto")
+
+        assert client.post("/admin", headers=headers).status_code == 403
+
+    def test_disabled_without_configured_key(self, client, monkeypatch):
+        """Sin ADMIN_API_KEY el endpoint queda deshabilitado"""
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", None)
+
+        response = client.post("/admin", headers={"X-Admin-Key": ""})
+
+        assert response.status_code == 403
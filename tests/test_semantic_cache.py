@@ -0,0 +1,132 @@
+"""
+Tests del cache semántico de respuestas (SemanticResponseCache)
+"""
+
+import math
+
+import pytest
+
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticResponseCache
+
+BASE = [1.0, 0.0]
+
+
+def at_similarity(similarity):
+    """Vector unitario cuya similitud coseno con BASE es `similarity`."""
+    return [similarity, math.sqrt(1 - similarity**2)]
+
+
+def answer(text):
+    return {"response": text, "sources": []}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(**overrides):
+    options = {
+        "threshold": 0.9,
+        "near_miss_margin": 0.05,
+        "max_size": 10,
+        "ttl_seconds": 60,
+    }
+    options.update(overrides)
+    return SemanticResponseCache(**options)
+
+
+class TestThreshold:
+    """Tests del umbral de similitud"""
+
+    def test_hit_above_threshold(self, clock):
+        """Una pregunta parafraseada por encima del umbral es un hit"""
+        cache = make_cache()
+        cache.store("¿Qué stack usas?", BASE, "client", answer("Python"))
+
+        response, similarity = cache.lookup(at_similarity(0.91), "client")
+
+        assert response == answer("Python")
+        assert similarity == pytest.approx(0.91, abs=1e-4)
+        assert cache.hits == 1
+
+    def test_miss_below_threshold(self, clock):
+        """Por debajo del umbral no se sirve la respuesta cacheada"""
+        cache = make_cache()
+        cache.store("¿Qué stack usas?", BASE, "client", answer("Python"))
+
+        assert cache.lookup(at_similarity(0.89), "client") is None
+        assert cache.misses == 1
+
+    def test_vectors_are_normalized(self, clock):
+        """La similitud no depende de la norma de los embeddings"""
+        cache = make_cache()
+        cache.store("¿Qué stack usas?", [3.0, 0.0], "client", answer("Python"))
+
+        assert cache.lookup([0.5, 0.0], "client") is not None
+
+
+class TestNearMisses:
+    """Tests del contador de near-misses"""
+
+    def test_near_miss_within_margin(self, clock):
+        """Un miss dentro del margen bajo el umbral cuenta como near-miss"""
+        cache = make_cache()
+        cache.store("¿Qué stack usas?", BASE, "client", answer("Python"))
+
+        cache.lookup(at_similarity(0.87), "client")
+
+        assert cache.near_misses == 1
+
+    def test_far_miss_not_counted(self, clock):
+        """Un miss lejos del umbral no es un near-miss"""
+        cache = make_cache()
+        cache.store("¿Qué stack usas?", BASE, "client", answer("Python"))
+
+        cache.lookup(at_similarity(0.5), "client")
+
+        assert cache.misses == 1
+        assert cache.near_misses == 0
+
+
+class TestIsolation:
+    """Tests de la separación por user_type"""
+
+    def test_user_types_do_not_share_entries(self, clock):
+        """La respuesta de un user_type no se sirve a otro"""
+        cache = make_cache()
+        cache.store("¿Qué stack usas?", BASE, "recruiter", answer("Para RRHH"))
+        cache.store("¿Qué stack usas?", BASE, "client", answer("Para clientes"))
+
+        assert cache.lookup(BASE, "recruiter")[0] == answer("Para RRHH")
+        assert cache.lookup(BASE, "client")[0] == answer("Para clientes")
+        assert cache.lookup(BASE, "curious") is None
+
+
+class TestExpiration:
+    """Tests de TTL y expulsión LRU"""
+
+    def test_expired_entries_are_purged(self, clock):
+        """Las entradas caducadas se eliminan al consultar"""
+        cache = make_cache(ttl_seconds=60)
+        cache.store("¿Qué stack usas?", BASE, "client", answer("Python"))
+        clock[0] += 61
+
+        assert cache.lookup(BASE, "client") is None
+        assert cache.get_stats()["size"] == 0
+
+    def test_lru_eviction(self, clock):
+        """Al superar max_size se expulsa la entrada menos usada"""
+        cache = make_cache(max_size=2)
+        cache.store("uno", [1.0, 0.0, 0.0], "client", answer("1"))
+        cache.store("dos", [0.0, 1.0, 0.0], "client", answer("2"))
+        cache.lookup([1.0, 0.0, 0.0], "client")  # "dos" pasa a ser la menos usada
+        cache.store("tres", [0.0, 0.0, 1.0], "client", answer("3"))
+
+        assert cache.lookup([1.0, 0.0, 0.0], "client")[0] == answer("1")
+        assert cache.lookup([0.0, 0.0, 1.0], "client")[0] == answer("3")
+        assert cache.lookup([0.0, 1.0, 0.0], "client") is None
+        assert cache.get_stats()["size"] == 2
@@ -0,0 +1,100 @@
+"""
+Tests del matcher de categorías de una sola pasada (CategoryMatcher)
+"""
+
+import re
+
+import pytest
+
+from app.services.analytics_service import INTENT_PATTERNS, TECHNOLOGY_PATTERNS
+from app.services.text_matching import CategoryMatcher
+
+TABLES = {"technologies": TECHNOLOGY_PATTERNS, "intents": INTENT_PATTERNS}
+
+
+def legacy_detect(message, tables):
+    """Implementación anterior: re.search por patrón y categoría."""
+    message_lower = message.lower()
+    result = {}
+    for table, categories in tables.items():
+        detected = []
+        for category, patterns in categories.items():
+            for pattern in patterns:
+                if re.search(pattern, message_lower, re.IGNORECASE):
+                    detected.append(category)
+                    break
+        result[table] = detected
+    return result
+
+
+MESSAGES = [
+    "Hola, ¿qué tal?",
+    "¿Tienes experiencia con Python y Django?",
+    "Trabajé con React, Node.js y Vue en una empresa de fintech",
+    "What about AWS, GCP or Azure? Kubernetes in production?",
+    "¿Qué proyectos de Machine Learning y LLM has hecho? ¿Usas RAG?",
+    "PostgreSQL, MySQL, MongoDB o Redis: ¿cuál prefieres?",
+    "Docker, Terraform, Jenkins y CI/CD en tu último trabajo",
+    "¿Cuál es tu disponibilidad? Queremos contratar para una oportunidad",
+    "Háblame de tus estudios, universidad y alguna certificación",
+    "¿Qué habilidades y conocimientos tienes?",
+    "¿Qué tecnologías usas para programar?",
+    "JAVA, SPRING, MAVEN y GRADLE en mayúsculas",
+    "javascript-heavy frontends, nodejs backends",
+    "Sin palabras clave: pythonista, reactivo, cloudy, aws3",
+    "",
+]
+
+
+class TestCategoryMatcher:
+    """Tests del matcher frente al bucle por patrón anterior"""
+
+    @pytest.mark.parametrize("message", MESSAGES)
+    def test_matches_legacy_loop(self, message):
+        """Mismas categorías y en el mismo orden que la implementación anterior"""
+        matcher = CategoryMatcher(TABLES)
+        assert matcher.match(message) == legacy_detect(message, TABLES)
+
+    def test_shared_pattern_activates_all_categories(self):
+        """Un patrón compartido ("trabajo") activa todas sus categorías"""
+        matcher = CategoryMatcher(TABLES)
+        result = matcher.match("Busco trabajo")
+        assert result["intents"] == ["experience", "availability"]
+        assert result["technologies"] == []
+
+    def test_output_follows_declaration_order(self):
+        """Las categorías salen en el orden de declaración, no de aparición"""
+        matcher = CategoryMatcher(TABLES)
+        result = matcher.match("redis, docker y después python")
+        assert result["technologies"] == ["python", "database", "devops"]
+
+    def test_case_insensitive_and_memoized(self):
+        """Coincidencias sin distinguir mayúsculas, resueltas una sola vez"""
+        matcher = CategoryMatcher(TABLES)
+        assert matcher.match("PYTHON")["technologies"] == ["python"]
+        assert matcher.match("Python")["technologies"] == ["python"]
+        assert "python" in matcher._resolved
+
+    def test_deduplicates_patterns(self):
+        """Los patrones repetidos entre categorías se compilan una vez"""
+        distinct = {
+            pattern
+            for categories in TABLES.values()
+            for patterns in categories.values()
+            for pattern in patterns
+        }
+        assert CategoryMatcher(TABLES).pattern_count == len(distinct)
+
+    def test_patterns_without_word_boundaries(self):
+        """Sin \\b común la alternancia se construye sin factorizar"""
+        tables = {"tech": {"js": [r"node\.?js"], "go": [r"\bgolang\b"]}}
+        matcher = CategoryMatcher(tables)
+        assert matcher.match("mynodejs y golang") == legacy_detect(
+            "mynodejs y golang", tables
+        )
+        assert matcher.match("mynodejs y golang")["tech"] == ["js", "go"]
+
+    def test_empty_tables(self):
+        """Sin patrones no hay coincidencias"""
+        matcher = CategoryMatcher({"technologies": {}})
+        assert matcher.match("python") == {"technologies": []}
@@ -0,0 +1,104 @@
+"""
+Tests del índice vectorial exacto en memoria (InMemoryVectorIndex)
+"""
+
+import numpy as np
+import pytest
+from langchain.docstore.document import Document
+
+from app.services import vector_index
+from app.services.vector_index import InMemoryVectorIndex
+
+
+def make_collection(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).tolist()
+    documents = [Document(page_content=f"chunk {i}") for i in range(n)]
+    return documents, vectors
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    """Sustituye la lectura de pgvector por una colección configurable."""
+    state = {"collection": make_collection(20)}
+
+    def fake_fetch(connection_string, collection_name, with_embeddings=True):
+        if isinstance(state["collection"], Exception):
+            raise state["collection"]
+        return state["collection"]
+
+    monkeypatch.setattr(vector_index, "fetch_collection", fake_fetch)
+    return state
+
+
+def make_index():
+    return InMemoryVectorIndex(None, "postgresql://test", "portfolio")
+
+
+class TestSearch:
+    """Tests del top-k por similitud coseno"""
+
+    def test_top_k_matches_brute_force(self, collection):
+        """El top-k coincide con ordenar todas las similitudes coseno"""
+        documents, vectors = collection["collection"]
+        index = make_index()
+        index.load()
+        query = np.random.default_rng(1).normal(size=8)
+
+        results = index.similarity_search_with_score_by_vector(query.tolist(), k=5)
+
+        matrix = np.asarray(vectors)
+        expected = (matrix @ query) / (
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        )
+        best = np.argsort(-expected)[:5]
+        assert [doc.page_content for doc, _ in results] == [
+            documents[i].page_content for i in best
+        ]
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+        assert scores == pytest.approx(expected[best].tolist(), abs=1e-5)
+
+    def test_k_larger_than_collection(self, collection):
+        """Con k mayor que la colección se devuelven todos, ordenados"""
+        index = make_index()
+        index.load()
+
+        results = index.similarity_search_with_score_by_vector([1.0] * 8, k=50)
+
+        scores = [score for _, score in results]
+        assert len(results) == 20
+        assert scores == sorted(scores, reverse=True)
+
+    def test_empty_index(self):
+        """Un índice sin cargar no devuelve resultados"""
+        assert make_index().similarity_search_with_score_by_vector([1.0], k=3) == []
+
+
+class TestSnapshot:
+    """Tests del reemplazo atómico del snapshot"""
+
+    def test_reload_swaps_snapshot(self, collection):
+        """Recargar reemplaza el snapshot entero sin mutar el anterior"""
+        index = make_index()
+        index.load()
+        previous_matrix, previous_documents = index._snapshot
+
+        collection["collection"] = make_collection(5, seed=2)
+        assert index.load() == 5
+
+        assert index.size == 5
+        assert len(previous_documents) == 20
+        assert previous_matrix.shape == (20, 8)
+
+    def test_failed_reload_keeps_snapshot(self, collection):
+        """Si la recarga falla se sigue sirviendo el snapshot anterior"""
+        index = make_index()
+        index.load()
+
+        collection["collection"] = RuntimeError("BD no disponible")
+        with pytest.raises(RuntimeError):
+            index.load()
+
+        assert index.size == 20
+        assert index.source == "pgvector"